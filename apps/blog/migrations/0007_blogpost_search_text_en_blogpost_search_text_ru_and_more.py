@@ -0,0 +1,74 @@
+# Generated by Django 5.0.6 on 2026-10-17 02:34
+
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+from apps.core import search
+
+
+def fill_blog_search(apps, schema_editor):
+    """Заполнение поискового текста и векторов для существующих статей"""
+    BlogPost = apps.get_model('blog', 'BlogPost')
+
+    for post in BlogPost.objects.iterator():
+        parts = {
+            language: [
+                (getattr(post, f'title_{language}', '') or '', 'A'),
+                (getattr(post, f'excerpt_{language}', '') or '', 'B'),
+                (getattr(post, f'content_{language}', '') or '', 'C'),
+            ]
+            for language in search.SEARCH_LANGUAGES
+        }
+        queryset = BlogPost.objects.filter(pk=post.pk)
+        queryset.update(**search.search_text_values(parts))
+        search.store_search_vectors(queryset, parts)
+
+
+def create_search_indexes(apps, schema_editor):
+    search.create_gin_indexes(schema_editor, 'blog_blogpost', 'blog_post_search_vector')
+
+
+def drop_search_indexes(apps, schema_editor):
+    search.drop_gin_indexes(schema_editor, 'blog_post_search_vector')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0006_blogpost_featured_image_en_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogpost',
+            name='search_text_en',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='blogpost',
+            name='search_text_ru',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='blogpost',
+            name='search_text_th',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='blogpost',
+            name='search_vector_en',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='blogpost',
+            name='search_vector_ru',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='blogpost',
+            name='search_vector_th',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(fill_blog_search, migrations.RunPython.noop),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
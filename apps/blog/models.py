@@ -2,11 +2,14 @@ import re
 
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.utils import translation
 from django.utils.translation import gettext_lazy as _
 from tinymce.models import HTMLField
 
+from apps.core import search
+
 
 class BlogCategory(models.Model):
     """Категории для блога"""
@@ -143,6 +146,16 @@ class BlogPost(models.Model):
     
     # Счетчики
     views_count = models.PositiveIntegerField(_('Количество просмотров'), default=0)
+
+    # Полнотекстовый поиск (см. apps.core.search); векторы заполняются только на PostgreSQL
+    search_text_ru = models.TextField(blank=True, default='', editable=False)
+    search_text_en = models.TextField(blank=True, default='', editable=False)
+    search_text_th = models.TextField(blank=True, default='', editable=False)
+    search_vector_ru = SearchVectorField(blank=True, null=True, editable=False)
+    search_vector_en = SearchVectorField(blank=True, null=True, editable=False)
+    search_vector_th = SearchVectorField(blank=True, null=True, editable=False)
+
+    SEARCH_SOURCE_FIELDS = ('title', 'excerpt', 'content')
     
     META_DESCRIPTION_LIMIT = 180
     META_DESCRIPTION_TOLERANCE = 20
@@ -318,7 +331,35 @@ class BlogPost(models.Model):
             self.published_at = timezone.now()
         elif self.status != 'published':
             self.published_at = None
+
+        update_fields = kwargs.get('update_fields')
+        reindex = update_fields is None or any(
+            name.startswith(self.SEARCH_SOURCE_FIELDS) for name in update_fields
+        )
+        if reindex:
+            search_parts = self.build_search_parts()
+            for field_name, value in search.search_text_values(search_parts).items():
+                setattr(self, field_name, value)
+            if update_fields is not None:
+                kwargs['update_fields'] = list(update_fields) + [
+                    f'search_text_{language}' for language in search.SEARCH_LANGUAGES
+                ]
+
         super().save(*args, **kwargs)
+
+        if reindex:
+            search.store_search_vectors(BlogPost.objects.filter(pk=self.pk), search_parts)
+
+    def build_search_parts(self):
+        """Части поискового текста по языкам: [(текст, вес)]."""
+        return {
+            language: [
+                (getattr(self, f'title_{language}', '') or '', 'A'),
+                (getattr(self, f'excerpt_{language}', '') or '', 'B'),
+                (getattr(self, f'content_{language}', '') or '', 'C'),
+            ]
+            for language in search.SEARCH_LANGUAGES
+        }
         
     @classmethod
     def get_published(cls):
@@ -354,9 +395,9 @@ class BlogPost(models.Model):
         ).order_by('-event_date')
         
     def increment_views(self):
-        """Увеличить счетчик просмотров"""
-        self.views_count += 1
-        self.save(update_fields=['views_count'])
+        """Учесть просмотр; в views_count попадёт при сбросе буфера (flush_view_counters)"""
+        from apps.core.view_counters import record_view
+        record_view(self)
         
     def get_reading_time(self):
         """Оценить время чтения статьи (слов в минуту)"""
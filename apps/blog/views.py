@@ -6,7 +6,6 @@ from django.conf import settings
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
 from django.core.paginator import Paginator
-from django.db.models import Q
 from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, render
 from django.templatetags.static import static
@@ -18,6 +17,7 @@ from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from urllib.parse import urlparse, parse_qs
 
+from apps.core import search
 from apps.core.models import SEOPage
 
 from .models import BlogPost, BlogCategory, BlogTag
@@ -123,11 +123,9 @@ def blog_list(request):
     # Поиск
     search_query = request.GET.get('search')
     if search_query:
-        posts = posts.filter(
-            Q(title__icontains=search_query) |
-            Q(excerpt__icontains=search_query) |
-            Q(content__icontains=search_query)
-        )
+        posts = posts.filter(search.search_filter(search_query)).annotate(
+            search_rank=search.search_rank(search_query, language_code)
+        ).order_by('-search_rank', '-is_featured', '-published_at', '-created_at')
     
     # Пагинация
     paginator = Paginator(posts, getattr(settings, 'PAGINATE_BY', 12))
@@ -6,6 +6,7 @@ from urllib.parse import urlsplit, urlunsplit
 from apps.properties.models import PropertyType, Property
 from apps.locations.models import District, Location
 from apps.core.models import SEOPage, Service
+from apps.core.request_cache import request_memo
 import re
 
 
@@ -175,16 +176,26 @@ def seo_context(request):
     property_detail_match = re.match(r'^/property/([^/]+)/?$', path)
     if property_detail_match and not path.startswith('/property/type/'):
         property_slug = property_detail_match.group(1)
-        try:
-            property_obj = Property.objects.get(slug=property_slug, is_active=True)
-            seo_data = property_obj.get_seo_data(language_code)
+        # Обычно объект уже опубликован PropertyDetailView, запрос к БД не нужен
+        property_obj = request_memo(
+            ('property', property_slug),
+            lambda: Property.objects.select_related(
+                'property_type', 'district', 'location'
+            ).prefetch_related('seo_metadata').filter(slug=property_slug).first(),
+            request,
+        )
+        if property_obj and property_obj.is_active:
+            seo_data = request_memo(
+                ('property-seo', property_obj.pk, language_code),
+                lambda: property_obj.get_seo_data(language_code),
+                request,
+            )
             return {
                 'page_title': seo_data['title'],
                 'page_description': seo_data['description'],
                 'page_keywords': seo_data['keywords'],
             }
-        except Property.DoesNotExist:
-            pass  # Продолжаем с обычным определением страницы
+        # Иначе продолжаем с обычным определением страницы
     
     # Определяем имя страницы для обычных страниц
     page_name = 'home'  # по умолчанию
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from apps.core.view_counters import FLUSH_CHUNK_SIZE, flush_view_counters
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит накопленные просмотры (кэш или файловый журнал) в views_count '
+        '(запускать по cron раз в минуту)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=FLUSH_CHUNK_SIZE,
+            help='Сколько объектов обрабатывать за один запрос',
+        )
+
+    def handle(self, *args, **options):
+        flushed = flush_view_counters(chunk_size=max(1, options['chunk_size']))
+        summary = ', '.join(f'{label}: {count}' for label, count in flushed.items())
+        self.stdout.write(self.style.SUCCESS(f'Перенесено просмотров — {summary}'))
@@ -6,6 +6,22 @@ from django.http import HttpResponsePermanentRedirect, JsonResponse
 from django.utils.deprecation import MiddlewareMixin
 from django.conf.urls.i18n import is_language_prefix_patterns_used
 
+from apps.core.request_cache import bind_request, unbind_request
+
+
+class RequestCacheMiddleware:
+    """Делает текущий запрос доступным для request_memo без явной передачи request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = bind_request(request)
+        try:
+            return self.get_response(request)
+        finally:
+            unbind_request(token)
+
 
 class PermissionsPolicyMiddleware(MiddlewareMixin):
     """
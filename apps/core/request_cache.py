@@ -0,0 +1,56 @@
+"""
+Кэш в пределах одного запроса.
+
+Объекты и справочники, нужные нескольким участникам обработки запроса
+(view, контекст-процессоры, шаблонные теги), хранятся в словаре
+``request._undersun_cache`` и живут ровно до конца запроса, поэтому
+инвалидация не нужна. ``apps.core.middleware.RequestCacheMiddleware``
+запоминает текущий запрос, чтобы кэшем могли пользоваться и функции без
+доступа к ``request`` (например, ``CurrencyService``); вне запроса
+(команды, shell) значения просто вычисляются заново.
+"""
+from contextvars import ContextVar
+
+REQUEST_CACHE_ATTR = '_undersun_cache'
+
+_current_request = ContextVar('undersun_current_request', default=None)
+
+
+def get_request_cache(request=None):
+    """Словарь кэша запроса или None, если запроса нет."""
+    if request is None:
+        request = _current_request.get()
+        if request is None:
+            return None
+    cache = getattr(request, REQUEST_CACHE_ATTR, None)
+    if cache is None:
+        cache = {}
+        setattr(request, REQUEST_CACHE_ATTR, cache)
+    return cache
+
+
+def request_memo(key, builder, request=None):
+    """Вернуть значение по ключу, при первом обращении вычислив его через builder()."""
+    cache = get_request_cache(request)
+    if cache is None:
+        return builder()
+    if key not in cache:
+        cache[key] = builder()
+    return cache[key]
+
+
+def publish(request, key, value):
+    """Положить уже загруженный объект в кэш запроса."""
+    cache = get_request_cache(request)
+    if cache is not None:
+        cache[key] = value
+    return value
+
+
+def bind_request(request):
+    """Сделать запрос текущим; возвращает токен для unbind_request."""
+    return _current_request.set(request)
+
+
+def unbind_request(token):
+    _current_request.reset(token)
@@ -0,0 +1,190 @@
+"""
+Полнотекстовый поиск по каталогу и блогу.
+
+Для каждого языка модель хранит два поля:
+``search_text_<lang>`` — нормализованный текст (нижний регистр, без HTML) и
+``search_vector_<lang>`` — tsvector, который заполняется только на PostgreSQL.
+На PostgreSQL поиск идёт по GIN индексам с ранжированием ``ts_rank``
+(последнее слово запроса ищется по префиксу),
+на остальных СУБД (SQLite при разработке) — через ``contains`` по тексту.
+
+Тайский язык пишется без пробелов, поэтому тайские фрагменты режутся на
+перекрывающиеся биграммы символов и индексируются конфигурацией ``simple``.
+"""
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import Coalesce
+from django.utils.html import strip_tags
+
+SEARCH_LANGUAGES = ('ru', 'en', 'th')
+
+# Конфигурации PostgreSQL full-text search для каждого языка
+SEARCH_CONFIGS = {
+    'ru': 'russian',
+    'en': 'english',
+    'th': 'simple',
+}
+
+# Вес совпадения на текущем языке сайта относительно остальных языков
+CURRENT_LANGUAGE_BOOST = 2.0
+
+THAI_RE = re.compile(r'[\u0E00-\u0E7F]+')
+# Тайские огласовки и тоновые знаки не входят в \w, поэтому блок добавлен явно
+TOKEN_RE = re.compile(r'[\w\u0E00-\u0E7F]+', re.UNICODE)
+
+
+def is_postgresql():
+    return connection.vendor == 'postgresql'
+
+
+def thai_bigrams(text):
+    """Разбить тайские фрагменты текста на перекрывающиеся биграммы."""
+    def split_run(match):
+        run = match.group(0)
+        if len(run) < 3:
+            return f' {run} '
+        return ' ' + ' '.join(run[i:i + 2] for i in range(len(run) - 1)) + ' '
+
+    return THAI_RE.sub(split_run, text)
+
+
+def normalize_text(text, language):
+    """Привести текст к виду, в котором он хранится в search_text_*."""
+    text = strip_tags(text or '').lower()
+    if language == 'th':
+        text = thai_bigrams(text)
+    return ' '.join(TOKEN_RE.findall(text))
+
+
+def build_search_text(language, weighted_parts):
+    """Склеить части документа [(текст, вес)] в строку для search_text_<lang>."""
+    return ' '.join(
+        part for part in (normalize_text(text, language) for text, _weight in weighted_parts) if part
+    )
+
+
+def build_search_vector(language, weighted_parts):
+    """Выражение tsvector с весами A-D из частей документа [(текст, вес)]."""
+    config = SEARCH_CONFIGS[language]
+    vector = None
+    for text, weight in weighted_parts:
+        text = normalize_text(text, language)
+        if not text:
+            continue
+        part = SearchVector(Value(text), config=config, weight=weight)
+        vector = part if vector is None else vector + part
+    return vector
+
+
+def search_text_values(parts_by_language):
+    """Значения полей search_text_<lang> для сохранения в модели."""
+    return {
+        f'search_text_{language}': build_search_text(language, parts)
+        for language, parts in parts_by_language.items()
+    }
+
+
+def store_search_vectors(queryset, parts_by_language):
+    """Обновить search_vector_<lang> для строк queryset (только PostgreSQL)."""
+    if not is_postgresql():
+        return
+
+    updates = {}
+    for language, parts in parts_by_language.items():
+        updates[f'search_vector_{language}'] = build_search_vector(language, parts)
+    queryset.update(**updates)
+
+
+def _query_terms(query, language):
+    return normalize_text(query, language).split()
+
+
+def _prefix_query(terms, language):
+    """tsquery: все слова запроса, последнее — по префиксу (поиск по мере ввода).
+
+    Слова состоят только из символов ``TOKEN_RE``, поэтому операторы tsquery
+    в них не попадают и запрос можно собрать как raw.
+    """
+    raw = ' & '.join(terms[:-1] + [f'{terms[-1]}:*'])
+    return SearchQuery(raw, config=SEARCH_CONFIGS[language], search_type='raw')
+
+
+# Условие, которому не соответствует ни одна строка
+NO_MATCH = Q(pk__in=[])
+
+
+def search_filter(query, prefix=''):
+    """Q-условие совпадения запроса хотя бы на одном из языков.
+
+    Запрос без слов (только знаки препинания) не находит ничего, а не весь
+    каталог. На PostgreSQL так же ведёт себя запрос только из стоп-слов:
+    ``to_tsquery`` выбрасывает их, и пустой tsquery не совпадает ни с чем.
+    """
+    condition = Q()
+
+    if is_postgresql():
+        for language in SEARCH_LANGUAGES:
+            terms = _query_terms(query, language)
+            if terms:
+                condition |= Q(**{
+                    f'{prefix}search_vector_{language}': _prefix_query(terms, language)
+                })
+        return condition or NO_MATCH
+
+    # Fallback: каждое слово запроса должно встречаться хотя бы в одном языке
+    for language in SEARCH_LANGUAGES:
+        terms = _query_terms(query, language)
+        if not terms:
+            continue
+        language_condition = Q()
+        for term in terms:
+            language_condition &= Q(**{f'{prefix}search_text_{language}__contains': term})
+        condition |= language_condition
+    return condition or NO_MATCH
+
+
+def search_rank(query, language_code, prefix=''):
+    """Выражение релевантности; на СУБД без full-text search равно нулю."""
+    if not is_postgresql():
+        return Value(0.0, output_field=FloatField())
+
+    current_language = (language_code or 'ru')[:2]
+    rank = None
+    for language in SEARCH_LANGUAGES:
+        terms = _query_terms(query, language)
+        if not terms:
+            continue
+        language_rank = Coalesce(
+            SearchRank(
+                F(f'{prefix}search_vector_{language}'),
+                _prefix_query(terms, language),
+            ),
+            Value(0.0),
+            output_field=FloatField(),
+        )
+        if language == current_language:
+            language_rank = language_rank * Value(CURRENT_LANGUAGE_BOOST)
+        rank = language_rank if rank is None else rank + language_rank
+
+    return rank if rank is not None else Value(0.0, output_field=FloatField())
+
+
+def create_gin_indexes(schema_editor, table, index_prefix):
+    """Создать GIN индексы по search_vector_<lang> (вызывается из миграций)."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for language in SEARCH_LANGUAGES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS "{index_prefix}_{language}_gin" '
+            f'ON "{table}" USING gin ("search_vector_{language}")'
+        )
+
+
+def drop_gin_indexes(schema_editor, index_prefix):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for language in SEARCH_LANGUAGES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{index_prefix}_{language}_gin"')
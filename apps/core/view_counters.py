@@ -0,0 +1,242 @@
+"""
+Буферизованные счётчики просмотров.
+
+Страница не пишет в БД: просмотр попадает в буфер, а команда
+``flush_view_counters`` периодически (cron) переносит накопленные
+значения в ``views_count`` одним запросом
+``UPDATE ... FROM (VALUES ...)`` на PostgreSQL (на остальных СУБД —
+``UPDATE ... CASE``).
+
+Буфер зависит от кэша:
+
+* общий кэш (Redis/Memcached) — атомарный счётчик ``cache.incr`` по ключу
+  ``views:<модель>:<pk>``. Объект, счётчик которого стал равен 1, заносится
+  в журнал «грязных» id модели (пронумерованные ключи ``views:<модель>:dirty:<n>``),
+  поэтому команда читает только объекты с новыми просмотрами, а не всю
+  таблицу. Перенесённое вычитается через ``decr``, так что просмотры,
+  пришедшие во время сброса, не теряются;
+* процессный кэш (LocMem, Dummy) недоступен команде, поэтому просмотр
+  дописывается строкой в файл-журнал ``VIEW_COUNTER_SPOOL_DIR``. Журнал
+  общий для процессов хоста и переживает перезапуск воркеров; команда
+  атомарно переименовывает его и разбирает.
+"""
+import logging
+import os
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+logger = logging.getLogger(__name__)
+
+# Модели, у которых просмотры считаются через буфер
+VIEW_COUNTER_MODELS = ('properties.Property', 'blog.BlogPost')
+VIEW_COUNTER_FIELD = 'views_count'
+
+# Сколько ключей читать из кэша и обновлять в БД за один запрос
+FLUSH_CHUNK_SIZE = 500
+
+# Сколько хранится запись журнала «грязных» id, если сброс не запускался, секунд
+DIRTY_SLOT_TIMEOUT = 7 * 24 * 60 * 60
+
+SPOOL_NAME = 'views.spool'
+
+# Пауза после переименования журнала: дописывающие процессы успевают закрыть файл, секунд
+SPOOL_SETTLE_SECONDS = 1.0
+
+
+def is_shared_cache():
+    """Кэш доступен из других процессов (нужен команде сброса)."""
+    return not isinstance(caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache))
+
+
+def counter_key(model, pk):
+    return f'views:{model._meta.label_lower}:{pk}'
+
+
+def _dirty_key(model, suffix):
+    return f'views:{model._meta.label_lower}:dirty-{suffix}'
+
+
+def _slot_key(model, number):
+    return f'views:{model._meta.label_lower}:dirty:{number}'
+
+
+def spool_dir():
+    return Path(getattr(settings, 'VIEW_COUNTER_SPOOL_DIR', settings.BASE_DIR / 'var' / 'view_counters'))
+
+
+def _incr(key):
+    """Атомарно увеличить счётчик в кэше, создав его при отсутствии; возвращает новое значение."""
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Ключа ещё нет; add атомарен, при гонке второй процесс сделает incr
+        if cache.add(key, 1, timeout=None):
+            return 1
+        return cache.incr(key)
+
+
+def _mark_dirty(model, pk):
+    """Занести id в журнал объектов с несброшенными просмотрами."""
+    number = _incr(_dirty_key(model, 'seq'))
+    cache.set(_slot_key(model, number), pk, DIRTY_SLOT_TIMEOUT)
+
+
+def record_view(instance):
+    """Учесть просмотр объекта без записи в БД."""
+    model = type(instance)
+    if is_shared_cache():
+        # 1 — первый просмотр после сброса: объекта ещё нет в журнале
+        if _incr(counter_key(model, instance.pk)) == 1:
+            _mark_dirty(model, instance.pk)
+        return
+
+    line = f'{model._meta.label_lower} {instance.pk}\n'.encode()
+    path = spool_dir() / SPOOL_NAME
+    try:
+        try:
+            descriptor = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        except FileNotFoundError:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            descriptor = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            # Одна короткая запись с O_APPEND не перемешивается с записями других процессов
+            os.write(descriptor, line)
+        finally:
+            os.close(descriptor)
+    except OSError:
+        logger.exception('Не удалось записать просмотр в журнал %s', path)
+
+
+def apply_view_deltas(model, deltas):
+    """Прибавить ``{pk: delta}`` к счётчикам просмотров одним UPDATE."""
+    if not deltas:
+        return 0
+
+    field = model._meta.get_field(VIEW_COUNTER_FIELD)
+    if connection.vendor == 'postgresql':
+        quote = connection.ops.quote_name
+        table = quote(model._meta.db_table)
+        column = quote(field.column)
+        pk_column = quote(model._meta.pk.column)
+        rows = ', '.join(['(%s, %s)'] * len(deltas))
+        sql = (
+            f'UPDATE {table} SET {column} = {table}.{column} + v.delta '
+            f'FROM (VALUES {rows}) AS v(id, delta) '
+            f'WHERE {table}.{pk_column} = v.id'
+        )
+        params = [value for item in deltas.items() for value in item]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.rowcount
+
+    # .update() не вызывает save() и сигналы, как и запрос выше
+    return model.objects.filter(pk__in=list(deltas)).update(**{
+        field.name: F(field.name) + Case(
+            *[When(pk=pk, then=Value(delta)) for pk, delta in deltas.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+    })
+
+
+def flush_model_views(model, chunk_size=FLUSH_CHUNK_SIZE):
+    """Перенести буфер просмотров одной модели из кэша в БД; возвращает число просмотров.
+
+    Читаются только id из журнала с последнего сброса, поэтому стоимость
+    зависит от числа просмотренных объектов, а не от размера таблицы.
+    """
+    last = cache.get(_dirty_key(model, 'seq')) or 0
+    done = cache.get(_dirty_key(model, 'done')) or 0
+    if last < done:
+        # Счётчик журнала вытеснен из кэша и начат заново
+        done = 0
+
+    flushed = 0
+    missing = []
+    for start in range(done + 1, last + 1, chunk_size):
+        numbers = range(start, min(start + chunk_size, last + 1))
+        slots = cache.get_many([_slot_key(model, number) for number in numbers])
+        missing.extend(number for number in numbers if _slot_key(model, number) not in slots)
+
+        keys = {counter_key(model, pk): pk for pk in slots.values()}
+        buffered = {key: value for key, value in cache.get_many(list(keys)).items() if value}
+        if not buffered:
+            continue
+
+        with transaction.atomic():
+            apply_view_deltas(model, {keys[key]: value for key, value in buffered.items()})
+
+        # Вычитаем ровно перенесённое: просмотры, пришедшие после get_many, останутся в кэше
+        for key, value in buffered.items():
+            try:
+                remaining = cache.decr(key, value)
+            except ValueError:
+                continue
+            if remaining > 0:
+                # Остаток пришёл во время сброса и мог не попасть в журнал (счётчик не проходил через 1)
+                _mark_dirty(model, keys[key])
+        flushed += sum(buffered.values())
+
+    # Запись журнала может быть ещё не дописана (номер уже выдан) — перечитаем её
+    # при следующем сбросе; если её нет и тогда, процесс не дописал её и она пропускается
+    if missing and cache.get(_dirty_key(model, 'gap')) != missing[0]:
+        cache.set(_dirty_key(model, 'gap'), missing[0], DIRTY_SLOT_TIMEOUT)
+        last = missing[0] - 1
+    cache.set(_dirty_key(model, 'done'), last, None)
+    return flushed
+
+
+def drain_spool(chunk_size=FLUSH_CHUNK_SIZE):
+    """Перенести просмотры из файлового журнала в БД; возвращает ``{label: число просмотров}``."""
+    directory = spool_dir()
+    path = directory / SPOOL_NAME
+    if path.exists():
+        # Новые просмотры пойдут в новый файл; незавершённые прошлые разборы подхватываются ниже
+        os.replace(path, directory / f'{SPOOL_NAME}.{time.time_ns()}.draining')
+        time.sleep(SPOOL_SETTLE_SECONDS)
+
+    drained = sorted(directory.glob(f'{SPOOL_NAME}.*.draining')) if directory.exists() else []
+    views = Counter()
+    for drained_path in drained:
+        with open(drained_path, encoding='utf-8') as spool:
+            for line in spool:
+                label, _separator, pk = line.strip().partition(' ')
+                if pk:
+                    views[(label, pk)] += 1
+
+    totals = Counter()
+    with transaction.atomic():
+        for label in VIEW_COUNTER_MODELS:
+            model = apps.get_model(label)
+            to_python = model._meta.pk.to_python
+            deltas = {
+                to_python(pk): count
+                for (row_label, pk), count in views.items()
+                if row_label == model._meta.label_lower
+            }
+            pks = list(deltas)
+            for offset in range(0, len(pks), chunk_size):
+                apply_view_deltas(model, {pk: deltas[pk] for pk in pks[offset:offset + chunk_size]})
+            totals[label] = sum(deltas.values())
+
+    for drained_path in drained:
+        drained_path.unlink()
+    return dict(totals)
+
+
+def flush_view_counters(chunk_size=FLUSH_CHUNK_SIZE):
+    """Сбросить буферы всех моделей; возвращает ``{label: число просмотров}``."""
+    totals = Counter(drain_spool(chunk_size=chunk_size))
+    if is_shared_cache():
+        for label in VIEW_COUNTER_MODELS:
+            totals[label] += flush_model_views(apps.get_model(label), chunk_size=chunk_size)
+    return {label: totals[label] for label in VIEW_COUNTER_MODELS}
@@ -1,4 +1,3 @@
-from decimal import Decimal, InvalidOperation
 import json
 from urllib.parse import parse_qsl, urlencode
 
@@ -16,7 +15,11 @@ from django.utils.translation import gettext, ngettext, get_language, get_langua
 from django.conf import settings
 
 from apps.currency.services import CurrencyService
+from apps.core import search
 from apps.core.utils import build_query_string
+from apps.properties.filters import CatalogFilter
+from apps.properties.inventory import CachedCountPaginator, cached_count
+from apps.properties.map_payload import defer_text_columns
 from apps.properties.models import Property, PropertyType
 from apps.properties.views import PropertyListView
 from apps.locations.models import District
@@ -27,8 +30,18 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+PER_SQM_CURRENCIES = ('THB', 'USD', 'RUB')
+
+
 def serialize_properties_for_js(properties):
     """Сериализация объектов недвижимости для JavaScript"""
+    properties = list(properties)
+    # Цены продажи во всех валютах одним пакетом (нужны только для цены за м²)
+    sale_prices = {
+        code: Property.prices_in_currency(properties, code, 'sale')
+        for code in PER_SQM_CURRENCIES
+    }
+
     result = []
     for prop in properties:
         main_image_url = ''
@@ -68,9 +81,15 @@ def serialize_properties_for_js(properties):
             'price_rent_thb': float(prop.price_rent_monthly_thb) if prop.price_rent_monthly_thb else 0,
             'price_rent_rub': float(prop.price_rent_monthly_rub) if prop.price_rent_monthly_rub else 0,
             # Цены за квадратный метр
-            'price_per_sqm_thb': prop.get_formatted_price_per_sqm('THB', prop.deal_type),
-            'price_per_sqm_usd': prop.get_formatted_price_per_sqm('USD', prop.deal_type), 
-            'price_per_sqm_rub': prop.get_formatted_price_per_sqm('RUB', prop.deal_type),
+            'price_per_sqm_thb': prop.get_formatted_price_per_sqm(
+                'THB', prop.deal_type, price=sale_prices['THB'][prop.pk]
+            ),
+            'price_per_sqm_usd': prop.get_formatted_price_per_sqm(
+                'USD', prop.deal_type, price=sale_prices['USD'][prop.pk]
+            ),
+            'price_per_sqm_rub': prop.get_formatted_price_per_sqm(
+                'RUB', prop.deal_type, price=sale_prices['RUB'][prop.pk]
+            ),
             # Специальное предложение
             'special_offer': prop.special_offer or '',
         })
@@ -88,7 +107,7 @@ class HomeView(TemplateView):
             is_featured=True,
             is_active=True,
             status='available'
-        ).select_related('district', 'property_type').prefetch_related('images').order_by('-featured_priority', '-updated_at')
+        ).select_related('district', 'property_type', 'main_image').prefetch_related('images').order_by('-featured_priority', '-updated_at')
         
         featured_villa = list(base_featured.filter(property_type__name='villa')[:9])
         featured_condo = list(base_featured.filter(property_type__name='condo')[:9])
@@ -170,7 +189,7 @@ class HomeView(TemplateView):
         context['recent_properties'] = Property.objects.filter(
             is_active=True,
             status='available'
-        ).select_related('district', 'location', 'property_type').prefetch_related('images').order_by('-created_at')[:4]
+        ).select_related('district', 'location', 'property_type', 'main_image').prefetch_related('images').order_by('-created_at')[:4]
         
         # Последние новости (3 новости для главной страницы)
         context['latest_news'] = BlogPost.get_published().select_related('category', 'author').order_by('-published_at')[:3]
@@ -242,27 +261,11 @@ class SearchView(TemplateView):
         properties = Property.objects.filter(
             is_active=True,
             status='available'
-        ).select_related('district', 'property_type').prefetch_related('images')
-
-        # Фильтрация
-        if query:
-            properties = properties.filter(
-                Q(title__icontains=query) |
-                Q(description__icontains=query) |
-                Q(address__icontains=query)
-            )
+        ).select_related('district', 'property_type', 'main_image').prefetch_related('images')
 
-        if property_type:
-            properties = properties.filter(property_type__name=property_type)
-
-        if district:
-            properties = properties.filter(district__slug=district)
-        
-        if location:
-            properties = properties.filter(location__id=location)
-
-        if deal_type:
-            properties = properties.filter(deal_type=deal_type)
+        # Фильтрация (та же спецификация, что и в каталоге)
+        catalog_filter = CatalogFilter.from_request(self.request)
+        properties = catalog_filter.apply(properties)
 
         sort_param = self.request.GET.get('sort')
         sort_by = sort_param or '-created_at'
@@ -275,6 +278,12 @@ class SearchView(TemplateView):
         ]
 
         ordering = []
+        if query and not sort_param:
+            # Релевантность полнотекстового поиска, затем приоритет размещения
+            properties = properties.annotate(
+                search_rank=search.search_rank(query, get_language(), prefix='search_document__')
+            )
+            ordering.extend(['-search_rank', '-featured_priority'])
         if not sort_param:
             ordering.append('-is_featured')
 
@@ -288,34 +297,9 @@ class SearchView(TemplateView):
         # Получаем текущую валюту (аналогично context_processor)
         selected_currency_code = CurrencyService.get_selected_currency_code(self.request)
         current_currency = CurrencyService.get_currency_by_code(selected_currency_code)
-        sale_field, rent_field = CurrencyService.get_price_field_names(selected_currency_code)
-
-        if min_price:
-            try:
-                min_val = Decimal(min_price)
-                price_filter = Q(**{f"{sale_field}__gte": min_val})
-                if rent_field:
-                    price_filter |= Q(**{f"{rent_field}__gte": min_val})
-                properties = properties.filter(price_filter)
-            except (InvalidOperation, ValueError):
-                pass
-
-        if max_price:
-            try:
-                max_val = Decimal(max_price)
-                price_filter = Q(**{f"{sale_field}__lte": max_val})
-                if rent_field:
-                    price_filter |= Q(**{f"{rent_field}__lte": max_val})
-                properties = properties.filter(price_filter)
-            except (InvalidOperation, ValueError):
-                pass
-
-        if bedrooms:
-            properties = properties.filter(bedrooms=bedrooms)
 
         # Пагинация
-        from django.core.paginator import Paginator
-        paginator = Paginator(properties, 12)
+        paginator = CachedCountPaginator(properties, 12, count=cached_count(catalog_filter))
         page_number = self.request.GET.get('page')
         page_obj = paginator.get_page(page_number)
 
@@ -367,7 +351,11 @@ class MapView(TemplateView):
             status='available',
             latitude__isnull=False,
             longitude__isnull=False
-        ).select_related('district', 'property_type', 'agent', 'contact_person').prefetch_related('images')
+        ).select_related(
+            'district', 'location', 'property_type', 'agent', 'contact_person', 'main_image'
+        ).prefetch_related('images')
+        # Для маркеров описания не нужны — не тянем HTML на всех языках
+        properties_qs = defer_text_columns(properties_qs)
 
         property_list_view = PropertyListView()
         property_list_view.request = self.request
@@ -409,7 +397,7 @@ class MapView(TemplateView):
             is_featured=True,
             is_active=True,
             status='available'
-        ).select_related('district', 'property_type').prefetch_related('images')
+        ).select_related('district', 'property_type', 'main_image').prefetch_related('images')
 
         context['featured_properties_villa'] = mark_safe(serialize_properties_for_js(
             featured_base.filter(property_type__name='villa')[:9]
@@ -644,7 +632,7 @@ class ServiceDetailView(DetailView):
             is_featured=True,
             is_active=True,
             status='available'
-        ).select_related('district', 'property_type').prefetch_related('images').order_by('-featured_priority', '-updated_at')
+        ).select_related('district', 'property_type', 'main_image').prefetch_related('images').order_by('-featured_priority', '-updated_at')
         
         # Фильтруем по типу услуги
         if service.slug == 'buying-property':
@@ -5,4 +5,7 @@ from django.utils.translation import gettext_lazy as _
 class CurrencyConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.currency'
-    verbose_name = _('Валюты и курсы')
\ No newline at end of file
+    verbose_name = _('Валюты и курсы')
+
+    def ready(self):
+        import apps.currency.signals
@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand
 from django.db import transaction
 from apps.currency.models import Currency, ExchangeRate
+from apps.currency.rates import bump_rates_version
 from apps.properties.models import Property
 from decimal import Decimal
 from datetime import date
@@ -140,6 +141,8 @@ class Command(BaseCommand):
             # Устанавливаем THB как базовую валюту
             Currency.objects.filter(code='USD').update(is_base=False)
             Currency.objects.filter(code='THB').update(is_base=True)
+            # update() не вызывает сигналы — сбрасываем снимок курсов явно
+            bump_rates_version()
             
             self.stdout.write(
                 self.style.SUCCESS(
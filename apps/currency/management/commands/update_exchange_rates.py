@@ -3,7 +3,19 @@ from datetime import date
 from decimal import Decimal
 from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Round
 from apps.currency.models import Currency, ExchangeRate
+from apps.currency.rates import RateMatrix
+
+# Пересчитываемые колонки: (колонка с ценой в THB, колонка в валюте, код валюты)
+REPRICE_COLUMNS = (
+    ('price_sale_thb', 'price_sale_usd', 'USD'),
+    ('price_sale_thb', 'price_sale_rub', 'RUB'),
+    ('price_rent_monthly_thb', 'price_rent_monthly', 'USD'),
+    ('price_rent_monthly_thb', 'price_rent_monthly_rub', 'RUB'),
+)
 
 
 class Command(BaseCommand):
@@ -22,10 +34,16 @@ class Command(BaseCommand):
             default='https://api.exchangerate-api.com/v4/latest/',
             help='URL API для получения курсов валют'
         )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Показать изменения курсов и цен без записи в БД'
+        )
 
     def handle(self, *args, **options):
         base_currency_code = options['base_currency']
         api_url = options['api_url']
+        dry_run = options['dry_run']
         
         try:
             # Получаем базовую валюту
@@ -61,6 +79,7 @@ class Command(BaseCommand):
         today = date.today()
         updated_count = 0
         created_count = 0
+        new_rates = {}
 
         # Обновляем курсы для каждой целевой валюты
         for target_currency in target_currencies:
@@ -73,6 +92,11 @@ class Command(BaseCommand):
                 continue
 
             rate_value = Decimal(str(rates[target_code]))
+            new_rates[(base_currency_code, target_code)] = rate_value
+
+            if dry_run:
+                self.stdout.write(f'  ? Курс {base_currency_code}/{target_code}: {rate_value} (не сохранён)')
+                continue
             
             # Создаем или обновляем курс
             exchange_rate, created = ExchangeRate.objects.update_or_create(
@@ -93,68 +117,91 @@ class Command(BaseCommand):
                 self.stdout.write(f'  ~ Обновлен курс {base_currency_code}/{target_code}: {rate_value}')
 
         # Также обновляем цены в недвижимости
-        self.update_property_prices()
+        self.update_property_prices(new_rates, dry_run=dry_run)
 
         # Выводим итоги
+        if dry_run:
+            self.stdout.write(self.style.SUCCESS('ТЕСТОВЫЙ РЕЖИМ: изменения не сохранены'))
+            return
         self.stdout.write(
             self.style.SUCCESS(
                 f'Обновление завершено: создано {created_count}, обновлено {updated_count} курсов'
             )
         )
 
-    def update_property_prices(self):
-        """Обновляет цены в объектах недвижимости на основе новых курсов"""
-        from apps.properties.models import Property
-        
+    def update_property_prices(self, new_rates=None, dry_run=False):
+        """Пересчитывает цены в USD/RUB из цен в THB
+
+        Один UPDATE на колонку (цена в THB * курс с округлением до копеек)
+        только для строк, где значение меняется; так же пересчитываются
+        колонки цен в поисковых документах. ``save()`` и сигналы не
+        вызываются, поэтому версия инвентаря каталога увеличивается явно
+        (после коммита). Веб-процессы видят её только через общий кэш; с
+        процессным кэшем кэшированные счётчики, фасеты и карта обновятся
+        через ``LOCAL_CACHE_TIMEOUT`` секунд.
+        """
+        from apps.core.view_counters import is_shared_cache
+        from apps.properties.inventory import LOCAL_CACHE_TIMEOUT, bump_inventory_version
+        from apps.properties.models import Property, PropertySearchDocument
+
         self.stdout.write('Обновление цен в объектах недвижимости...')
-        
-        try:
-            usd_currency = Currency.objects.get(code='USD')
-            thb_currency = Currency.objects.get(code='THB') 
-            rub_currency = Currency.objects.get(code='RUB')
-        except Currency.DoesNotExist as e:
-            self.stdout.write(
-                self.style.WARNING(f'Не все необходимые валюты найдены: {e}')
-            )
-            return
 
-        # Теперь базовая валюта THB, поэтому ищем объекты с ценами в THB
-        properties = Property.objects.filter(price_sale_thb__isnull=False)
-        updated_properties = 0
+        # Последние курсы из БД с учётом ещё не сохранённых (--dry-run)
+        rates = RateMatrix.latest_rates()
+        rates.update(new_rates or {})
+        matrix = RateMatrix(list(Currency.objects.order_by('code')), rates)
+
+        total_changed = 0
+        documents_changed = 0
+        with transaction.atomic():
+            for source, target, currency_code in REPRICE_COLUMNS:
+                rate = matrix.rate('THB', currency_code)
+                if rate is None:
+                    self.stdout.write(self.style.WARNING(f'  Нет курса THB/{currency_code}, {target} пропущено'))
+                    continue
+
+                rate = Decimal(str(rate))
+                # Цены не переводимые; rewrite(False) — modeltranslation не умеет переписывать Round()
+                summary = self.reprice_column(Property.objects.rewrite(False), source, target, rate, dry_run)
+                document_summary = self.reprice_column(
+                    PropertySearchDocument.objects.all(), source, target, rate, dry_run
+                )
+                total_changed += summary['count']
+                documents_changed += document_summary['count']
+                self.stdout.write(
+                    f'  {target}: курс {rate}, изменится {summary["count"]} объектов, '
+                    f'сумма {summary["before"] or 0:,.2f} -> {summary["after"] or 0:,.2f}'
+                )
 
-        for prop in properties:
-            updated = False
-            
-            # Обновляем цены продажи (THB -> USD, RUB)
-            if prop.price_sale_thb:
-                # Обновляем цену в USD
-                usd_price = ExchangeRate.convert_amount(prop.price_sale_thb, thb_currency, usd_currency)
-                if usd_price:
-                    prop.price_sale_usd = usd_price
-                    updated = True
-                
-                # Обновляем цену в RUB
-                rub_price = ExchangeRate.convert_amount(prop.price_sale_thb, thb_currency, rub_currency)
-                if rub_price:
-                    prop.price_sale_rub = rub_price
-                    updated = True
-
-            # Обновляем цены аренды (THB -> USD, RUB)
-            if prop.price_rent_monthly_thb:
-                # Обновляем цену аренды в USD
-                usd_rent = ExchangeRate.convert_amount(prop.price_rent_monthly_thb, thb_currency, usd_currency)
-                if usd_rent:
-                    prop.price_rent_monthly = usd_rent
-                    updated = True
-                
-                # Обновляем цену аренды в RUB
-                rub_rent = ExchangeRate.convert_amount(prop.price_rent_monthly_thb, thb_currency, rub_currency)
-                if rub_rent:
-                    prop.price_rent_monthly_rub = rub_rent
-                    updated = True
-
-            if updated:
-                prop.save()
-                updated_properties += 1
-
-        self.stdout.write(f'  Обновлено цен в {updated_properties} объектах недвижимости')
\ No newline at end of file
+        # Поиск, счётчики и карта читают цены из поисковых документов
+        if (total_changed or documents_changed) and not dry_run:
+            transaction.on_commit(bump_inventory_version)
+            if not is_shared_cache():
+                self.stdout.write(self.style.WARNING(
+                    f'  Кэш не общий между процессами: веб-процессы увидят новые цены '
+                    f'в течение {LOCAL_CACHE_TIMEOUT} с'
+                ))
+
+        if dry_run:
+            self.stdout.write(f'  Было бы обновлено цен: {total_changed}')
+        else:
+            self.stdout.write(f'  Обновлено цен: {total_changed}')
+
+    @staticmethod
+    def reprice_column(queryset, source, target, rate, dry_run=False):
+        """Пересчитать колонку target = ROUND(source * rate, 2) одним UPDATE
+
+        Возвращает сводку по изменяемым строкам: count, before, after.
+        """
+        new_value = Round(
+            F(source) * Value(rate, output_field=DecimalField(max_digits=20, decimal_places=10)),
+            2,
+            output_field=DecimalField(max_digits=20, decimal_places=2),
+        )
+        changed = queryset.filter(
+            Q(**{f'{source}__gt': 0}) & (Q(**{f'{target}__isnull': True}) | ~Q(**{target: new_value}))
+        )
+        summary = changed.aggregate(count=Count('pk'), before=Sum(target), after=Sum(new_value))
+        if not dry_run and summary['count']:
+            changed.update(**{target: new_value})
+        return summary
@@ -0,0 +1,289 @@
+"""Матрица последних курсов валют для пакетной конвертации.
+
+Последние курсы всех пар загружаются одним запросом и раскладываются в
+квадратную матрицу NumPy ``rates[from, to]``: прямой курс, если его нет —
+обратный (1 / курс), если нет и его — кросс-курс через базовую валюту, как в
+``CurrencyService.convert_price``. Неизвестный курс — NaN. Список кортежей
+(сумма, из, в) конвертируется одним умножением с индексированием матрицы.
+
+Матрица хранится в памяти процесса как неизменяемый снимок и помечена
+версией курсов из общего кэша. Версия увеличивается при сохранении или
+удалении ``Currency``/``ExchangeRate`` (см. ``apps.currency.signals``) и в
+командах, меняющих курсы в обход сигналов; процесс замечает новую версию и
+перечитывает курсы. С процессным кэшем (LocMem, Dummy) изменения из других
+процессов не видны, поэтому снимок дополнительно живёт не дольше
+``LOCAL_SNAPSHOT_TTL`` секунд.
+
+``RateHistory`` — история курсов для пересчёта на произвольную дату: по
+каждой паре отсортированные массивы дат и курсов, курс на дату ищется
+бинарным поиском (``searchsorted``) — последний известный на эту дату.
+Хранится таким же версионным снимком процесса.
+"""
+import datetime
+import threading
+import time
+
+import numpy as np
+from django.core.cache import cache
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from apps.core.view_counters import is_shared_cache
+from .models import Currency, ExchangeRate
+
+RATES_VERSION_KEY = 'currency:rates-version'
+
+# Время жизни снимка, если кэш не общий между процессами, секунд
+LOCAL_SNAPSHOT_TTL = 5 * 60
+
+_snapshots = {}  # имя -> (версия, время загрузки, объект)
+_snapshot_lock = threading.Lock()
+
+
+class RateMatrix:
+    """Неизменяемый снимок валют и последних курсов между ними."""
+
+    def __init__(self, currencies, rates):
+        # currencies: список Currency; rates: {(код из, код в): курс}
+        self.currencies = {currency.code: currency for currency in currencies}
+        self.index = {code: position for position, code in enumerate(self.currencies)}
+        self.base_code = next((currency.code for currency in currencies if currency.is_base), None)
+
+        size = len(self.index)
+        matrix = np.full((size, size), np.nan)
+        np.fill_diagonal(matrix, 1.0)
+        # Сначала обратные курсы, затем прямые поверх них: прямой курс приоритетнее
+        for (source, target), rate in rates.items():
+            if source in self.index and target in self.index and rate:
+                matrix[self.index[target], self.index[source]] = 1.0 / float(rate)
+        for (source, target), rate in rates.items():
+            if source in self.index and target in self.index and rate:
+                matrix[self.index[source], self.index[target]] = float(rate)
+
+        if self.base_code is not None:
+            base = self.index[self.base_code]
+            cross = matrix[:, base, None] * matrix[None, base, :]
+            missing = np.isnan(matrix)
+            matrix[missing] = cross[missing]
+
+        # Лишняя строка/столбец NaN — индекс для неизвестных валют в convert_many
+        padded = np.full((size + 1, size + 1), np.nan)
+        padded[:size, :size] = matrix
+        padded.setflags(write=False)
+        self._padded = padded
+        self.rates = padded[:size, :size]
+
+    @staticmethod
+    def latest_rates():
+        """Последний курс каждой пары одним запросом: {(код из, код в): Decimal}."""
+        latest_date = ExchangeRate.objects.filter(
+            base_currency=OuterRef('base_currency'),
+            target_currency=OuterRef('target_currency'),
+        ).order_by('-date').values('date')[:1]
+        return {
+            (source, target): rate
+            for source, target, rate in ExchangeRate.objects.filter(
+                date=Subquery(latest_date),
+            ).values_list('base_currency__code', 'target_currency__code', 'rate')
+        }
+
+    @classmethod
+    def load(cls):
+        """Загрузить валюты и последний курс каждой пары (два запроса)."""
+        return cls(list(Currency.objects.order_by('code')), cls.latest_rates())
+
+    def is_active(self, code):
+        currency = self.currencies.get(code)
+        return currency is not None and currency.is_active
+
+    def rate(self, from_code, to_code):
+        """Курс между валютами (float) или None."""
+        if from_code == to_code:
+            return 1.0
+        if from_code not in self.index or to_code not in self.index:
+            return None
+        value = self.rates[self.index[from_code], self.index[to_code]]
+        return None if np.isnan(value) else float(value)
+
+    def convert_many(self, items):
+        """Конвертировать список (сумма, из, в); результат — список float или None.
+
+        None возвращается для пустой суммы, неизвестной валюты или пары без курса.
+        """
+        items = list(items)
+        if not items:
+            return []
+
+        missing = len(self.index)
+        amounts = np.array(
+            [np.nan if amount is None else float(amount) for amount, _source, _target in items],
+            dtype=np.float64,
+        )
+        sources = np.array([self.index.get(source, missing) for _amount, source, _target in items])
+        targets = np.array([self.index.get(target, missing) for _amount, _source, target in items])
+        same = np.array([source == target for _amount, source, target in items])
+        factors = np.where(same, 1.0, self._padded[sources, targets])
+
+        result = amounts * factors
+        return [None if np.isnan(value) else value for value in result.tolist()]
+
+    def convert(self, amount, from_code, to_code):
+        return self.convert_many([(amount, from_code, to_code)])[0]
+
+
+def _as_day(value):
+    """Дата (date, datetime или ISO-строка) -> numpy datetime64[D]."""
+    if isinstance(value, datetime.datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        value = value.date()
+    return np.datetime64(value, 'D')
+
+
+class RateHistory:
+    """Неизменяемая история курсов: по каждой паре массивы дат и курсов."""
+
+    def __init__(self, rows, base_code=None):
+        # rows: (код из, код в, дата, курс), отсортированные по паре и дате
+        grouped = {}
+        for source, target, day, rate in rows:
+            if rate:
+                grouped.setdefault((source, target), ([], []))
+                grouped[(source, target)][0].append(day)
+                grouped[(source, target)][1].append(float(rate))
+
+        self.base_code = base_code
+        self.pairs = {}
+        for pair, (days, rates) in grouped.items():
+            days = np.array(days, dtype='datetime64[D]')
+            rates = np.array(rates, dtype=np.float64)
+            days.setflags(write=False)
+            rates.setflags(write=False)
+            self.pairs[pair] = (days, rates)
+
+    @classmethod
+    def load(cls):
+        """Загрузить все курсы одним запросом."""
+        rows = ExchangeRate.objects.order_by(
+            'base_currency__code', 'target_currency__code', 'date',
+        ).values_list('base_currency__code', 'target_currency__code', 'date', 'rate')
+        base_code = Currency.objects.filter(is_base=True).values_list('code', flat=True).first()
+        return cls(rows.iterator(), base_code)
+
+    def _stored_rates(self, source, target, days):
+        """Курсы пары на даты по записанным курсам (прямым или обратным); NaN — нет курса."""
+        result = np.full(len(days), np.nan)
+        # Сначала обратный курс, затем прямой поверх него: прямой приоритетнее
+        for (pair_source, pair_target), invert in (((target, source), True), ((source, target), False)):
+            if (pair_source, pair_target) not in self.pairs:
+                continue
+            pair_days, pair_rates = self.pairs[(pair_source, pair_target)]
+            positions = np.searchsorted(pair_days, days, side='right') - 1
+            known = positions >= 0
+            values = pair_rates[np.maximum(positions, 0)]
+            if invert:
+                values = 1.0 / values
+            result = np.where(known, values, result)
+        return result
+
+    def rates_as_of(self, source, target, days):
+        """Курсы source -> target на каждую дату массива ``days`` (datetime64[D])."""
+        days = np.asarray(days, dtype='datetime64[D]')
+        if source == target:
+            return np.ones(len(days))
+
+        result = self._stored_rates(source, target, days)
+        missing = np.isnan(result)
+        base = self.base_code
+        if missing.any() and base is not None and base not in (source, target):
+            # Кросс-курс через базовую валюту на ту же дату
+            cross = self._stored_rates(source, base, days[missing]) * self._stored_rates(base, target, days[missing])
+            result[missing] = cross
+        return result
+
+    def rate_as_of(self, source, target, day):
+        """Курс на дату (float) или None."""
+        value = self.rates_as_of(source, target, [_as_day(day)])[0]
+        return None if np.isnan(value) else float(value)
+
+    def convert_many(self, items):
+        """Конвертировать список (сумма, из, в, дата) по курсам на эти даты.
+
+        Элементы группируются по паре валют, для каждой пары курсы на все
+        даты ищутся одним ``searchsorted``. Результат — список float или None.
+        """
+        items = list(items)
+        amounts = np.array(
+            [np.nan if amount is None else float(amount) for amount, _source, _target, _day in items],
+            dtype=np.float64,
+        )
+        days = np.array([_as_day(day) for _amount, _source, _target, day in items], dtype='datetime64[D]')
+        factors = np.full(len(items), np.nan)
+
+        positions_by_pair = {}
+        for position, (_amount, source, target, _day) in enumerate(items):
+            positions_by_pair.setdefault((source, target), []).append(position)
+        for (source, target), positions in positions_by_pair.items():
+            positions = np.array(positions)
+            factors[positions] = self.rates_as_of(source, target, days[positions])
+
+        result = amounts * factors
+        return [None if np.isnan(value) else value for value in result.tolist()]
+
+    def convert(self, amount, from_code, to_code, day):
+        return self.convert_many([(amount, from_code, to_code, day)])[0]
+
+
+def _initial_version():
+    # Начинаем с текущего времени, чтобы после вытеснения ключа не вернуться к старым версиям
+    return int(time.time() * 1000)
+
+
+def get_rates_version():
+    version = cache.get(RATES_VERSION_KEY)
+    if version is None:
+        cache.add(RATES_VERSION_KEY, _initial_version(), None)
+        version = cache.get(RATES_VERSION_KEY)
+    return version
+
+
+def bump_rates_version():
+    try:
+        return cache.incr(RATES_VERSION_KEY)
+    except ValueError:
+        version = _initial_version()
+        cache.set(RATES_VERSION_KEY, version, None)
+        return version
+
+
+def _is_fresh(snapshot, version):
+    if snapshot is None or snapshot[0] != version:
+        return False
+    return is_shared_cache() or time.monotonic() - snapshot[1] < LOCAL_SNAPSHOT_TTL
+
+
+def _current_snapshot(name, loader):
+    """Версионный снимок процесса; loader() вызывается при смене версии курсов.
+
+    Возвращаемые объекты общие для всех потоков процесса и не должны изменяться.
+    """
+    version = get_rates_version()
+    snapshot = _snapshots.get(name)
+    if not _is_fresh(snapshot, version):
+        with _snapshot_lock:
+            snapshot = _snapshots.get(name)
+            if not _is_fresh(snapshot, version):
+                # Версия прочитана до загрузки: изменение во время загрузки даст новую версию
+                snapshot = (version, time.monotonic(), loader())
+                _snapshots[name] = snapshot
+    return snapshot[2]
+
+
+def current_rate_matrix():
+    """Снимок матрицы последних курсов процесса."""
+    return _current_snapshot('matrix', RateMatrix.load)
+
+
+def current_rate_history():
+    """Снимок истории курсов процесса."""
+    return _current_snapshot('history', RateHistory.load)
@@ -1,5 +1,7 @@
 from django.utils import timezone
+from apps.core.request_cache import request_memo
 from .models import Currency, ExchangeRate, CurrencyPreference
+from .rates import current_rate_history, current_rate_matrix
 
 
 class CurrencyService:
@@ -8,26 +10,37 @@ class CurrencyService:
     @staticmethod
     def get_currency_for_language(language_code):
         """Получить валюту по умолчанию для языка"""
-        try:
-            preference = CurrencyPreference.objects.get(language=language_code)
-            return preference.default_currency
-        except CurrencyPreference.DoesNotExist:
+        def load():
+            preference = CurrencyPreference.objects.select_related('default_currency').filter(
+                language=language_code
+            ).first()
+            if preference:
+                return preference.default_currency
             # Если предпочтение не найдено, возвращаем базовую валюту
-            base_currency = Currency.objects.filter(is_base=True).first()
+            base_currency = CurrencyService.get_base_currency()
             return base_currency if base_currency else Currency.objects.filter(code='USD').first()
+
+        return request_memo(('currency-for-language', language_code), load)
+
+    @staticmethod
+    def get_base_currency():
+        """Базовая валюта (из снимка курсов процесса)"""
+        matrix = CurrencyService.get_rate_matrix()
+        return matrix.currencies.get(matrix.base_code)
     
     @staticmethod
     def get_active_currencies():
-        """Получить все активные валюты"""
-        return Currency.objects.filter(is_active=True).order_by('code')
+        """Получить все активные валюты (по коду, из снимка курсов процесса)"""
+        return [
+            currency for currency in CurrencyService.get_rate_matrix().currencies.values()
+            if currency.is_active
+        ]
     
     @staticmethod
     def get_currency_by_code(code):
-        """Получить валюту по коду"""
-        try:
-            return Currency.objects.get(code=code, is_active=True)
-        except Currency.DoesNotExist:
-            return None
+        """Получить валюту по коду (из снимка курсов процесса)"""
+        matrix = CurrencyService.get_rate_matrix()
+        return matrix.currencies[code] if matrix.is_active(code) else None
 
     @staticmethod
     def get_selected_currency_code(request):
@@ -52,38 +65,67 @@ class CurrencyService:
 
         return mapping.get((currency_code or 'USD').upper(), mapping['USD'])
     
+    @staticmethod
+    def get_rate_matrix():
+        """Матрица последних курсов и валют
+
+        Снимок процесса перечитывается только при смене версии курсов; в
+        пределах HTTP-запроса версия проверяется один раз.
+        """
+        return request_memo(('rate-matrix',), current_rate_matrix)
+
+    @staticmethod
+    def convert_many(items):
+        """Конвертировать список (сумма, из, в) одним шагом; список float или None.
+
+        Как и в convert_price, конвертация между неактивными валютами не выполняется.
+        """
+        items = list(items)
+        matrix = CurrencyService.get_rate_matrix()
+        results = matrix.convert_many(items)
+        return [
+            result if source == target or (matrix.is_active(source) and matrix.is_active(target)) else None
+            for result, (_amount, source, target) in zip(results, items)
+        ]
+
     @staticmethod
     def convert_price(amount, from_currency_code, to_currency_code):
         """Конвертировать цену между валютами"""
         if from_currency_code == to_currency_code:
             return amount
-            
-        from_currency = CurrencyService.get_currency_by_code(from_currency_code)
-        to_currency = CurrencyService.get_currency_by_code(to_currency_code)
-        
-        if not from_currency or not to_currency:
+        if amount is None:
             return None
+        return CurrencyService.convert_many([(amount, from_currency_code, to_currency_code)])[0]
+    
+    @staticmethod
+    def get_rate_history():
+        """История курсов для пересчёта на дату (снимок процесса, как и матрица)"""
+        return request_memo(('rate-history',), current_rate_history)
 
-        direct_conversion = ExchangeRate.convert_amount(amount, from_currency, to_currency)
-        if direct_conversion is not None:
-            return direct_conversion
+    @staticmethod
+    def convert_as_of(amount, from_currency_code, to_currency_code, date):
+        """Конвертировать сумму по курсу, действовавшему на дату
 
-        base_currency = Currency.objects.filter(is_base=True).first()
-        if not base_currency or base_currency in (from_currency, to_currency):
+        Берётся последний курс не позже даты: прямой, обратный или кросс-курс
+        через базовую валюту. Активность валют не проверяется — история
+        остаётся верной и для отключённых валют.
+        """
+        if amount is None:
             return None
+        return CurrencyService.get_rate_history().convert(amount, from_currency_code, to_currency_code, date)
 
-        amount_in_base = ExchangeRate.convert_amount(amount, from_currency, base_currency)
-        if amount_in_base is None:
-            return None
+    @staticmethod
+    def convert_many_as_of(items):
+        """Пакетная конвертация списка (сумма, из, в, дата); список float или None"""
+        return CurrencyService.get_rate_history().convert_many(items)
 
-        return ExchangeRate.convert_amount(amount_in_base, base_currency, to_currency)
-    
     @staticmethod
     def format_price(amount, currency_code):
         """Отформатировать цену в указанной валюте"""
-        currency = CurrencyService.get_currency_by_code(currency_code)
-        if not currency:
+        matrix = CurrencyService.get_rate_matrix()
+        if not matrix.is_active(currency_code):
             return f"{amount:,.2f} {currency_code}"
+        currency = matrix.currencies[currency_code]
             
         symbol = currency.symbol
         decimal_places = currency.decimal_places
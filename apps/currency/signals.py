@@ -0,0 +1,18 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Currency, ExchangeRate
+from .rates import bump_rates_version
+
+
+@receiver(post_save, sender=Currency, dispatch_uid='currency.currency_saved_rates')
+@receiver(post_delete, sender=Currency, dispatch_uid='currency.currency_deleted_rates')
+@receiver(post_save, sender=ExchangeRate, dispatch_uid='currency.rate_saved_rates')
+@receiver(post_delete, sender=ExchangeRate, dispatch_uid='currency.rate_deleted_rates')
+def invalidate_rate_matrix(sender, raw=False, **kwargs):
+    """Курсы или валюты изменились — процессы перечитают матрицу курсов."""
+    if raw:
+        return
+    # После коммита: иначе другой процесс может перечитать старые курсы под новой версией
+    transaction.on_commit(bump_rates_version)
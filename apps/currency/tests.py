@@ -0,0 +1,103 @@
+import datetime
+
+from django.test import SimpleTestCase
+
+from .models import Currency
+from .rates import RateHistory, RateMatrix
+
+
+def currencies(base='THB'):
+    return [
+        Currency(code=code, is_base=code == base, is_active=True)
+        for code in ('EUR', 'RUB', 'THB', 'USD')
+    ]
+
+
+class RateMatrixTests(SimpleTestCase):
+    """Прямые, обратные и кросс-курсы матрицы последних курсов"""
+
+    def test_direct_and_inverse_rates(self):
+        matrix = RateMatrix(currencies(), {('THB', 'USD'): 0.03})
+
+        self.assertAlmostEqual(matrix.rate('THB', 'USD'), 0.03)
+        self.assertAlmostEqual(matrix.rate('USD', 'THB'), 1 / 0.03)
+        self.assertEqual(matrix.rate('USD', 'USD'), 1.0)
+
+    def test_direct_rate_takes_precedence_over_inverse(self):
+        # Записанные курсы несогласованы: прямой курс пары приоритетнее обратного
+        matrix = RateMatrix(currencies(), {('THB', 'USD'): 0.03, ('USD', 'THB'): 35.0})
+
+        self.assertAlmostEqual(matrix.rate('THB', 'USD'), 0.03)
+        self.assertAlmostEqual(matrix.rate('USD', 'THB'), 35.0)
+
+    def test_cross_rate_through_base_currency(self):
+        matrix = RateMatrix(currencies(), {('THB', 'USD'): 0.03, ('THB', 'RUB'): 2.6})
+
+        self.assertAlmostEqual(matrix.rate('USD', 'RUB'), (1 / 0.03) * 2.6)
+        self.assertAlmostEqual(matrix.rate('RUB', 'USD'), (1 / 2.6) * 0.03)
+        self.assertAlmostEqual(matrix.convert(100, 'USD', 'RUB'), 100 * (1 / 0.03) * 2.6)
+
+    def test_stored_pair_beats_cross_rate(self):
+        matrix = RateMatrix(currencies(), {('THB', 'USD'): 0.03, ('THB', 'RUB'): 2.6, ('USD', 'RUB'): 90.0})
+        self.assertAlmostEqual(matrix.rate('USD', 'RUB'), 90.0)
+
+    def test_unknown_rate_and_currency(self):
+        matrix = RateMatrix(currencies(), {('THB', 'USD'): 0.03})
+
+        self.assertIsNone(matrix.rate('EUR', 'USD'))
+        self.assertIsNone(matrix.rate('XXX', 'USD'))
+        self.assertIsNone(matrix.convert(10, 'EUR', 'RUB'))
+
+    def test_convert_many(self):
+        matrix = RateMatrix(currencies(), {('THB', 'USD'): 0.03, ('THB', 'RUB'): 2.6})
+        result = matrix.convert_many([
+            (1000, 'THB', 'USD'),
+            (None, 'THB', 'USD'),
+            (50, 'XXX', 'USD'),
+            (50, 'XXX', 'XXX'),
+            (10, 'USD', 'RUB'),
+        ])
+
+        self.assertAlmostEqual(result[0], 30.0)
+        self.assertIsNone(result[1])
+        self.assertIsNone(result[2])
+        self.assertEqual(result[3], 50.0)
+        self.assertAlmostEqual(result[4], 10 * (1 / 0.03) * 2.6)
+        self.assertEqual(matrix.convert_many([]), [])
+
+
+class RateHistoryTests(SimpleTestCase):
+    """Курс на дату — последний известный на эту дату"""
+
+    def setUp(self):
+        self.history = RateHistory([
+            ('THB', 'RUB', datetime.date(2024, 1, 1), 2.5),
+            ('THB', 'RUB', datetime.date(2024, 3, 1), 2.7),
+            ('THB', 'USD', datetime.date(2024, 1, 1), 0.028),
+            ('THB', 'USD', datetime.date(2024, 2, 1), 0.029),
+        ], base_code='THB')
+
+    def test_rate_as_of_date(self):
+        self.assertIsNone(self.history.rate_as_of('THB', 'USD', datetime.date(2023, 12, 31)))
+        self.assertAlmostEqual(self.history.rate_as_of('THB', 'USD', datetime.date(2024, 1, 15)), 0.028)
+        self.assertAlmostEqual(self.history.rate_as_of('THB', 'USD', datetime.date(2024, 2, 1)), 0.029)
+        self.assertAlmostEqual(self.history.rate_as_of('USD', 'THB', datetime.date(2024, 6, 1)), 1 / 0.029)
+
+    def test_cross_rate_as_of_date(self):
+        self.assertAlmostEqual(
+            self.history.rate_as_of('USD', 'RUB', datetime.date(2024, 2, 15)),
+            (1 / 0.029) * 2.5,
+        )
+
+    def test_convert_many_mixed_dates(self):
+        result = self.history.convert_many([
+            (100, 'THB', 'RUB', datetime.date(2024, 2, 1)),
+            (100, 'THB', 'RUB', datetime.date(2024, 3, 2)),
+            (100, 'THB', 'USD', datetime.date(2023, 1, 1)),
+            (100, 'THB', 'THB', datetime.date(2023, 1, 1)),
+        ])
+
+        self.assertAlmostEqual(result[0], 250.0)
+        self.assertAlmostEqual(result[1], 270.0)
+        self.assertIsNone(result[2])
+        self.assertEqual(result[3], 100.0)
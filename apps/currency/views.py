@@ -44,7 +44,7 @@ class ExchangeRatesView(View):
     def get(self, request):
         try:
             rates = {}
-            currencies = Currency.objects.filter(is_active=True)
+            currencies = CurrencyService.get_active_currencies()
             
             for from_currency in currencies:
                 for to_currency in currencies:
@@ -78,7 +78,7 @@ class DistrictDetailView(DetailView):
             district=self.object,
             is_active=True,
             status='available'
-        ).select_related('property_type').prefetch_related('images')
+        ).select_related('property_type', 'main_image').prefetch_related('images')
 
         currency_code = CurrencyService.get_selected_currency_code(self.request)
         sale_field, _ = CurrencyService.get_price_field_names(currency_code)
@@ -183,7 +183,7 @@ class LocationDetailView(DetailView):
             location=self.object,
             is_active=True,
             status='available'
-        ).select_related('property_type').prefetch_related('images')
+        ).select_related('property_type', 'main_image').prefetch_related('images')
 
         currency_code = CurrencyService.get_selected_currency_code(self.request)
         sale_field, _ = CurrencyService.get_price_field_names(currency_code)
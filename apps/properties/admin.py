@@ -9,8 +9,9 @@ from tinymce.widgets import TinyMCE
 # from modeltranslation.admin import TranslationAdmin
 from .models import (
     Property, PropertyImage, PropertyType, Developer,
-    PropertyFeature, PropertyFeatureRelation
+    PropertyFeature, PropertyFeatureRelation, PropertySearchDocument
 )
+from .inventory import bump_inventory_version
 from .services import translate_property, translate_property_type, translate_developer, translate_property_feature
 
 
@@ -72,8 +73,8 @@ class BaseAdminWithRequiredFields(admin.ModelAdmin):
 class PropertyImageInline(admin.TabularInline):
     model = PropertyImage
     extra = 1
-    fields = ('drag_handle', 'image_preview', 'image', 'title', 'is_main', 'order')
-    readonly_fields = ('drag_handle', 'image_preview')
+    fields = ('drag_handle', 'image_preview', 'image', 'title', 'is_main', 'order', 'processing_state')
+    readonly_fields = ('drag_handle', 'image_preview', 'processing_state')
     
     class Media:
         css = {
@@ -164,6 +165,9 @@ class PropertyAdmin(BaseAdminWithRequiredFields):
     date_hierarchy = 'created_at'
     ordering = ('-featured_priority', '-created_at')
     
+    class Media:
+        js = ('admin/js/bulk_image_upload.js',)
+
     actions = ['make_active', 'make_inactive', 'make_featured', 'make_not_featured', 'auto_translate', 'force_retranslate']
 
     readonly_fields = ('translation_status_note',)
@@ -171,12 +175,16 @@ class PropertyAdmin(BaseAdminWithRequiredFields):
     def make_active(self, request, queryset):
         """Сделать недвижимость активной (опубликованной)"""
         updated = queryset.update(is_active=True)
+        PropertySearchDocument.sync_properties(queryset)
+        bump_inventory_version()
         self.message_user(request, f'{updated} объектов недвижимости опубликовано.')
     make_active.short_description = "✅ Опубликовать выбранные объекты"
     
     def make_inactive(self, request, queryset):
         """Снять недвижимость с публикации"""
         updated = queryset.update(is_active=False)
+        PropertySearchDocument.sync_properties(queryset)
+        bump_inventory_version()
         self.message_user(request, f'{updated} объектов недвижимости снято с публикации.')
     make_inactive.short_description = "❌ Снять с публикации выбранные объекты"
     
@@ -364,7 +372,7 @@ class PropertyAdmin(BaseAdminWithRequiredFields):
                     <div class="bulk-upload-spinner" style="width: 48px; height: 48px; border-radius: 50%; border: 5px solid #e5e7eb; border-top-color: #007cba; margin: 0 auto 20px; animation: bulk-spin 0.9s linear infinite;"></div>
                     <h4 style="margin-bottom: 10px; font-size: 20px; color: #111827;">Идёт загрузка изображений</h4>
                     <p id="upload-status-text" style="margin: 0; color: #374151; font-size: 15px;">Передаём файлы на сервер...</p>
-                    <p id="upload-status-hint" style="margin-top: 10px; font-size: 13px; color: #6b7280;">Пожалуйста, не закрывайте страницу — изображения автоматически конвертируются в WebP.</p>
+                    <p id="upload-status-hint" style="margin-top: 10px; font-size: 13px; color: #6b7280;">Пожалуйста, не закрывайте страницу — конвертация в WebP выполняется в фоне после загрузки.</p>
                 </div>
             </div>
 
@@ -384,7 +392,6 @@ class PropertyAdmin(BaseAdminWithRequiredFields):
                 const statusModal = document.getElementById('bulk-upload-status-modal');
                 const statusTextEl = document.getElementById('upload-status-text');
                 const statusHintEl = document.getElementById('upload-status-hint');
-                let statusUpdateTimer = null;
                 
                 // Drag & Drop функциональность
                 uploadArea.addEventListener('dragover', function(e) {{
@@ -478,30 +485,15 @@ class PropertyAdmin(BaseAdminWithRequiredFields):
                     if (statusTextEl && mainText) {{
                         statusTextEl.textContent = mainText;
                     }}
-                    if (statusHintEl) {{
-                        statusHintEl.textContent = hintText || 'Пожалуйста, не закрывайте страницу — изображения автоматически конвертируются в WebP.';
+                    if (statusHintEl && hintText) {{
+                        statusHintEl.textContent = hintText;
                     }}
                     if (statusModal) {{
                         statusModal.style.display = 'flex';
                     }}
-                    if (statusUpdateTimer) {{
-                        clearTimeout(statusUpdateTimer);
-                    }}
-                    statusUpdateTimer = setTimeout(() => {{
-                        if (statusTextEl) {{
-                            statusTextEl.textContent = 'Конвертируем изображения в WebP...';
-                        }}
-                        if (statusHintEl) {{
-                            statusHintEl.textContent = 'Это займёт чуть дольше обычной загрузки. Просто дождитесь завершения.';
-                        }}
-                    }}, 4000);
                 }}
 
                 function hideUploadStatus() {{
-                    if (statusUpdateTimer) {{
-                        clearTimeout(statusUpdateTimer);
-                        statusUpdateTimer = null;
-                    }}
                     if (statusModal) {{
                         statusModal.style.display = 'none';
                     }}
@@ -513,39 +505,38 @@ class PropertyAdmin(BaseAdminWithRequiredFields):
                         return;
                     }}
                     
-                    const formData = new FormData();
-                    formData.append('property_id', '{obj.pk}');
-                    
-                    selectedFiles.forEach(file => {{
-                        formData.append('images', file);
-                    }});
-                    
+                    const totalFiles = selectedFiles.length;
                     // Показать прогресс
                     showUploadStatus(
-                        `Передаём ${{selectedFiles.length}} файл(ов) на сервер...`,
-                        'Этот процесс может занять до нескольких минут — не закрывайте страницу.'
+                        `Передаём ${{totalFiles}} файл(ов) на сервер...`,
+                        'Не закрывайте страницу до завершения передачи файлов.'
                     );
                     uploadBtn.disabled = true;
                     
-                    fetch('{upload_url}', {{
-                        method: 'POST',
-                        body: formData,
-                        headers: {{
-                            'X-CSRFToken': document.querySelector('[name=csrfmiddlewaretoken]').value
+                    streamBulkImageUpload(
+                        '{upload_url}',
+                        '{obj.pk}',
+                        selectedFiles,
+                        document.querySelector('[name=csrfmiddlewaretoken]').value,
+                        event => {{
+                            if (event.event !== 'done') {{
+                                showUploadStatus(describeBulkUploadEvent(event, totalFiles));
+                            }}
                         }}
-                    }})
-                    .then(response => response.json())
+                    )
                     .then(data => {{
                         hideUploadStatus();
                         uploadBtn.disabled = false;
                         
                         if (data.success) {{
-                            alert(`Успешно загружено ${{data.images.length}} изображений!`);
+                            const rejected = data.errors && data.errors.length ? `\n\nПропущено:\n${{data.errors.join('\n')}}` : '';
+                            alert(`Успешно загружено ${{data.images.length}} изображений! WebP и превью будут созданы в фоне.${{rejected}}`);
                             clearSelectedImages();
                             // Перезагружаем страницу чтобы увидеть новые изображения в inline
                             location.reload();
                         }} else {{
-                            alert(`Ошибка: ${{data.message}}`);
+                            const details = data.errors && data.errors.length ? `\n${{data.errors.join('\n')}}` : '';
+                            alert(`Ошибка: ${{data.message}}${{details}}`);
                         }}
                     }})
                     .catch(error => {{
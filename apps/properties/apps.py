@@ -7,3 +7,4 @@ class PropertiesConfig(AppConfig):
     
     def ready(self):
         import apps.properties.translation
+        import apps.properties.signals
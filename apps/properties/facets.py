@@ -0,0 +1,111 @@
+"""Счётчики фасетов для боковой панели фильтров каталога."""
+
+from dataclasses import replace
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from apps.currency.services import CurrencyService
+from .inventory import COUNT_CACHE_TIMEOUT, cache_timeout, cached_count, versioned_cache_key
+from .models import PropertyFeatureRelation
+
+FACETS_CACHE_TIMEOUT = COUNT_CACHE_TIMEOUT
+
+# Границы ценовых диапазонов по типу сделки и валюте
+PRICE_BUCKET_EDGES = {
+    'sale': {
+        'THB': (3_000_000, 5_000_000, 10_000_000, 20_000_000),
+        'USD': (100_000, 150_000, 300_000, 600_000),
+        'RUB': (10_000_000, 15_000_000, 30_000_000, 60_000_000),
+    },
+    'rent': {
+        'THB': (30_000, 50_000, 100_000, 200_000),
+        'USD': (1_000, 1_500, 3_000, 6_000),
+        'RUB': (100_000, 150_000, 300_000, 600_000),
+    },
+}
+
+
+def _grouped_counts(documents, field):
+    rows = documents.values(field).annotate(count=Count('pk')).order_by()
+    return {row[field]: row['count'] for row in rows if row[field] not in (None, '')}
+
+
+def _bedroom_counts(documents):
+    exact = _grouped_counts(documents, 'bedrooms')
+    counts = {str(bedrooms): count for bedrooms, count in exact.items()}
+    counts['4+'] = sum(count for bedrooms, count in exact.items() if bedrooms >= 4)
+    return counts
+
+
+def _price_buckets(documents, deal_type, currency_code):
+    edges = PRICE_BUCKET_EDGES[deal_type].get(currency_code) or PRICE_BUCKET_EDGES[deal_type]['USD']
+    sale_field, rent_field = CurrencyService.get_price_field_names(currency_code)
+    field = rent_field if deal_type == 'rent' and rent_field else sale_field
+
+    bounds = [(None, edges[0])]
+    bounds += list(zip(edges, edges[1:]))
+    bounds.append((edges[-1], None))
+
+    aggregates = {}
+    for index, (lower, upper) in enumerate(bounds):
+        condition = Q()
+        if lower is not None:
+            condition &= Q(**{f'{field}__gte': lower})
+        if upper is not None:
+            condition &= Q(**{f'{field}__lt': upper})
+        aggregates[f'bucket_{index}'] = Count('pk', filter=condition)
+
+    totals = documents.aggregate(**aggregates)
+    return [
+        {'min': lower, 'max': upper, 'count': totals[f'bucket_{index}']}
+        for index, (lower, upper) in enumerate(bounds)
+    ]
+
+
+def build_facets(catalog_filter, currency_code='USD'):
+    """Посчитать фасеты для состояния фильтра фиксированным числом запросов.
+
+    Для каждого фасета собственный выбор пользователя не учитывается, чтобы
+    счётчики показывали, сколько объектов будет после выбора другого значения.
+    """
+    deal_type = 'rent' if catalog_filter.deal_type == 'rent' else 'sale'
+
+    without_price = replace(catalog_filter, min_price=None, max_price=None, currency='')
+
+    return {
+        'total': cached_count(catalog_filter),
+        'facets': {
+            'property_type': _grouped_counts(
+                replace(catalog_filter, property_types=()).documents(), 'property_type__name'
+            ),
+            'district': _grouped_counts(
+                replace(catalog_filter, district='', location='', location_id=None).documents(), 'district__slug'
+            ),
+            'location': _grouped_counts(
+                replace(catalog_filter, location='', location_id=None).documents(), 'location__slug'
+            ),
+            'bedrooms': _bedroom_counts(replace(catalog_filter, bedrooms=()).documents()),
+            'build_status': _grouped_counts(replace(catalog_filter, build_status='').documents(), 'build_status'),
+            'amenities': {
+                str(feature_id): count
+                for feature_id, count in _grouped_counts(
+                    PropertyFeatureRelation.objects.filter(
+                        property_id__in=catalog_filter.documents().values('property_id')
+                    ),
+                    'feature_id',
+                ).items()
+            },
+            'price': _price_buckets(without_price.documents(), deal_type, currency_code),
+        },
+    }
+
+
+def get_facets(catalog_filter, currency_code='USD'):
+    """Фасеты из кэша по нормализованному ключу фильтра и версии инвентаря."""
+    cache_key = f"{versioned_cache_key(catalog_filter, 'catalog-facets')}:{currency_code}"
+    facets = cache.get(cache_key)
+    if facets is None:
+        facets = build_facets(catalog_filter, currency_code)
+        cache.set(cache_key, facets, cache_timeout(FACETS_CACHE_TIMEOUT))
+    return facets
@@ -0,0 +1,248 @@
+"""Единая спецификация фильтров каталога недвижимости."""
+
+from __future__ import annotations
+
+import hashlib
+import math
+from dataclasses import dataclass, fields, replace
+from decimal import Decimal, InvalidOperation
+from functools import cached_property
+from typing import Optional, Tuple
+from urllib.parse import urlencode
+
+from django.db.models import Q
+
+from apps.core import search
+from apps.currency.services import CurrencyService
+from apps.locations.models import District, Location
+from .models import Property, PropertySearchDocument, PropertyType
+
+DEAL_TYPES = ('sale', 'rent')
+BEDROOM_CHOICES = ('1', '2', '3', '4+')
+
+
+def _getlist(data, key):
+    """Список значений параметра для QueryDict и обычного dict."""
+    if hasattr(data, 'getlist'):
+        values = data.getlist(key)
+    else:
+        value = data.get(key)
+        values = value if isinstance(value, (list, tuple)) else [value]
+    return [str(value).strip() for value in values if value not in (None, '')]
+
+
+def _get(data, key):
+    values = _getlist(data, key)
+    return values[-1] if values else ''
+
+
+def _parse_decimal(value):
+    """Цена из параметра запроса; 100 и 100.0 дают одинаковое значение."""
+    if not value:
+        return None
+    try:
+        return Decimal(value).quantize(Decimal('0.01'))
+    except (InvalidOperation, ValueError):
+        return None
+
+
+def parse_bbox(value):
+    """``west,south,east,north`` в градусах -> кортеж float; ValueError при ошибке."""
+    parts = [float(part) for part in value.split(',')]
+    if len(parts) != 4 or not all(math.isfinite(part) for part in parts):
+        raise ValueError('bbox должен иметь вид west,south,east,north')
+    west, south, east, north = parts
+    if west > east or south > north:
+        raise ValueError('bbox: west <= east и south <= north')
+    return west, south, east, north
+
+
+def scale_bbox(bbox):
+    """Окно в градусах -> целые микроградусы, как в PropertySearchDocument."""
+    return tuple(PropertySearchDocument.scale_coordinate(value) for value in bbox)
+
+
+@dataclass(frozen=True)
+class CatalogFilter:
+    """Нормализованное состояние фильтров каталога.
+
+    Разбирает GET/POST параметры один раз, приводит синонимы к одному виду
+    (``type`` и ``property_type``, slug и id локации, одно или несколько
+    значений спален) и компилирует их в условие по ``PropertySearchDocument``.
+    ``bbox`` (west, south, east, north в микроградусах) ограничивает выдачу
+    окном карты по индексу координат документа.
+    Экземпляры хешируемы, а ``cache_key`` одинаков для эквивалентных запросов.
+    """
+
+    deal_type: str = ''
+    property_types: Tuple[str, ...] = ()
+    build_status: str = ''
+    district: str = ''
+    location: str = ''
+    location_id: Optional[int] = None
+    min_price: Optional[Decimal] = None
+    max_price: Optional[Decimal] = None
+    currency: str = ''
+    bedrooms: Tuple[str, ...] = ()
+    amenities: Tuple[int, ...] = ()
+    query: str = ''
+    bbox: Optional[Tuple[int, int, int, int]] = None
+
+    @classmethod
+    def from_querydict(cls, data, currency_code='USD', **scope):
+        """Собрать фильтр из параметров запроса; ``scope`` задаёт ограничения страницы."""
+        deal_type = _get(data, 'deal_type')
+        if deal_type not in DEAL_TYPES:
+            deal_type = ''
+
+        property_types = _getlist(data, 'property_type') + _getlist(data, 'type')
+
+        build_status = _get(data, 'build_status')
+        if build_status not in dict(Property.BUILD_STATUS_CHOICES):
+            build_status = ''
+
+        location = _get(data, 'location')
+        location_id = None
+        if location.isdigit():
+            location_id, location = int(location), ''
+
+        bedrooms = set()
+        for value in _getlist(data, 'bedrooms'):
+            if value in BEDROOM_CHOICES:
+                bedrooms.add(value)
+            elif value.isdigit():
+                bedrooms.add(str(int(value)))
+
+        amenities = set()
+        for value in _getlist(data, 'amenities'):
+            try:
+                amenities.add(int(value))
+            except ValueError:
+                pass
+
+        try:
+            bbox = scale_bbox(parse_bbox(_get(data, 'bbox'))) if _get(data, 'bbox') else None
+        except ValueError:
+            bbox = None
+
+        min_price = _parse_decimal(_get(data, 'min_price'))
+        max_price = _parse_decimal(_get(data, 'max_price'))
+
+        catalog_filter = cls(
+            deal_type=deal_type,
+            property_types=tuple(sorted(set(property_types))),
+            build_status=build_status,
+            district=_get(data, 'district'),
+            location=location,
+            location_id=location_id,
+            min_price=min_price,
+            max_price=max_price,
+            # Валюта влияет на результат только при заданной цене
+            currency=(currency_code or 'USD') if min_price is not None or max_price is not None else '',
+            bedrooms=tuple(sorted(bedrooms)),
+            amenities=tuple(sorted(amenities)),
+            query=' '.join(_get(data, 'q').split()),
+            bbox=bbox,
+        )
+        return catalog_filter.with_scope(**scope) if scope else catalog_filter
+
+    @classmethod
+    def from_request(cls, request, data=None, **scope):
+        """Фильтр для текущего запроса с учётом выбранной пользователем валюты."""
+        if data is None:
+            data = request.GET
+        currency_code = CurrencyService.get_selected_currency_code(request)
+        return cls.from_querydict(data, currency_code, **scope)
+
+    def with_scope(self, **scope):
+        """Копия фильтра с ограничениями страницы (например, deal_type='sale')."""
+        if 'property_types' in scope:
+            scope['property_types'] = tuple(sorted(set(scope['property_types'])))
+        return replace(self, **scope)
+
+    @property
+    def is_empty(self):
+        return not any(getattr(self, field.name) for field in fields(self) if field.name != 'currency')
+
+    @cached_property
+    def canonical(self):
+        """Каноническая строка фильтра: одинакова для эквивалентных запросов."""
+        items = []
+        for field in fields(self):
+            value = getattr(self, field.name)
+            if value in (None, '', ()):
+                continue
+            if isinstance(value, tuple):
+                value = ','.join(str(item) for item in value)
+            items.append((field.name, str(value)))
+        return urlencode(items)
+
+    def cache_key(self, prefix='catalog'):
+        """Ключ кэша для счётчиков, фасетов и страниц результатов."""
+        digest = hashlib.md5(self.canonical.encode('utf-8')).hexdigest()
+        return f'{prefix}:{digest}'
+
+    @cached_property
+    def condition(self):
+        """Скомпилированное Q-условие по таблице поисковых документов."""
+        condition = Q()
+
+        if self.deal_type:
+            condition &= Q(deal_type__in=[self.deal_type, 'both'])
+
+        if self.property_types:
+            condition &= Q(property_type__in=PropertyType.objects.filter(name__in=self.property_types))
+
+        if self.build_status:
+            condition &= Q(build_status=self.build_status)
+
+        if self.district:
+            condition &= Q(district__in=District.objects.filter(slug=self.district))
+
+        if self.location:
+            condition &= Q(location__in=Location.objects.filter(slug=self.location))
+        elif self.location_id is not None:
+            condition &= Q(location_id=self.location_id)
+
+        if self.min_price is not None or self.max_price is not None:
+            sale_field, rent_field = CurrencyService.get_price_field_names(self.currency or 'USD')
+            for bound, lookup in ((self.min_price, 'gte'), (self.max_price, 'lte')):
+                if bound is None:
+                    continue
+                price_condition = Q(**{f'{sale_field}__{lookup}': bound})
+                if rent_field:
+                    price_condition |= Q(**{f'{rent_field}__{lookup}': bound})
+                condition &= price_condition
+
+        if self.bedrooms:
+            bedrooms_condition = Q()
+            for value in self.bedrooms:
+                if value == '4+':
+                    bedrooms_condition |= Q(bedrooms__gte=4)
+                else:
+                    bedrooms_condition |= Q(bedrooms=int(value))
+            condition &= bedrooms_condition
+
+        if self.amenities:
+            condition &= PropertySearchDocument.features_condition(self.amenities)
+
+        if self.query:
+            condition &= search.search_filter(self.query)
+
+        if self.bbox is not None:
+            # Полуоткрытое окно: точка на общей границе соседних тайлов попадает только в один
+            west, south, east, north = self.bbox
+            condition &= Q(
+                latitude_e6__gte=south, latitude_e6__lt=north,
+                longitude_e6__gte=west, longitude_e6__lt=east,
+            )
+
+        return condition
+
+    def documents(self):
+        """Поисковые документы, подходящие под фильтр."""
+        return PropertySearchDocument.objects.filter(self.condition)
+
+    def apply(self, queryset):
+        """Ограничить queryset объектов недвижимости результатами фильтра."""
+        return queryset.filter(pk__in=self.documents().values('property_id'))
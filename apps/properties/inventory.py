@@ -0,0 +1,126 @@
+"""Версии кэша каталога: счётчики результатов и справочники фильтров.
+
+Версия инвентаря увеличивается при любом изменении опубликованных объектов,
+версия справочников — при сохранении типов, районов, локаций и удобств (см.
+``apps.properties.signals``), версия изображений — при смене главного
+изображения объекта, его файла или вариантов (URL превью в данных карты). Версия входит в ключ кэша, поэтому устаревшие
+значения просто перестают читаться.
+
+Увеличение версии видно другим процессам только через общий кэш
+(Redis/Memcached). С процессным кэшем (LocMem, Dummy) изменения из других
+воркеров, cron и команд не видны, поэтому значения там живут не дольше
+``LOCAL_CACHE_TIMEOUT`` секунд (см. ``cache_timeout``).
+"""
+import time
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+from django.utils.translation import get_language
+
+from apps.core.view_counters import is_shared_cache
+
+INVENTORY_VERSION_KEY = 'catalog:inventory-version'
+REFERENCE_VERSION_KEY = 'catalog:reference-version'
+IMAGE_VERSION_KEY = 'catalog:image-version'
+COUNT_CACHE_TIMEOUT = 60 * 60
+REFERENCE_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Предельное время жизни версионных значений в процессном кэше, секунд
+LOCAL_CACHE_TIMEOUT = 60
+
+
+def cache_timeout(timeout):
+    """Таймаут версионного значения: с процессным кэшем не больше LOCAL_CACHE_TIMEOUT."""
+    if is_shared_cache():
+        return timeout
+    return LOCAL_CACHE_TIMEOUT if timeout is None else min(timeout, LOCAL_CACHE_TIMEOUT)
+
+
+def _initial_version():
+    # Начинаем с текущего времени, чтобы после вытеснения ключа не вернуться к старым версиям
+    return int(time.time() * 1000)
+
+
+def _get_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def _bump_version(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = _initial_version()
+        cache.set(key, version, None)
+        return version
+
+
+def get_inventory_version():
+    return _get_version(INVENTORY_VERSION_KEY)
+
+
+def bump_inventory_version():
+    return _bump_version(INVENTORY_VERSION_KEY)
+
+
+def get_reference_version():
+    return _get_version(REFERENCE_VERSION_KEY)
+
+
+def bump_reference_version():
+    return _bump_version(REFERENCE_VERSION_KEY)
+
+
+def get_image_version():
+    return _get_version(IMAGE_VERSION_KEY)
+
+
+def bump_image_version():
+    return _bump_version(IMAGE_VERSION_KEY)
+
+
+def versioned_cache_key(catalog_filter, prefix):
+    """Ключ кэша фильтра, привязанный к текущей версии инвентаря."""
+    return f'{catalog_filter.cache_key(prefix)}:v{get_inventory_version()}'
+
+
+def cached_count(catalog_filter):
+    """Количество объектов по фильтру с кэшированием до следующего изменения инвентаря."""
+    cache_key = versioned_cache_key(catalog_filter, 'catalog-count')
+    count = cache.get(cache_key)
+    if count is None:
+        count = catalog_filter.documents().count()
+        cache.set(cache_key, count, cache_timeout(COUNT_CACHE_TIMEOUT))
+    return count
+
+
+def cached_reference_data(name, builder):
+    """Справочные данные фильтров из кэша (отдельно для каждого языка).
+
+    ``builder`` вызывается при промахе и должен вернуть уже вычисленные
+    значения (списки, а не ленивые QuerySet).
+    """
+    cache_key = f'catalog-reference:{name}:{get_language()}:v{get_reference_version()}'
+    data = cache.get(cache_key)
+    if data is None:
+        data = builder()
+        cache.set(cache_key, data, cache_timeout(REFERENCE_CACHE_TIMEOUT))
+    return data
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator, которому количество объектов передаётся заранее (из кэша)."""
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self._known_count = count
+
+    @cached_property
+    def count(self):
+        if self._known_count is not None:
+            return self._known_count
+        return super().count
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from apps.properties.models import PropertyImage
+
+
+class Command(BaseCommand):
+    help = (
+        'Ставит изображения без актуальных вариантов в очередь обработки; '
+        'сами варианты создаёт воркер process_property_images'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Поставить в очередь все изображения, включая уже обработанные',
+        )
+        parser.add_argument(
+            '--property-id',
+            type=int,
+            help='Обработать изображения только одного объекта',
+        )
+
+    def handle(self, *args, **options):
+        images = PropertyImage.objects.exclude(image='').exclude(processing_state='processing').order_by('pk')
+        if options['property_id']:
+            images = images.filter(property_id=options['property_id'])
+
+        queued_ids = []
+        skipped = 0
+        for image in images.only('pk', 'image', 'renditions').iterator():
+            if not options['force'] and not image.renditions_outdated:
+                skipped += 1
+                continue
+            queued_ids.append(image.pk)
+
+        for offset in range(0, len(queued_ids), 500):
+            PropertyImage.objects.filter(pk__in=queued_ids[offset:offset + 500]).update(
+                processing_state='pending',
+                processing_attempts=0,
+                processing_error='',
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Поставлено в очередь: {len(queued_ids)}, пропущено актуальных: {skipped}. '
+                f'Запустите process_property_images для обработки.'
+            )
+        )
@@ -0,0 +1,107 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from apps.properties.models import ImageSuperseded, PropertyImage
+from apps.properties.renditions import available_formats, process_source
+
+
+class Command(BaseCommand):
+    help = (
+        'Воркер очереди обработки изображений: конвертирует загруженные оригиналы в WebP '
+        'и генерирует варианты (thumbnail/medium и адаптивные WebP/AVIF)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Обработать текущую очередь и завершиться (для cron); иначе ждать новые изображения',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Количество процессов для кодирования (по умолчанию — число CPU)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=0,
+            help='Сколько изображений забирать из очереди за раз (по умолчанию — workers * 2)',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=5.0,
+            help='Пауза между опросами пустой очереди, секунд',
+        )
+        parser.add_argument(
+            '--max-attempts',
+            type=int,
+            default=3,
+            help='После скольких неудачных попыток помечать изображение как ошибочное',
+        )
+        parser.add_argument(
+            '--stale-minutes',
+            type=int,
+            default=30,
+            help='Через сколько минут считать зависшую обработку прерванной и возвращать в очередь',
+        )
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        batch_size = options['batch_size'] or workers * 2
+
+        formats = ', '.join(extension for extension, *_rest in available_formats())
+        self.stdout.write(f'Обработка изображений: форматы {formats}, процессов: {workers}')
+
+        processed = failed = 0
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            while True:
+                stale_before = timezone.now() - timedelta(minutes=options['stale_minutes'])
+                requeued = PropertyImage.requeue_stale(stale_before)
+                if requeued:
+                    self.stdout.write(self.style.WARNING(f'Возвращено в очередь зависших: {requeued}'))
+
+                images = PropertyImage.claim_pending(batch_size)
+                if not images:
+                    if options['once']:
+                        break
+                    time.sleep(options['sleep'])
+                    continue
+
+                batch_processed, batch_failed = self.process_batch(executor, images, options['max_attempts'])
+                processed += batch_processed
+                failed += batch_failed
+
+        self.stdout.write(self.style.SUCCESS(f'Обработано изображений: {processed}, с ошибками: {failed}'))
+
+    def process_batch(self, executor, images, max_attempts):
+        """Тяжёлое кодирование — в пуле процессов, запись в хранилище и БД — здесь."""
+        futures = []
+        for image in images:
+            try:
+                futures.append(executor.submit(process_source, image.read_source_bytes(), image.needs_webp_conversion))
+            except Exception as exc:
+                futures.append(exc)
+
+        processed = failed = 0
+        for image, future in zip(images, futures):
+            try:
+                if isinstance(future, Exception):
+                    raise future
+                image.process(future.result())
+            except ImageSuperseded as exc:
+                # Новый файл уже снова в очереди и будет обработан отдельно
+                self.stdout.write(self.style.WARNING(str(exc)))
+            except Exception as exc:
+                image.fail_processing(exc, max_attempts=max_attempts)
+                failed += 1
+                self.stdout.write(self.style.ERROR(f'Изображение #{image.pk}: {exc}'))
+            else:
+                processed += 1
+        return processed, failed
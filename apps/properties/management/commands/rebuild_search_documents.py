@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from apps.properties.models import Property, PropertySearchDocument
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает таблицу поисковых документов каталога (PropertySearchDocument)'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Пересборка поисковых документов...')
+
+        properties = Property.objects.select_related('property_type', 'district', 'location')
+
+        with transaction.atomic():
+            synced = PropertySearchDocument.sync_properties(properties)
+            # Удаляем документы объектов, которые больше не публикуются
+            stale = PropertySearchDocument.objects.exclude(
+                property__is_active=True,
+                property__status='available',
+            ).delete()[0]
+
+        indexed = PropertySearchDocument.objects.count()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Обработано объектов: {synced}, в индексе: {indexed}, удалено устаревших: {stale}'
+            )
+        )
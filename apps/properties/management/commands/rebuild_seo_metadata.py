@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from apps.properties.models import Property, PropertySeoMetadata
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает SEO метаданные всех объектов для всех языков (PropertySeoMetadata)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Сколько объектов пересчитывать и записывать за один раз',
+        )
+        parser.add_argument(
+            '--stale',
+            action='store_true',
+            help='Пересчитать только объекты с устаревшими метаданными (для частого запуска по cron)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Пересчёт SEO метаданных...')
+
+        properties = Property.objects.all()
+        if options['stale']:
+            properties = properties.filter(seo_metadata__is_stale=True).distinct()
+
+        refreshed = PropertySeoMetadata.refresh_properties(
+            properties,
+            batch_size=max(1, options['batch_size']),
+        )
+        # Строки языков, убранных из settings.LANGUAGES
+        stale = PropertySeoMetadata.objects.exclude(language__in=PropertySeoMetadata.languages()).delete()[0]
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Обработано объектов: {refreshed}, строк: {PropertySeoMetadata.objects.count()}, '
+                f'удалено устаревших: {stale}'
+            )
+        )
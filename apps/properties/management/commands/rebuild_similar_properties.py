@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from apps.properties.models import PropertySimilar, PropertySimilarBuild
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает таблицу похожих объектов (PropertySimilar): '
+        'векторы признаков и топ-K ближайших соседей на NumPy'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=PropertySimilar.SIMILAR_LIMIT,
+            help='Сколько соседей хранить для каждого объекта',
+        )
+        parser.add_argument(
+            '--if-changed',
+            action='store_true',
+            help='Пересобирать, только если каталог изменился с прошлой сборки (для частого запуска по cron)',
+        )
+
+    def handle(self, *args, **options):
+        limit = max(1, options['limit'])
+        rows = PropertySimilar.feature_rows()
+        # Хэш исходных данных и журнал сборок лежат в БД: команда запускается отдельным процессом
+        fingerprint = PropertySimilar.feature_fingerprint(rows, limit)
+        if options['if_changed'] and PropertySimilarBuild.latest_fingerprint() == fingerprint:
+            self.stdout.write('Каталог не менялся, пересборка не нужна')
+            return
+
+        processed = PropertySimilar.rebuild(limit=limit, rows=rows)
+        PropertySimilarBuild.objects.create(fingerprint=fingerprint, properties_count=processed)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Обработано объектов: {processed}, связей: {PropertySimilar.objects.count()}'
+            )
+        )
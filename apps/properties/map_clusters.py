@@ -0,0 +1,120 @@
+"""Серверная кластеризация маркеров карты по сетке в проекции Web Mercator.
+
+Координаты и цены объектов фильтра (без ограничения в 1000 штук) выбираются
+по индексу координат в окне ``bbox`` фильтра каталога и кэшируются массивами
+NumPy по ключу фильтра и версии инвентаря. Клиент запрашивает окно по тайлам
+XYZ, поэтому при сдвиге карты загружаются только новые тайлы. Точки
+раскладываются по ячейкам сетки ``CLUSTER_CELL_PIXELS`` пикселей на зуме; для
+каждой ячейки считаются количество, центроид и минимальная цена. Ячейки с
+одним объектом и все объекты начиная с ``MARKER_MIN_ZOOM`` отдаются
+отдельными маркерами.
+"""
+import math
+
+import numpy as np
+from django.core.cache import cache
+
+from .inventory import COUNT_CACHE_TIMEOUT, cache_timeout, versioned_cache_key
+from .map_payload import marker_queryset
+
+TILE_SIZE = 256
+# Делитель TILE_SIZE: ячейки не пересекают границы тайлов, и тайлы кластеризуются независимо
+CLUSTER_CELL_PIXELS = 64
+MARKER_MIN_ZOOM = 16
+MAX_ZOOM = 20
+
+# Сколько отдельных маркеров отдавать за один ответ
+MAX_MARKERS = 500
+
+
+def cached_coordinates(catalog_filter):
+    """Массивы id, lat, lng и цены (USD; для аренды — месячная ставка) для фильтра."""
+    cache_key = versioned_cache_key(catalog_filter, 'map-coordinates')
+    arrays = cache.get(cache_key)
+    if arrays is None:
+        rows = list(
+            marker_queryset(catalog_filter).order_by('pk').values_list(
+                'pk', 'latitude', 'longitude', 'deal_type', 'price_sale_usd', 'price_rent_monthly',
+            )
+        )
+        prices = [rent if deal_type == 'rent' else sale for _pk, _lat, _lng, deal_type, sale, rent in rows]
+        arrays = {
+            'ids': np.array([row[0] for row in rows], dtype=np.int64),
+            'lat': np.array([float(row[1]) for row in rows], dtype=np.float64),
+            'lng': np.array([float(row[2]) for row in rows], dtype=np.float64),
+            'price': np.array([float(price) if price else np.nan for price in prices], dtype=np.float64),
+        }
+        cache.set(cache_key, arrays, cache_timeout(COUNT_CACHE_TIMEOUT))
+    return arrays
+
+
+def parse_tile(value):
+    """``z/x/y`` -> (z, x, y); ValueError при ошибке."""
+    zoom, x, y = (int(part) for part in value.split('/'))
+    if not 0 <= zoom <= MAX_ZOOM or not (0 <= x < 2 ** zoom and 0 <= y < 2 ** zoom):
+        raise ValueError('tile вне допустимого диапазона')
+    return zoom, x, y
+
+
+def tile_bbox(zoom, x, y):
+    """Окно тайла XYZ в градусах: (west, south, east, north)."""
+    count = 2 ** zoom
+
+    def latitude(tile_y):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * tile_y / count))))
+
+    return x / count * 360.0 - 180.0, latitude(y + 1), (x + 1) / count * 360.0 - 180.0, latitude(y)
+
+
+def _mercator_y(lat):
+    """Широта -> координата Y Web Mercator в градусах (как долгота)."""
+    lat = np.clip(lat, -85.05112878, 85.05112878)
+    return np.degrees(np.log(np.tan(np.pi / 4 + np.radians(lat) / 2)))
+
+
+def data_bounds(arrays):
+    """[south, west, north, east] всех точек фильтра или None."""
+    if not len(arrays['ids']):
+        return None
+    return [
+        float(arrays['lat'].min()), float(arrays['lng'].min()),
+        float(arrays['lat'].max()), float(arrays['lng'].max()),
+    ]
+
+
+def cluster_points(arrays, zoom):
+    """Кластеры (колонки) и id объектов для отдельных маркеров."""
+    lat, lng, price, ids = arrays['lat'], arrays['lng'], arrays['price'], arrays['ids']
+
+    empty = {'lat': [], 'lng': [], 'count': [], 'min_price': []}
+    if not len(ids):
+        return empty, []
+    if zoom >= MARKER_MIN_ZOOM:
+        return empty, ids[:MAX_MARKERS].tolist()
+
+    # Размер ячейки в градусах долготы; по широте сетка строится в проекции Меркатора
+    cell = CLUSTER_CELL_PIXELS * 360.0 / (TILE_SIZE * 2 ** zoom)
+    cell_x = np.floor(lng / cell).astype(np.int64)
+    cell_y = np.floor(_mercator_y(lat) / cell).astype(np.int64)
+    _cells, inverse, counts = np.unique(
+        np.stack([cell_x, cell_y], axis=1), axis=0, return_inverse=True, return_counts=True,
+    )
+    inverse = inverse.reshape(-1)
+
+    centroid_lat = np.bincount(inverse, weights=lat) / counts
+    centroid_lng = np.bincount(inverse, weights=lng) / counts
+    min_price = np.full(len(counts), np.inf)
+    np.minimum.at(min_price, inverse, np.where(np.isnan(price), np.inf, price))
+
+    single = counts == 1
+    # Ячейка с одним объектом -> сам объект
+    marker_ids = ids[single[inverse]][:MAX_MARKERS].tolist()
+
+    grouped = ~single
+    clusters = {
+        'lat': np.round(centroid_lat[grouped], 6).tolist(),
+        'lng': np.round(centroid_lng[grouped], 6).tolist(),
+        'count': counts[grouped].tolist(),
+        'min_price': [None if math.isinf(value) else value for value in min_price[grouped].tolist()],
+    }
+    return clusters, marker_ids
@@ -0,0 +1,144 @@
+"""Компактные данные маркеров карты каталога.
+
+Маркеры выбираются через ``values()`` только по нужным колонкам (без
+переводимых HTML-описаний), превью берётся из денормализованного
+``Property.main_image`` и реестра вариантов изображения (иначе оригинал)
+без обращения к хранилищу и ImageKit. Ответ — колоночный JSON: параллельные
+массивы одинаковой длины, повторяющиеся строки (тип, локация) вынесены в
+словари и заменены индексами.
+Готовое тело сжимается gzip и кэшируется по ключу фильтра, версии
+инвентаря и версии изображений (URL превью) вместе с хэшем для ETag.
+"""
+import gzip
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db import models
+from django.utils.translation import get_language
+
+from .inventory import COUNT_CACHE_TIMEOUT, cache_timeout, get_image_version, versioned_cache_key
+from .models import Property, PropertyImage
+
+MAP_MARKERS_LIMIT = 1000
+
+# Порядок колонок в ответе; клиент собирает объекты по этому списку
+MARKER_COLUMNS = (
+    'id', 'slug', 'title', 'lat', 'lng', 'deal_type', 'type', 'location',
+    'price', 'image_url', 'bedrooms', 'bathrooms', 'area', 'agent_phone',
+)
+
+IMAGE_STORAGE = PropertyImage._meta.get_field('image').storage
+
+
+def defer_text_columns(queryset):
+    """Не загружать длинные текстовые колонки (описания на всех языках, SEO тексты)."""
+    text_fields = [
+        field.attname for field in Property._meta.concrete_fields
+        if isinstance(field, models.TextField)
+    ]
+    return queryset.defer(*text_fields)
+
+
+def _thumbnail_url(image_name, renditions):
+    """URL превью из реестра вариантов, иначе оригинала; без ImageKit и хранилища."""
+    if not image_name:
+        return ''
+    renditions = renditions or {}
+    thumbnail = renditions.get('thumbnail') if renditions.get('source') == image_name else None
+    return IMAGE_STORAGE.url(thumbnail['name'] if thumbnail else image_name)
+
+
+def marker_queryset(catalog_filter):
+    """Опубликованные объекты с координатами, отобранные фильтром каталога."""
+    return catalog_filter.apply(
+        Property.objects.filter(
+            is_active=True,
+            status='available',
+            latitude__isnull=False,
+            longitude__isnull=False,
+        )
+    )
+
+
+def build_marker_payload(catalog_filter, language, property_ids=None):
+    """Собрать колоночные данные маркеров для фильтра (или только для ``property_ids``)."""
+    queryset = marker_queryset(catalog_filter)
+    if property_ids is not None:
+        queryset = queryset.filter(pk__in=property_ids)
+    queryset = queryset.values(
+        'id', 'slug', 'title', 'latitude', 'longitude', 'deal_type',
+        'property_type__name', 'property_type__name_display',
+        'location__name', 'district__name',
+        'price_sale_usd', 'price_rent_monthly',
+        'bedrooms', 'bathrooms', 'area_total', 'agent__phone',
+        'main_image__image', 'main_image__renditions',
+    )[:MAP_MARKERS_LIMIT]
+
+    columns = {name: [] for name in MARKER_COLUMNS}
+    types = []
+    type_index = {}
+    locations = []
+    location_index = {}
+
+    for row in queryset:
+        type_key = row['property_type__name'] or ''
+        if type_key not in type_index:
+            type_index[type_key] = len(types)
+            types.append({'name': type_key, 'label': row['property_type__name_display'] or ''})
+
+        location = row['location__name'] or row['district__name'] or ''
+        if location not in location_index:
+            location_index[location] = len(locations)
+            locations.append(location)
+
+        # Цена в USD как в прежнем ответе; форматирует клиент
+        if row['deal_type'] == 'rent':
+            price = row['price_rent_monthly']
+        else:
+            price = row['price_sale_usd']
+
+        columns['id'].append(row['id'])
+        columns['slug'].append(row['slug'])
+        columns['title'].append(row['title'])
+        columns['lat'].append(float(row['latitude']))
+        columns['lng'].append(float(row['longitude']))
+        columns['deal_type'].append(row['deal_type'])
+        columns['type'].append(type_index[type_key])
+        columns['location'].append(location_index[location])
+        columns['price'].append(float(price) if price else None)
+        columns['image_url'].append(_thumbnail_url(row['main_image__image'], row['main_image__renditions']))
+        columns['bedrooms'].append(row['bedrooms'] or 0)
+        columns['bathrooms'].append(row['bathrooms'] or 0)
+        columns['area'].append(float(row['area_total']) if row['area_total'] else 0)
+        columns['agent_phone'].append(row['agent__phone'] or '')
+
+    return {
+        'success': True,
+        'format': 'columns',
+        'total_count': len(columns['id']),
+        # Всегда используем языковой префикс, так как prefix_default_language=True
+        'url_prefix': f'/{language}/property/',
+        'types': types,
+        'locations': locations,
+        'columns': columns,
+    }
+
+
+def cached_marker_payload(catalog_filter):
+    """(gzip-тело, хэш JSON) ответа для фильтра; кэшируется до изменения инвентаря или изображений.
+
+    ETag для каждой кодировки ответа вычисляет представление из хэша.
+    """
+    language = get_language() or 'ru'
+    cache_key = versioned_cache_key(catalog_filter, f'map-payload:{language}:i{get_image_version()}')
+    cached = cache.get(cache_key)
+    if cached is None:
+        body = json.dumps(
+            build_marker_payload(catalog_filter, language),
+            ensure_ascii=False,
+            separators=(',', ':'),
+        ).encode('utf-8')
+        cached = (gzip.compress(body, compresslevel=6), hashlib.md5(body).hexdigest())
+        cache.set(cache_key, cached, cache_timeout(COUNT_CACHE_TIMEOUT))
+    return cached
@@ -0,0 +1,114 @@
+# Generated by Django 5.0.6 on 2026-10-17 02:31
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from apps.currency.rates import RateMatrix
+
+
+# (поле цены, валюта, поле базовой цены в THB) — как PropertySearchDocument.PRICE_FIELDS
+PRICE_FIELDS = (
+    ('price_sale_thb', 'THB', 'price_sale_thb'),
+    ('price_sale_usd', 'USD', 'price_sale_thb'),
+    ('price_sale_rub', 'RUB', 'price_sale_thb'),
+    ('price_rent_monthly_thb', 'THB', 'price_rent_monthly_thb'),
+    ('price_rent_monthly', 'USD', 'price_rent_monthly_thb'),
+    ('price_rent_monthly_rub', 'RUB', 'price_rent_monthly_thb'),
+)
+
+
+def latest_rate_matrix(apps):
+    """Матрица последних курсов по историческим моделям валют"""
+    Currency = apps.get_model('currency', 'Currency')
+    ExchangeRate = apps.get_model('currency', 'ExchangeRate')
+
+    rates = {}
+    for source, target, rate in ExchangeRate.objects.order_by('date').values_list(
+        'base_currency__code', 'target_currency__code', 'rate'
+    ):
+        rates[(source, target)] = rate
+    return RateMatrix(list(Currency.objects.order_by('code')), rates)
+
+
+def document_prices(prop, matrix):
+    """Цены документа: сохранённая цена, иначе пересчёт базовой цены в THB по курсу"""
+    values = {}
+    for field, currency_code, base_field in PRICE_FIELDS:
+        price = getattr(prop, field)
+        if not price and getattr(prop, base_field):
+            price = matrix.convert(getattr(prop, base_field), 'THB', currency_code)
+        values[field] = round(Decimal(str(price)), 2) if price else None
+    return values
+
+
+def build_search_documents(apps, schema_editor):
+    """Первичное заполнение поисковых документов для опубликованных объектов"""
+    Property = apps.get_model('properties', 'Property')
+    PropertyFeatureRelation = apps.get_model('properties', 'PropertyFeatureRelation')
+    PropertySearchDocument = apps.get_model('properties', 'PropertySearchDocument')
+
+    matrix = latest_rate_matrix(apps)
+
+    masks = {}
+    for property_id, feature_id in PropertyFeatureRelation.objects.values_list('property_id', 'feature_id'):
+        if 1 <= feature_id <= 63:
+            masks[property_id] = masks.get(property_id, 0) | (1 << (feature_id - 1))
+
+    documents = []
+    for prop in Property.objects.filter(is_active=True, status='available').iterator():
+        values = document_prices(prop, matrix)
+        documents.append(PropertySearchDocument(
+            property_id=prop.pk,
+            property_type_id=prop.property_type_id,
+            district_id=prop.district_id,
+            location_id=prop.location_id,
+            deal_type=prop.deal_type,
+            build_status=prop.build_status,
+            bedrooms=prop.bedrooms,
+            area_total=prop.area_total,
+            feature_mask=masks.get(prop.pk, 0),
+            **values,
+        ))
+
+    PropertySearchDocument.objects.bulk_create(documents, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('currency', '0001_initial'),
+        ('locations', '0002_district_image_location_image'),
+        ('properties', '0022_property_build_status_alter_property_legacy_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PropertySearchDocument',
+            fields=[
+                ('property', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='properties.property', verbose_name='Недвижимость')),
+                ('deal_type', models.CharField(max_length=10)),
+                ('build_status', models.CharField(max_length=20)),
+                ('bedrooms', models.PositiveIntegerField(blank=True, null=True)),
+                ('area_total', models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True)),
+                ('price_sale_thb', models.DecimalField(blank=True, decimal_places=2, max_digits=15, null=True)),
+                ('price_sale_usd', models.DecimalField(blank=True, decimal_places=2, max_digits=15, null=True)),
+                ('price_sale_rub', models.DecimalField(blank=True, decimal_places=2, max_digits=15, null=True)),
+                ('price_rent_monthly_thb', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('price_rent_monthly', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('price_rent_monthly_rub', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('feature_mask', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('district', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='locations.district')),
+                ('location', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='locations.location')),
+                ('property_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='properties.propertytype')),
+            ],
+            options={
+                'verbose_name': 'Поисковый документ',
+                'verbose_name_plural': 'Поисковые документы',
+                'indexes': [models.Index(fields=['deal_type', 'property_type'], name='prop_search_deal_type_idx'), models.Index(fields=['district', 'location'], name='prop_search_district_idx'), models.Index(fields=['bedrooms'], name='prop_search_bedrooms_idx'), models.Index(fields=['price_sale_thb'], name='prop_search_sale_thb_idx'), models.Index(fields=['price_sale_usd'], name='prop_search_sale_usd_idx'), models.Index(fields=['price_sale_rub'], name='prop_search_sale_rub_idx')],
+            },
+        ),
+        migrations.RunPython(build_search_documents, migrations.RunPython.noop),
+    ]
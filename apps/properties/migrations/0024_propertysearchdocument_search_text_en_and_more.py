@@ -0,0 +1,87 @@
+# Generated by Django 5.0.6 on 2026-10-17 02:34
+
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+from apps.core import search
+
+
+def fill_search_documents(apps, schema_editor):
+    """Заполнение поискового текста и векторов для существующих документов"""
+    PropertySearchDocument = apps.get_model('properties', 'PropertySearchDocument')
+
+    def translated(obj, name, language):
+        if obj is None:
+            return ''
+        return getattr(obj, f'{name}_{language}', '') or ''
+
+    documents = PropertySearchDocument.objects.select_related(
+        'property', 'property__district', 'property__location'
+    )
+    for document in documents.iterator():
+        prop = document.property
+        parts = {
+            language: [
+                (translated(prop, 'title', language), 'A'),
+                (translated(prop, 'complex_name', language), 'A'),
+                (translated(prop.district, 'name', language), 'B'),
+                (translated(prop.location, 'name', language), 'B'),
+                (translated(prop, 'address', language), 'B'),
+                (translated(prop, 'short_description', language), 'C'),
+                (translated(prop, 'description', language), 'C'),
+            ]
+            for language in search.SEARCH_LANGUAGES
+        }
+        queryset = PropertySearchDocument.objects.filter(pk=document.pk)
+        queryset.update(**search.search_text_values(parts))
+        search.store_search_vectors(queryset, parts)
+
+
+def create_search_indexes(apps, schema_editor):
+    search.create_gin_indexes(schema_editor, 'properties_propertysearchdocument', 'prop_search_vector')
+
+
+def drop_search_indexes(apps, schema_editor):
+    search.drop_gin_indexes(schema_editor, 'prop_search_vector')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0023_propertysearchdocument'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='propertysearchdocument',
+            name='search_text_en',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='propertysearchdocument',
+            name='search_text_ru',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='propertysearchdocument',
+            name='search_text_th',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='propertysearchdocument',
+            name='search_vector_en',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='propertysearchdocument',
+            name='search_vector_ru',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='propertysearchdocument',
+            name='search_vector_th',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(fill_search_documents, migrations.RunPython.noop),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.0.6 on 2026-10-17 02:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_main_image(apps, schema_editor):
+    """Проставить главное изображение: помеченное is_main, иначе первое по порядку"""
+    Property = apps.get_model('properties', 'Property')
+    PropertyImage = apps.get_model('properties', 'PropertyImage')
+
+    main_images = {}
+    rows = PropertyImage.objects.order_by('property_id', '-is_main', 'order', 'id').values_list('property_id', 'id')
+    for property_id, image_id in rows.iterator():
+        main_images.setdefault(property_id, image_id)
+
+    properties = [
+        Property(pk=property_id, main_image_id=image_id)
+        for property_id, image_id in main_images.items()
+    ]
+    Property.objects.bulk_update(properties, ['main_image'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0024_propertysearchdocument_search_text_en_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='property',
+            name='main_image',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='properties.propertyimage', verbose_name='Главное изображение'),
+        ),
+        migrations.RunPython(fill_main_image, migrations.RunPython.noop),
+    ]
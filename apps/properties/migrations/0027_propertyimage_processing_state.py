@@ -0,0 +1,49 @@
+# Generated by Django 5.0.6 on 2026-10-17 02:48
+
+from django.db import migrations, models
+
+
+def mark_processed_images(apps, schema_editor):
+    """Уже обработанные изображения (с актуальными вариантами) сразу помечаем как готовые"""
+    PropertyImage = apps.get_model('properties', 'PropertyImage')
+
+    ready_ids = [
+        image_id
+        for image_id, image_name, renditions in PropertyImage.objects.values_list('id', 'image', 'renditions').iterator()
+        if not image_name or (
+            (renditions or {}).get('source') == image_name and 'responsive' in (renditions or {})
+        )
+    ]
+    for offset in range(0, len(ready_ids), 500):
+        PropertyImage.objects.filter(pk__in=ready_ids[offset:offset + 500]).update(processing_state='ready')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0026_propertyimage_renditions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='propertyimage',
+            name='processing_attempts',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Попыток обработки'),
+        ),
+        migrations.AddField(
+            model_name='propertyimage',
+            name='processing_error',
+            field=models.TextField(blank=True, editable=False, verbose_name='Ошибка обработки'),
+        ),
+        migrations.AddField(
+            model_name='propertyimage',
+            name='processing_started_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Начало обработки'),
+        ),
+        migrations.AddField(
+            model_name='propertyimage',
+            name='processing_state',
+            field=models.CharField(choices=[('pending', 'В очереди'), ('processing', 'Обрабатывается'), ('ready', 'Готово'), ('failed', 'Ошибка')], db_index=True, default='pending', editable=False, max_length=20, verbose_name='Статус обработки'),
+        ),
+        migrations.RunPython(mark_processed_images, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.6 on 2026-10-17 02:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0027_propertyimage_processing_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PropertySeoMetadata',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('language', models.CharField(max_length=10, verbose_name='Язык')),
+                ('title', models.TextField(blank=True, default='', verbose_name='Заголовок')),
+                ('description', models.TextField(blank=True, default='', verbose_name='Описание')),
+                ('keywords', models.TextField(blank=True, default='', verbose_name='Ключевые слова')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seo_metadata', to='properties.property', verbose_name='Недвижимость')),
+            ],
+            options={
+                'verbose_name': 'SEO метаданные объекта',
+                'verbose_name_plural': 'SEO метаданные объектов',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='propertyseometadata',
+            constraint=models.UniqueConstraint(fields=('property', 'language'), name='prop_seo_metadata_unique_lang'),
+        ),
+    ]
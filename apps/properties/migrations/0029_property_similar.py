@@ -0,0 +1,33 @@
+# Generated by Django 5.0.6 on 2026-10-17 02:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0028_property_seo_metadata'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PropertySimilar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Позиция')),
+                ('distance', models.FloatField(verbose_name='Расстояние')),
+                ('property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_links', to='properties.property', verbose_name='Недвижимость')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_of', to='properties.property', verbose_name='Похожий объект')),
+            ],
+            options={
+                'verbose_name': 'Похожий объект',
+                'verbose_name_plural': 'Похожие объекты',
+                'ordering': ['property', 'rank'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='propertysimilar',
+            constraint=models.UniqueConstraint(fields=('property', 'rank'), name='prop_similar_unique_rank'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.0.6 on 2026-10-17 02:59
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+COORDINATE_SCALE = 10 ** 6
+
+
+def fill_coordinates(apps, schema_editor):
+    """Перенести координаты объектов в документы в микроградусах"""
+    PropertySearchDocument = apps.get_model('properties', 'PropertySearchDocument')
+
+    def scale(value):
+        return None if value is None else int(round(Decimal(str(value)) * COORDINATE_SCALE))
+
+    documents = []
+    rows = PropertySearchDocument.objects.values_list('property_id', 'property__latitude', 'property__longitude')
+    for property_id, latitude, longitude in rows.iterator():
+        documents.append(PropertySearchDocument(
+            property_id=property_id,
+            latitude_e6=scale(latitude),
+            longitude_e6=scale(longitude),
+        ))
+    PropertySearchDocument.objects.bulk_update(documents, ['latitude_e6', 'longitude_e6'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0002_district_image_location_image'),
+        ('properties', '0029_property_similar'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='propertysearchdocument',
+            name='latitude_e6',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='propertysearchdocument',
+            name='longitude_e6',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='propertysearchdocument',
+            index=models.Index(fields=['latitude_e6', 'longitude_e6'], name='prop_search_coords_idx'),
+        ),
+        migrations.RunPython(fill_coordinates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-17 03:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0030_propertysearchdocument_coordinates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='propertyseometadata',
+            name='is_stale',
+            field=models.BooleanField(db_index=True, default=False, verbose_name='Требует пересчёта'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.6 on 2026-10-17 03:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0031_property_seo_metadata_stale'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PropertySimilarBuild',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=64, verbose_name='Хэш данных')),
+                ('properties_count', models.PositiveIntegerField(default=0, verbose_name='Объектов')),
+                ('built_at', models.DateTimeField(auto_now_add=True, verbose_name='Собрано')),
+            ],
+            options={
+                'verbose_name': 'Сборка похожих объектов',
+                'verbose_name_plural': 'Сборки похожих объектов',
+                'ordering': ['-built_at'],
+                'get_latest_by': 'built_at',
+            },
+        ),
+    ]
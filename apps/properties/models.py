@@ -1,10 +1,15 @@
 import builtins
+import hashlib
 import os
-from io import BytesIO
+from decimal import Decimal
 
-from django.db import models
+from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
 from django.db.models import Case, When, Value, IntegerField
+from django.db.models.lookups import Exact
 from django.contrib.auth.models import User
+from django.utils import timezone, translation
 from django.utils.translation import gettext_lazy as _
 from django.urls import reverse
 from django.core.files.base import ContentFile
@@ -12,7 +17,10 @@ from imagekit.models import ImageSpecField
 from imagekit.processors import ResizeToFill, ResizeToFit
 from PIL import Image
 from tinymce.models import HTMLField
+from apps.core import search
 from apps.locations.models import District, Location
+from .inventory import bump_image_version
+from .renditions import FORMAT_MIME_TYPES, process_source, render_variants
 
 
 class PropertyType(models.Model):
@@ -204,6 +212,11 @@ class Property(models.Model):
                                  help_text=_('План планировки этажей'))
     intro_image = models.ImageField(_('Интро изображение'), upload_to='properties/intro/', blank=True,
                                    help_text=_('Дополнительное изображение для анонса'))
+    # Главное (или первое по порядку) изображение галереи; поддерживается сигналами PropertyImage,
+    # чтобы карточки списка не делали запрос к изображениям на каждый объект
+    main_image = models.ForeignKey('PropertyImage', on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='+', editable=False,
+                                   verbose_name=_('Главное изображение'))
 
     # Мета-информация
     views_count = models.PositiveIntegerField(_('Просмотры'), default=0)
@@ -252,19 +265,24 @@ class Property(models.Model):
     def get_absolute_url(self):
         return reverse('properties:property_detail', kwargs={'slug': self.slug})
 
-    @property
-    def main_image(self):
-        """Получить главное изображение"""
-        return self.images.filter(is_main=True).first()
+    @classmethod
+    def refresh_main_image(cls, property_id):
+        """Пересчитать ссылку на главное изображение: помеченное is_main, иначе первое по порядку."""
+        image_id = (
+            PropertyImage.objects
+            .filter(property_id=property_id)
+            .order_by('-is_main', 'order', 'id')
+            .values_list('id', flat=True)
+            .first()
+        )
+        if cls.objects.filter(pk=property_id).exclude(main_image_id=image_id).update(main_image_id=image_id):
+            bump_image_version()
+        return image_id
 
     def get_main_image_url(self):
         """Вернуть URL главного изображения или первого доступного."""
-        candidate_images = [self.main_image, self.images.first()]
-        for image in candidate_images:
-            if not image:
-                continue
-            if image.original_url:
-                return image.original_url
+        if self.main_image_id and self.main_image.original_url:
+            return self.main_image.original_url
         return ''
 
     def get_main_image_absolute_url(self, request):
@@ -292,14 +310,18 @@ class Property(models.Model):
             return f"฿{self.price_rent_monthly_thb:,.0f}/мес"
         return "Цена по запросу"
     
-    def get_price_per_sqm_in_currency(self, currency_code, deal_type='sale'):
-        """Получить цену за квадратный метр в указанной валюте"""
+    def get_price_per_sqm_in_currency(self, currency_code, deal_type='sale', price=None):
+        """Получить цену за квадратный метр в указанной валюте
+
+        price — уже известная цена в валюте (например, из prices_in_currency).
+        """
         from decimal import Decimal
         
         if not self.area_total or self.area_total <= 0 or deal_type != 'sale':
             return None
             
-        price = self.get_price_in_currency(currency_code, deal_type)
+        if price is None:
+            price = self.get_price_in_currency(currency_code, deal_type)
         if not price:
             return None
             
@@ -309,9 +331,9 @@ class Property(models.Model):
         
         return float(price_decimal / area_decimal)
     
-    def get_formatted_price_per_sqm(self, currency_code='THB', deal_type='sale'):
+    def get_formatted_price_per_sqm(self, currency_code='THB', deal_type='sale', price=None):
         """Получить отформатированную цену за квадратный метр"""
-        price_per_sqm = self.get_price_per_sqm_in_currency(currency_code, deal_type)
+        price_per_sqm = self.get_price_per_sqm_in_currency(currency_code, deal_type, price=price)
         if not price_per_sqm:
             return None
             
@@ -322,25 +344,16 @@ class Property(models.Model):
         formatted_price = f"{int(price_per_sqm):,}".replace(',', ' ')
         return f"{symbol}{formatted_price}/м²"
 
-    def get_price_in_currency(self, currency_code, deal_type='sale'):
-        """Получить цену в указанной валюте"""
-        from apps.currency.models import Currency, ExchangeRate
-        from decimal import Decimal
-        
-        # Получаем базовую цену (теперь храним в THB)
+    def get_base_price(self, deal_type='sale'):
+        """Базовая цена в THB для типа сделки"""
         if deal_type == 'sale':
-            base_price = self.price_sale_thb
-        else:
-            base_price = self.price_rent_monthly_thb
-            
-        if not base_price:
-            return None
-            
-        # Если нужная валюта THB, возвращаем как есть
+            return self.price_sale_thb
+        return self.price_rent_monthly_thb
+
+    def get_stored_price(self, currency_code, deal_type='sale'):
+        """Цена без пересчёта по курсу: THB или сохранённая цена в валюте"""
         if currency_code == 'THB':
-            return base_price
-            
-        # Если есть уже сохраненная цена в нужной валюте, возвращаем ее
+            return self.get_base_price(deal_type)
         if currency_code == 'USD':
             if deal_type == 'sale' and self.price_sale_usd:
                 return self.price_sale_usd
@@ -351,40 +364,74 @@ class Property(models.Model):
                 return self.price_sale_rub
             elif deal_type == 'rent' and self.price_rent_monthly_rub:
                 return self.price_rent_monthly_rub
-        
-        # Конвертируем через курс валют
-        try:
-            thb_currency = Currency.objects.get(code='THB')
-            target_currency = Currency.objects.get(code=currency_code)
-            converted_amount = ExchangeRate.convert_amount(base_price, thb_currency, target_currency)
-            return converted_amount
-        except Currency.DoesNotExist:
+        return None
+
+    def get_price_in_currency(self, currency_code, deal_type='sale'):
+        """Получить цену в указанной валюте"""
+        from apps.currency.services import CurrencyService
+
+        # Получаем базовую цену (теперь храним в THB)
+        base_price = self.get_base_price(deal_type)
+        if not base_price:
             return None
+
+        # Если есть уже сохраненная цена в нужной валюте, возвращаем ее
+        stored_price = self.get_stored_price(currency_code, deal_type)
+        if stored_price:
+            return stored_price
+
+        # Конвертируем по матрице курсов запроса
+        return CurrencyService.get_rate_matrix().convert(base_price, 'THB', currency_code)
+
+    @classmethod
+    def prices_in_currency(cls, properties, currency_code, deal_type='sale'):
+        """Цены объектов в валюте: {pk: цена или None}
+
+        Недостающие сохранённые цены пересчитываются одним пакетом по матрице
+        курсов запроса.
+        """
+        from apps.currency.services import CurrencyService
+
+        prices = {}
+        pending = []
+        for property_obj in properties:
+            base_price = property_obj.get_base_price(deal_type)
+            stored_price = property_obj.get_stored_price(currency_code, deal_type) if base_price else None
+            prices[property_obj.pk] = stored_price
+            if base_price and not stored_price:
+                pending.append(property_obj.pk)
+                prices[property_obj.pk] = base_price
+
+        if pending:
+            matrix = CurrencyService.get_rate_matrix()
+            converted = matrix.convert_many([(prices[pk], 'THB', currency_code) for pk in pending])
+            prices.update(zip(pending, converted))
+        return prices
     
     def get_formatted_price(self, currency_code='THB', deal_type='sale'):
         """Получить отформатированную цену в указанной валюте"""
-        from apps.currency.models import Currency
+        from apps.currency.services import CurrencyService
         
         price = self.get_price_in_currency(currency_code, deal_type)
         if not price:
             return "Цена по запросу"
             
-        try:
-            currency = Currency.objects.get(code=currency_code)
-            symbol = currency.symbol
-            decimal_places = currency.decimal_places
-            
-            if decimal_places == 0:
-                price_str = f"{symbol}{price:,.0f}"
-            else:
-                price_str = f"{symbol}{price:,.{decimal_places}f}"
-                
-            if deal_type == 'rent':
-                price_str += "/мес"
-                
-            return price_str
-        except Currency.DoesNotExist:
+        currency = CurrencyService.get_rate_matrix().currencies.get(currency_code)
+        if currency is None:
             return f"{price:,.0f} {currency_code}"
+
+        symbol = currency.symbol
+        decimal_places = currency.decimal_places
+        
+        if decimal_places == 0:
+            price_str = f"{symbol}{price:,.0f}"
+        else:
+            price_str = f"{symbol}{price:,.{decimal_places}f}"
+            
+        if deal_type == 'rent':
+            price_str += "/мес"
+            
+        return price_str
     
     @property
     def total_area(self):
@@ -404,36 +451,44 @@ class Property(models.Model):
             'keywords': getattr(self, f'custom_keywords_{language_code}', ''),
         }
     
-    def get_seo_template(self):
-        """Найти подходящий SEO шаблон для этого объекта"""
+    def get_seo_template(self, templates=None):
+        """Найти подходящий SEO шаблон для этого объекта.
+
+        ``templates`` — заранее загруженный список (см. ``load_seo_templates``),
+        иначе он берётся один раз на запрос.
+        """
+        from apps.core.request_cache import request_memo
+
+        if templates is None:
+            templates = request_memo(('seo-templates', 'property_detail'), self.load_seo_templates)
+        property_type = self.property_type.name if self.property_type_id else ''
+        return self.match_seo_template(templates, property_type, self.deal_type)
+
+    @staticmethod
+    def load_seo_templates():
+        """Активные шаблоны карточки объекта в порядке приоритета (один запрос)"""
         from apps.core.models import SEOTemplate
-        
-        # Ищем точное совпадение по типу недвижимости и типу сделки
-        template = SEOTemplate.objects.filter(
-            template_type='property_detail',
-            property_type=self.property_type.name,
-            deal_type=self.deal_type,
-            is_active=True
-        ).order_by('priority').first()
-        
-        # Если не найден, ищем по типу недвижимости без учета типа сделки
-        if not template:
-            template = SEOTemplate.objects.filter(
-                template_type='property_detail',
-                property_type=self.property_type.name,
-                deal_type='',
-                is_active=True
-            ).order_by('priority').first()
-        
-        # Если не найден, ищем общий шаблон
-        if not template:
-            template = SEOTemplate.objects.filter(
-                template_type='property_detail',
-                property_type='',
-                is_active=True
-            ).order_by('priority').first()
-        
-        return template
+
+        return list(
+            SEOTemplate.objects.filter(template_type='property_detail', is_active=True).order_by('priority')
+        )
+
+    @staticmethod
+    def match_seo_template(templates, property_type, deal_type):
+        """Выбрать шаблон из списка: тип + сделка, затем тип без сделки, затем общий"""
+        candidates = (
+            # Точное совпадение по типу недвижимости и типу сделки
+            lambda template: template.property_type == property_type and template.deal_type == deal_type,
+            # По типу недвижимости без учета типа сделки
+            lambda template: template.property_type == property_type and template.deal_type == '',
+            # Общий шаблон
+            lambda template: template.property_type == '',
+        )
+        for matches in candidates:
+            for template in templates:
+                if matches(template):
+                    return template
+        return None
     
     def generate_auto_seo(self, language_code='ru'):
         """Автоматическая генерация SEO данных как fallback"""
@@ -548,18 +603,29 @@ class Property(models.Model):
         return deal_translations.get(language_code, deal_translations.get('ru', self.deal_type))
     
     def get_seo_data(self, language_code='ru'):
-        """Получить финальные SEO данные с учетом приоритетов"""
+        """Получить финальные SEO данные (материализованные в PropertySeoMetadata)"""
+        # seo_metadata.all() использует prefetch_related, если он был
+        for metadata in self.seo_metadata.all():
+            if metadata.language == language_code and not metadata.is_stale:
+                return metadata.as_dict()
+        # Строка ещё не построена (новый язык, объект до rebuild_seo_metadata) или устарела
+        return self.compute_seo_data(language_code)
+
+    def compute_seo_data(self, language_code='ru', templates=None):
+        """Рассчитать SEO данные с учетом приоритетов"""
         # 1. Проверяем кастомные SEO поля
         if self.has_custom_seo(language_code):
             return self.get_custom_seo(language_code)
-        
-        # 2. Ищем подходящий шаблон
-        template = self.get_seo_template()
-        if template:
-            return template.generate_seo_for_property(self, language_code)
-        
-        # 3. Fallback - автогенерация
-        return self.generate_auto_seo(language_code)
+
+        # Переводимые поля (title и т.п.) должны отдавать значения нужного языка и вне запроса
+        with translation.override(language_code):
+            # 2. Ищем подходящий шаблон
+            template = self.get_seo_template(templates)
+            if template:
+                return template.generate_seo_for_property(self, language_code)
+
+            # 3. Fallback - автогенерация
+            return self.generate_auto_seo(language_code)
 
 
 class Agent(models.Model):
@@ -590,6 +656,10 @@ class Agent(models.Model):
         return self.name
 
 
+class ImageSuperseded(Exception):
+    """Файл изображения заменили во время обработки; результат воркера отброшен."""
+
+
 class PropertyImage(models.Model):
     """Изображения недвижимости"""
     IMAGE_TYPES = [
@@ -611,21 +681,44 @@ class PropertyImage(models.Model):
     alt_text = models.CharField(_('Alt текст'), max_length=200, blank=True,
                                help_text=_('Альтернативный текст для SEO и доступности'))
 
+    # Размеры вариантов ImageKit: превью обрезается точно, средний вписывается в рамку
+    THUMBNAIL_SIZE = (300, 200)
+    MEDIUM_BOX = (800, 600)
+
     # Автоматическое создание thumbnails
     thumbnail = ImageSpecField(
         source='image',
-        processors=[ResizeToFill(300, 200)],
+        processors=[ResizeToFill(*THUMBNAIL_SIZE)],
         format='JPEG',
         options={'quality': 80}
     )
 
     medium = ImageSpecField(
         source='image',
-        processors=[ResizeToFit(800, 600)],
+        processors=[ResizeToFit(*MEDIUM_BOX)],
         format='JPEG',
         options={'quality': 85}
     )
 
+    # Сгенерированные варианты: {'source': имя исходника, '<spec>': {'name', 'width', 'height', 'size'},
+    #                            'responsive': [{'name', 'width', 'height', 'format', 'size'}, ...]}
+    renditions = models.JSONField(_('Варианты изображения'), default=dict, blank=True, editable=False)
+
+    RENDITION_SPECS = ('thumbnail', 'medium')
+
+    # Конвертация в WebP и генерация вариантов выполняются воркером process_property_images
+    PROCESSING_STATES = [
+        ('pending', _('В очереди')),
+        ('processing', _('Обрабатывается')),
+        ('ready', _('Готово')),
+        ('failed', _('Ошибка')),
+    ]
+    processing_state = models.CharField(_('Статус обработки'), max_length=20, choices=PROCESSING_STATES,
+                                        default='pending', db_index=True, editable=False)
+    processing_attempts = models.PositiveSmallIntegerField(_('Попыток обработки'), default=0, editable=False)
+    processing_started_at = models.DateTimeField(_('Начало обработки'), null=True, blank=True, editable=False)
+    processing_error = models.TextField(_('Ошибка обработки'), blank=True, editable=False)
+
     class Meta:
         verbose_name = _('Изображение')
         verbose_name_plural = _('Изображения')
@@ -641,9 +734,238 @@ class PropertyImage(models.Model):
         elif not PropertyImage.objects.filter(property=self.property, is_main=True).exists():
             self.is_main = True
 
-        self._convert_image_to_webp()
+        # Новый или заменённый файл сохраняется как есть и ставится в очередь обработки;
+        # до её завершения шаблоны показывают оригинал
+        update_fields = kwargs.get('update_fields')
+        if self.renditions_outdated and (update_fields is None or 'image' in update_fields):
+            self.processing_state = 'pending'
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'processing_state'}
         super().save(*args, **kwargs)
 
+    @classmethod
+    def claim_pending(cls, limit=10):
+        """Забрать порцию изображений из очереди; параллельные воркеры не пересекаются."""
+        with transaction.atomic():
+            images = list(
+                cls.objects
+                .select_for_update(skip_locked=True)
+                .filter(processing_state='pending')
+                .order_by('pk')[:limit]
+            )
+            if images:
+                started_at = timezone.now()
+                cls.objects.filter(pk__in=[image.pk for image in images]).update(
+                    processing_state='processing',
+                    processing_started_at=started_at,
+                    processing_attempts=models.F('processing_attempts') + 1,
+                )
+                for image in images:
+                    image.processing_state = 'processing'
+                    image.processing_started_at = started_at
+                    image.processing_attempts += 1
+        return images
+
+    @classmethod
+    def requeue_stale(cls, started_before):
+        """Вернуть в очередь изображения, воркер которых прервался посреди обработки."""
+        return cls.objects.filter(
+            processing_state='processing',
+            processing_started_at__lt=started_before,
+        ).update(processing_state='pending')
+
+    @builtins.property
+    def needs_webp_conversion(self):
+        return bool(self.image) and not self.image.name.lower().endswith('.webp')
+
+    def process(self, prepared=None):
+        """Обработать изображение из очереди: WebP-оригинал, варианты, статус «Готово».
+
+        ``prepared`` — результат ``renditions.process_source`` (например, из пула
+        процессов); если не передан, считается здесь же.
+
+        Все записи условны по имени обрабатываемого файла: если редактор
+        загрузил новый файл (он снова в очереди), поднимается ``ImageSuperseded``
+        и результат не перезаписывает новую загрузку.
+        """
+        if prepared is None:
+            prepared = process_source(self.read_source_bytes(), self.needs_webp_conversion)
+        if prepared['webp'] is not None:
+            self._replace_with_webp(prepared['webp'])
+        renditions = self.generate_renditions(variants=prepared['variants'])
+        # Файл и варианты заменены: прежние URL превью в кэше карты больше не действуют
+        bump_image_version()
+
+        missing = [spec_name for spec_name in self.RENDITION_SPECS if spec_name not in renditions]
+        if missing:
+            # Без варианта страницы отдают оригинал: повторить обработку позже
+            raise ValueError(f"Не удалось создать варианты: {', '.join(missing)}")
+
+        updated = PropertyImage.objects.filter(pk=self.pk, image=self.image.name).update(
+            processing_state='ready',
+            processing_error='',
+        )
+        if not updated:
+            raise ImageSuperseded(f'Изображение #{self.pk} заменено во время обработки')
+        self.processing_state = 'ready'
+        self.processing_error = ''
+
+    def fail_processing(self, error, max_attempts=3):
+        """Зафиксировать ошибку: повторить позже или пометить как неуспешное после max_attempts."""
+        self.processing_state = 'failed' if self.processing_attempts >= max_attempts else 'pending'
+        self.processing_error = str(error)
+        PropertyImage.objects.filter(pk=self.pk).update(
+            processing_state=self.processing_state,
+            processing_error=self.processing_error,
+        )
+
+    def _replace_with_webp(self, content):
+        """Заменить загруженный оригинал его WebP-версией и удалить исходный файл."""
+        original_name = self.image.name
+        base_name = os.path.splitext(os.path.basename(original_name))[0]
+        self.image.save(f'{base_name}.webp', ContentFile(content), save=False)
+        updated = PropertyImage.objects.filter(pk=self.pk, image=original_name).update(image=self.image.name)
+        if not updated:
+            self.image.storage.delete(self.image.name)
+            raise ImageSuperseded(f'Изображение #{self.pk} заменено во время обработки')
+        if self.image.name != original_name:
+            self.image.storage.delete(original_name)
+
+    @builtins.property
+    def renditions_outdated(self):
+        """Варианты отсутствуют или построены для другого исходного файла."""
+        if not self.image:
+            return False
+        renditions = self.renditions or {}
+        if renditions.get('source') != self.image.name or 'responsive' not in renditions:
+            return True
+        return any(spec_name not in renditions for spec_name in self.RENDITION_SPECS)
+
+    def read_source_bytes(self):
+        """Прочитать исходный файл изображения целиком."""
+        self.image.open('rb')
+        try:
+            return self.image.read()
+        finally:
+            self.image.close()
+
+    def generate_renditions(self, variants=None):
+        """Сгенерировать варианты и сохранить их пути, размеры и вес.
+
+        ``variants`` — готовый результат ``renditions.render_variants`` (например,
+        посчитанный в пуле процессов); если не передан, считается здесь же.
+        """
+        renditions = {'source': self.image.name}
+        for spec_name in self.RENDITION_SPECS:
+            cache_file = getattr(self, spec_name)
+            try:
+                cache_file.generate()
+                storage = cache_file.storage
+                with storage.open(cache_file.name) as generated:
+                    with Image.open(generated) as pil_image:
+                        width, height = pil_image.size
+                renditions[spec_name] = {
+                    'name': cache_file.name,
+                    'width': width,
+                    'height': height,
+                    'size': storage.size(cache_file.name),
+                }
+            except Exception:
+                continue
+
+        try:
+            if variants is None:
+                variants = render_variants(self.read_source_bytes())
+            renditions['responsive'] = self._store_responsive_variants(variants)
+        except Exception:
+            renditions['responsive'] = []
+
+        updated = PropertyImage.objects.filter(pk=self.pk, image=self.image.name).update(renditions=renditions)
+        if not updated:
+            for variant in renditions['responsive']:
+                self.image.storage.delete(variant['name'])
+            raise ImageSuperseded(f'Изображение #{self.pk} заменено во время обработки')
+        self.renditions = renditions
+        return renditions
+
+    def _store_responsive_variants(self, variants):
+        """Записать адаптивные варианты в хранилище, удалив файлы предыдущей генерации."""
+        storage = self.image.storage
+        for previous in (self.renditions or {}).get('responsive', []):
+            try:
+                storage.delete(previous['name'])
+            except Exception:
+                pass
+
+        stem = os.path.splitext(os.path.basename(self.image.name))[0]
+        stored = []
+        for variant in variants:
+            name = f"properties/renditions/{self.pk}/{stem}-{variant['width']}w.{variant['format']}"
+            if storage.exists(name):
+                storage.delete(name)
+            name = storage.save(name, ContentFile(variant['content']))
+            stored.append({
+                'name': name,
+                'width': variant['width'],
+                'height': variant['height'],
+                'format': variant['format'],
+                'size': len(variant['content']),
+            })
+        return stored
+
+    def _current_renditions(self):
+        renditions = self.renditions or {}
+        if self.image and renditions.get('source') == self.image.name:
+            return renditions
+        return {}
+
+    def responsive_srcsets(self):
+        """[(MIME, srcset), ...] в порядке предпочтения форматов (AVIF, затем WebP)."""
+        by_format = {}
+        for variant in self._current_renditions().get('responsive', []):
+            by_format.setdefault(variant['format'], []).append(variant)
+
+        srcsets = []
+        for extension, mime in FORMAT_MIME_TYPES.items():
+            variants = sorted(by_format.get(extension, []), key=lambda variant: variant['width'])
+            if variants:
+                srcsets.append((mime, ', '.join(
+                    f"{self.image.storage.url(variant['name'])} {variant['width']}w" for variant in variants
+                )))
+        return srcsets
+
+    @builtins.property
+    def intrinsic_size(self):
+        """(ширина, высота) крупнейшего варианта для атрибутов width/height, либо (None, None)."""
+        renditions = self._current_renditions()
+        candidates = renditions.get('responsive') or [
+            renditions[spec_name] for spec_name in self.RENDITION_SPECS if spec_name in renditions
+        ]
+        if not candidates:
+            return None, None
+        largest = max(candidates, key=lambda variant: variant['width'])
+        return largest['width'], largest['height']
+
+    def rendition_size(self, spec_name):
+        """(ширина, высота) варианта ``spec_name`` (того, что отдаётся в src), либо (None, None)."""
+        rendition = self._current_renditions().get(spec_name)
+        if rendition:
+            return rendition['width'], rendition['height']
+
+        # Варианта нет в реестре — в src оригинал с пропорциями адаптивных вариантов
+        return self.intrinsic_size
+
+    def _rendition_url(self, spec_name):
+        """URL варианта из реестра без обращения к хранилищу, иначе оригинал.
+
+        Недостающие варианты (изображение ждёт воркер или генерация не удалась)
+        создаёт воркер process_property_images, а не запрос страницы.
+        """
+        rendition = self._current_renditions().get(spec_name)
+        if rendition:
+            return self.image.storage.url(rendition['name'])
+        return self.original_url
+
     @staticmethod
     def _safe_url(file_field):
         """Вернуть URL файла, если он существует."""
@@ -662,79 +984,14 @@ class PropertyImage(models.Model):
         """URL изображения среднего размера с fallback на оригинал."""
         if not self.original_url:
             return ''
-
-        try:
-            medium_file = self.medium
-            generate = getattr(medium_file, 'generate', None)
-            if callable(generate):
-                generate()
-            storage = getattr(medium_file, 'storage', None)
-            name = getattr(medium_file, 'name', None)
-            if storage and name and storage.exists(name):
-                return storage.url(name)
-        except Exception:
-            pass
-
-        return self.original_url
-
-    def _convert_image_to_webp(self):
-        """Преобразовать исходный файл изображения в WebP при сохранении."""
-        image_field = getattr(self, 'image', None)
-        if not image_field:
-            return
-
-        filename = image_field.name or ''
-        if filename.lower().endswith('.webp'):
-            return
-
-        try:
-            image_field.open()
-            pil_image = Image.open(image_field)
-            pil_image.load()
-        except Exception:
-            return
-
-        buffer = None
-        try:
-            if pil_image.mode not in ('RGB', 'RGBA'):
-                # Сохраняем прозрачность, если она была, иначе конвертируем в RGB
-                target_mode = 'RGBA' if pil_image.mode in ('LA', 'P') else 'RGB'
-                pil_image = pil_image.convert(target_mode)
-
-            buffer = BytesIO()
-            pil_image.save(buffer, format='WEBP', quality=85, method=6)
-            buffer.seek(0)
-
-            base_name, _ = os.path.splitext(filename)
-            webp_name = f"{base_name}.webp"
-            self.image.save(webp_name, ContentFile(buffer.read()), save=False)
-        finally:
-            if buffer is not None:
-                buffer.close()
-            pil_image.close()
-            close_file = getattr(image_field, 'close', None)
-            if callable(close_file):
-                close_file()
+        return self._rendition_url('medium')
 
     @builtins.property
     def thumbnail_url(self):
         """URL превью с fallback на оригинал."""
         if not self.original_url:
             return ''
-
-        try:
-            thumb_file = self.thumbnail
-            generate = getattr(thumb_file, 'generate', None)
-            if callable(generate):
-                generate()
-            storage = getattr(thumb_file, 'storage', None)
-            name = getattr(thumb_file, 'name', None)
-            if storage and name and storage.exists(name):
-                return storage.url(name)
-        except Exception:
-            pass
-
-        return self.original_url
+        return self._rendition_url('thumbnail')
 
 
 class PropertyFeature(models.Model):
@@ -757,3 +1014,448 @@ class PropertyFeatureRelation(models.Model):
 
     class Meta:
         unique_together = ['property', 'feature']
+
+
+class PropertySearchDocument(models.Model):
+    """Денормализованная строка каталога для фильтрации без JOIN по связанным таблицам.
+
+    Одна строка на каждый опубликованный объект (is_active=True, status='available').
+    Поддерживается сигналами из ``apps.properties.signals``; полная пересборка —
+    команда ``rebuild_search_documents``.
+    """
+    # Удобства кодируются битами: feature.id = 1 -> бит 0 ... feature.id = 63 -> бит 62
+    FEATURE_MASK_BITS = 63
+    COORDINATE_SCALE = 10 ** 6
+
+    property = models.OneToOneField(
+        Property,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search_document',
+        verbose_name=_('Недвижимость'),
+    )
+    property_type = models.ForeignKey(PropertyType, on_delete=models.CASCADE, related_name='+')
+    district = models.ForeignKey(District, on_delete=models.CASCADE, related_name='+')
+    location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name='+', blank=True, null=True)
+    deal_type = models.CharField(max_length=10)
+    build_status = models.CharField(max_length=20)
+    bedrooms = models.PositiveIntegerField(blank=True, null=True)
+    area_total = models.DecimalField(max_digits=8, decimal_places=2, blank=True, null=True)
+
+    # Цены во всех валютах (имена полей совпадают с Property, см. CurrencyService.get_price_field_names)
+    price_sale_thb = models.DecimalField(max_digits=15, decimal_places=2, blank=True, null=True)
+    price_sale_usd = models.DecimalField(max_digits=15, decimal_places=2, blank=True, null=True)
+    price_sale_rub = models.DecimalField(max_digits=15, decimal_places=2, blank=True, null=True)
+    price_rent_monthly_thb = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)
+    price_rent_monthly = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)
+    price_rent_monthly_rub = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)
+
+    feature_mask = models.BigIntegerField(default=0)
+
+    # Координаты в целых микроградусах (lat * 10^6) для выборки по окну карты по B-tree индексу
+    latitude_e6 = models.IntegerField(blank=True, null=True)
+    longitude_e6 = models.IntegerField(blank=True, null=True)
+
+    # Полнотекстовый поиск (см. apps.core.search); векторы заполняются только на PostgreSQL
+    search_text_ru = models.TextField(blank=True, default='')
+    search_text_en = models.TextField(blank=True, default='')
+    search_text_th = models.TextField(blank=True, default='')
+    search_vector_ru = SearchVectorField(blank=True, null=True, editable=False)
+    search_vector_en = SearchVectorField(blank=True, null=True, editable=False)
+    search_vector_th = SearchVectorField(blank=True, null=True, editable=False)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    PRICE_FIELDS = (
+        # (поле документа, поле Property, валюта, тип сделки)
+        ('price_sale_thb', 'price_sale_thb', 'THB', 'sale'),
+        ('price_sale_usd', 'price_sale_usd', 'USD', 'sale'),
+        ('price_sale_rub', 'price_sale_rub', 'RUB', 'sale'),
+        ('price_rent_monthly_thb', 'price_rent_monthly_thb', 'THB', 'rent'),
+        ('price_rent_monthly', 'price_rent_monthly', 'USD', 'rent'),
+        ('price_rent_monthly_rub', 'price_rent_monthly_rub', 'RUB', 'rent'),
+    )
+
+    # Поля Property, изменение которых не влияет ни на документ, ни на состав выдачи
+    IGNORED_UPDATE_FIELDS = frozenset({'views_count', 'is_featured', 'featured_priority', 'updated_at'})
+
+    class Meta:
+        verbose_name = _('Поисковый документ')
+        verbose_name_plural = _('Поисковые документы')
+        indexes = [
+            models.Index(fields=['deal_type', 'property_type'], name='prop_search_deal_type_idx'),
+            models.Index(fields=['district', 'location'], name='prop_search_district_idx'),
+            models.Index(fields=['bedrooms'], name='prop_search_bedrooms_idx'),
+            models.Index(fields=['price_sale_thb'], name='prop_search_sale_thb_idx'),
+            models.Index(fields=['price_sale_usd'], name='prop_search_sale_usd_idx'),
+            models.Index(fields=['price_sale_rub'], name='prop_search_sale_rub_idx'),
+            models.Index(fields=['latitude_e6', 'longitude_e6'], name='prop_search_coords_idx'),
+        ]
+
+    def __str__(self):
+        return f"Search document #{self.property_id}"
+
+    @classmethod
+    def feature_bit(cls, feature_id):
+        """Вернуть бит удобства или 0, если id не помещается в маску."""
+        try:
+            feature_id = int(feature_id)
+        except (TypeError, ValueError):
+            return 0
+        if 1 <= feature_id <= cls.FEATURE_MASK_BITS:
+            return 1 << (feature_id - 1)
+        return 0
+
+    @classmethod
+    def scale_coordinate(cls, value):
+        """Градусы -> целые микроградусы (None для пустых координат)."""
+        if value is None:
+            return None
+        return int(round(Decimal(str(value)) * cls.COORDINATE_SCALE))
+
+    @classmethod
+    def build_feature_mask(cls, feature_ids):
+        mask = 0
+        for feature_id in feature_ids:
+            mask |= cls.feature_bit(feature_id)
+        return mask
+
+    @classmethod
+    def features_condition(cls, feature_ids):
+        """Условие «есть все указанные удобства».
+
+        Удобства из маски проверяются одним побитовым AND, остальные — одним
+        подзапросом с HAVING COUNT, поэтому число JOIN не растёт с числом удобств.
+        """
+        mask = 0
+        overflow_ids = set()
+        for feature_id in feature_ids:
+            bit = cls.feature_bit(feature_id)
+            if bit:
+                mask |= bit
+            else:
+                overflow_ids.add(feature_id)
+
+        condition = models.Q()
+        if mask:
+            condition &= models.Q(Exact(models.F('feature_mask').bitand(mask), mask))
+
+        if overflow_ids:
+            matching = (
+                PropertyFeatureRelation.objects
+                .filter(feature_id__in=overflow_ids)
+                .values('property_id')
+                .annotate(matched=models.Count('feature_id'))
+                .filter(matched=len(overflow_ids))
+                .values('property_id')
+            )
+            condition &= models.Q(property_id__in=matching)
+
+        return condition
+
+    @classmethod
+    def filter_by_features(cls, queryset, feature_ids):
+        """Оставить документы, у которых есть все указанные удобства."""
+        return queryset.filter(cls.features_condition(feature_ids))
+
+    @staticmethod
+    def is_indexable(property_obj):
+        return property_obj.is_active and property_obj.status == 'available'
+
+    @classmethod
+    def build_values(cls, property_obj, search_parts):
+        """Собрать значения документа для объекта недвижимости."""
+        values = {
+            'property_type_id': property_obj.property_type_id,
+            'district_id': property_obj.district_id,
+            'location_id': property_obj.location_id,
+            'deal_type': property_obj.deal_type,
+            'build_status': property_obj.build_status,
+            'bedrooms': property_obj.bedrooms,
+            'area_total': property_obj.area_total,
+            'latitude_e6': cls.scale_coordinate(property_obj.latitude),
+            'longitude_e6': cls.scale_coordinate(property_obj.longitude),
+            'feature_mask': cls.build_feature_mask(
+                property_obj.features.values_list('feature_id', flat=True)
+            ),
+        }
+
+        for document_field, property_field, currency_code, deal_type in cls.PRICE_FIELDS:
+            # Сохранённая цена приоритетнее пересчёта по курсу
+            price = getattr(property_obj, property_field, None)
+            if not price:
+                price = property_obj.get_price_in_currency(currency_code, deal_type)
+            values[document_field] = round(Decimal(str(price)), 2) if price else None
+
+        values.update(search.search_text_values(search_parts))
+        return values
+
+    @staticmethod
+    def build_search_parts(property_obj):
+        """Части поискового текста по языкам: [(текст, вес)]."""
+        def translated(obj, name, language):
+            if obj is None:
+                return ''
+            return getattr(obj, f'{name}_{language}', '') or ''
+
+        district = property_obj.district
+        location = property_obj.location
+        parts = {}
+        for language in search.SEARCH_LANGUAGES:
+            parts[language] = [
+                (translated(property_obj, 'title', language), 'A'),
+                (translated(property_obj, 'complex_name', language), 'A'),
+                (translated(district, 'name', language), 'B'),
+                (translated(location, 'name', language), 'B'),
+                (translated(property_obj, 'address', language), 'B'),
+                (translated(property_obj, 'short_description', language), 'C'),
+                (translated(property_obj, 'description', language), 'C'),
+            ]
+        return parts
+
+    @classmethod
+    def sync_property(cls, property_obj):
+        """Создать, обновить или удалить документ для объекта недвижимости."""
+        if not cls.is_indexable(property_obj):
+            cls.objects.filter(property_id=property_obj.pk).delete()
+            return None
+
+        search_parts = cls.build_search_parts(property_obj)
+        document, _created = cls.objects.update_or_create(
+            property_id=property_obj.pk,
+            defaults=cls.build_values(property_obj, search_parts),
+        )
+        search.store_search_vectors(cls.objects.filter(property_id=property_obj.pk), search_parts)
+        return document
+
+    @classmethod
+    def sync_properties(cls, queryset):
+        """Пересинхронизировать документы для набора объектов; возвращает количество."""
+        synced = 0
+        for property_obj in queryset.iterator():
+            cls.sync_property(property_obj)
+            synced += 1
+        return synced
+
+    @classmethod
+    def refresh_feature_mask(cls, property_id):
+        """Обновить только маску удобств (безопасно при каскадном удалении объекта)."""
+        mask = cls.build_feature_mask(
+            PropertyFeatureRelation.objects.filter(property_id=property_id).values_list('feature_id', flat=True)
+        )
+        cls.objects.filter(property_id=property_id).update(feature_mask=mask)
+
+
+class PropertySeoMetadata(models.Model):
+    """Готовые title/description/keywords объекта для каждого языка сайта.
+
+    Рассчитываются ``Property.compute_seo_data`` (кастомные поля, SEO шаблон
+    или автогенерация) при сохранении объекта. Изменение типа, района,
+    локации или ``SEOTemplate`` затрагивает много объектов, поэтому их строки
+    только помечаются ``is_stale`` одним UPDATE (сигналы
+    ``apps.properties.signals``): такие строки не используются, данные
+    считаются на лету, пока cron не выполнит ``rebuild_seo_metadata --stale``.
+    Полный пересчёт — ``rebuild_seo_metadata`` без параметров.
+    """
+    property = models.ForeignKey(
+        Property,
+        on_delete=models.CASCADE,
+        related_name='seo_metadata',
+        verbose_name=_('Недвижимость'),
+    )
+    language = models.CharField(_('Язык'), max_length=10)
+    title = models.TextField(_('Заголовок'), blank=True, default='')
+    description = models.TextField(_('Описание'), blank=True, default='')
+    keywords = models.TextField(_('Ключевые слова'), blank=True, default='')
+    is_stale = models.BooleanField(_('Требует пересчёта'), default=False, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _('SEO метаданные объекта')
+        verbose_name_plural = _('SEO метаданные объектов')
+        constraints = [
+            models.UniqueConstraint(fields=['property', 'language'], name='prop_seo_metadata_unique_lang'),
+        ]
+
+    def __str__(self):
+        return f"SEO #{self.property_id} ({self.language})"
+
+    def as_dict(self):
+        return {
+            'title': self.title,
+            'description': self.description,
+            'keywords': self.keywords,
+        }
+
+    @staticmethod
+    def languages():
+        return [code for code, _name in settings.LANGUAGES]
+
+    @classmethod
+    def build_rows(cls, property_obj, templates):
+        rows = []
+        for language in cls.languages():
+            data = property_obj.compute_seo_data(language, templates=templates)
+            rows.append(cls(
+                property_id=property_obj.pk,
+                language=language,
+                title=data.get('title') or '',
+                description=data.get('description') or '',
+                keywords=data.get('keywords') or '',
+                is_stale=False,
+                updated_at=timezone.now(),
+            ))
+        return rows
+
+    @classmethod
+    def refresh_properties(cls, queryset, batch_size=200):
+        """Пересчитать метаданные набора объектов пачками; возвращает количество объектов."""
+        templates = Property.load_seo_templates()
+        property_ids = list(queryset.order_by('pk').values_list('pk', flat=True))
+        refreshed = 0
+        for offset in range(0, len(property_ids), batch_size):
+            batch = Property.objects.filter(pk__in=property_ids[offset:offset + batch_size]).select_related(
+                'property_type', 'district', 'location'
+            )
+            rows = []
+            for property_obj in batch:
+                rows.extend(cls.build_rows(property_obj, templates))
+            with transaction.atomic():
+                cls.objects.bulk_create(
+                    rows,
+                    update_conflicts=True,
+                    unique_fields=['property', 'language'],
+                    update_fields=['title', 'description', 'keywords', 'is_stale', 'updated_at'],
+                )
+            refreshed += len(batch)
+        return refreshed
+
+    @classmethod
+    def refresh_property(cls, property_obj):
+        """Пересчитать метаданные одного объекта"""
+        return cls.refresh_properties(Property.objects.filter(pk=property_obj.pk))
+
+    @classmethod
+    def mark_stale(cls, queryset):
+        """Пометить метаданные объектов queryset устаревшими (один UPDATE)"""
+        return cls.objects.filter(property__in=queryset.values('pk'), is_stale=False).update(is_stale=True)
+
+
+class PropertySimilar(models.Model):
+    """Ближайшие похожие объекты (топ-K по вектору признаков, см. ``apps.properties.similarity``).
+
+    Таблица пересобирается целиком командой ``rebuild_similar_properties``
+    (по cron); карточка объекта читает соседей одним запросом по индексу.
+    """
+    SIMILAR_LIMIT = 12
+
+    property = models.ForeignKey(
+        Property,
+        on_delete=models.CASCADE,
+        related_name='similar_links',
+        verbose_name=_('Недвижимость'),
+    )
+    similar = models.ForeignKey(
+        Property,
+        on_delete=models.CASCADE,
+        related_name='similar_of',
+        verbose_name=_('Похожий объект'),
+    )
+    rank = models.PositiveSmallIntegerField(_('Позиция'))
+    distance = models.FloatField(_('Расстояние'))
+
+    class Meta:
+        verbose_name = _('Похожий объект')
+        verbose_name_plural = _('Похожие объекты')
+        ordering = ['property', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['property', 'rank'], name='prop_similar_unique_rank'),
+        ]
+
+    def __str__(self):
+        return f"#{self.property_id} -> #{self.similar_id} ({self.rank})"
+
+    FEATURE_COLUMNS = (
+        'property_id', 'deal_type', 'property_type_id', 'district_id', 'bedrooms', 'area_total',
+        'price_sale_usd', 'price_rent_monthly', 'feature_mask',
+        'property__latitude', 'property__longitude',
+    )
+
+    @classmethod
+    def feature_rows(cls):
+        """Исходные данные векторов признаков всех опубликованных объектов."""
+        return list(PropertySearchDocument.objects.order_by('property_id').values(*cls.FEATURE_COLUMNS))
+
+    @classmethod
+    def feature_fingerprint(cls, rows, limit=SIMILAR_LIMIT):
+        """Хэш исходных данных сборки: совпадает — пересобирать незачем."""
+        digest = hashlib.sha256(f'limit={limit}'.encode())
+        for row in rows:
+            digest.update(repr([row[column] for column in cls.FEATURE_COLUMNS]).encode())
+        return digest.hexdigest()
+
+    @classmethod
+    def rebuild(cls, limit=SIMILAR_LIMIT, rows=None):
+        """Пересчитать соседей для всех опубликованных объектов; возвращает число объектов."""
+        from .similarity import build_feature_matrix, nearest_neighbors
+
+        if rows is None:
+            rows = cls.feature_rows()
+        links = []
+        if len(rows) > 1:
+            matrix = build_feature_matrix(
+                {
+                    # Аренда сравнивается по месячной ставке, продажа — по цене продажи
+                    'price': [
+                        row['price_rent_monthly'] if row['deal_type'] == 'rent' else row['price_sale_usd']
+                        for row in rows
+                    ],
+                    'area': [row['area_total'] for row in rows],
+                    'bedrooms': [row['bedrooms'] for row in rows],
+                    'latitude': [row['property__latitude'] for row in rows],
+                    'longitude': [row['property__longitude'] for row in rows],
+                    'deal_type': [row['deal_type'] for row in rows],
+                    'property_type': [row['property_type_id'] for row in rows],
+                    'district': [row['district_id'] for row in rows],
+                    'feature_mask': [row['feature_mask'] for row in rows],
+                },
+                mask_bits=PropertySearchDocument.FEATURE_MASK_BITS,
+            )
+            indices, distances = nearest_neighbors(matrix, limit)
+            for position, row in enumerate(rows):
+                for rank, (neighbor, distance) in enumerate(zip(indices[position], distances[position]), start=1):
+                    links.append(cls(
+                        property_id=row['property_id'],
+                        similar_id=rows[neighbor]['property_id'],
+                        rank=rank,
+                        distance=float(distance),
+                    ))
+
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(links, batch_size=1000)
+        return len(rows)
+
+
+class PropertySimilarBuild(models.Model):
+    """Журнал сборок ``PropertySimilar``: хэш исходных данных каждой сборки.
+
+    Хранится в БД, а не в кэше, чтобы ``rebuild_similar_properties --if-changed``
+    из отдельного процесса cron мог сравнить текущие данные с последней сборкой.
+    """
+    fingerprint = models.CharField(_('Хэш данных'), max_length=64)
+    properties_count = models.PositiveIntegerField(_('Объектов'), default=0)
+    built_at = models.DateTimeField(_('Собрано'), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _('Сборка похожих объектов')
+        verbose_name_plural = _('Сборки похожих объектов')
+        get_latest_by = 'built_at'
+        ordering = ['-built_at']
+
+    def __str__(self):
+        return f"{self.built_at:%Y-%m-%d %H:%M} ({self.properties_count})"
+
+    @classmethod
+    def latest_fingerprint(cls):
+        return cls.objects.order_by('-built_at', '-pk').values_list('fingerprint', flat=True).first()
@@ -0,0 +1,155 @@
+"""Keyset (seek) пагинация для AJAX/бесконечной прокрутки каталога."""
+
+import base64
+import binascii
+import datetime
+import hashlib
+import json
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import F, Q, Value
+from django.db.models.functions import Coalesce
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _json_default(value):
+    # Полная точность: DjangoJSONEncoder обрезает микросекунды, и сравнение по ключу ломается
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f'Unsupported cursor value: {value!r}')
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class KeysetPaginator:
+    """Постраничный вывод по условию «после последней строки» вместо OFFSET.
+
+    ``ordering`` — кортеж сортировки вида ``['-featured_priority', '-created_at', '-id']``;
+    последнее поле должно быть уникальным. Курсор — непрозрачная строка с
+    значениями ключа сортировки граничной строки и направлением перехода.
+    """
+
+    def __init__(self, queryset, ordering, per_page=12):
+        self.per_page = per_page
+        self.keys = []
+        for item in ordering:
+            descending = item.startswith('-')
+            name = item.lstrip('-')
+            queryset, name = self._seek_key(queryset, name)
+            self.keys.append((name, descending))
+        self.queryset = queryset
+        self.signature = hashlib.md5('|'.join(ordering).encode('utf-8')).hexdigest()[:8]
+
+    def _seek_key(self, queryset, name):
+        """Для nullable полей сортировать по Coalesce, чтобы сравнения были определены."""
+        try:
+            field = queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return queryset, name
+        if not field.null:
+            return queryset, name
+        alias = f'_seek_{name}'
+        queryset = queryset.annotate(**{alias: Coalesce(F(name), Value(0), output_field=field.clone())})
+        return queryset, alias
+
+    def _ordering(self, reverse=False):
+        return [
+            f"{'-' if descending != reverse else ''}{name}"
+            for name, descending in self.keys
+        ]
+
+    def _key_values(self, obj):
+        return [getattr(obj, name) for name, _descending in self.keys]
+
+    def encode_cursor(self, obj, direction):
+        payload = {'o': self.signature, 'd': direction, 'v': self._key_values(obj)}
+        raw = json.dumps(payload, default=_json_default, separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+            if payload.get('o') != self.signature or payload.get('d') not in ('next', 'prev'):
+                raise InvalidCursor(cursor)
+            values = payload['v']
+            if len(values) != len(self.keys):
+                raise InvalidCursor(cursor)
+            return payload['d'], [self._to_python(name, value) for (name, _d), value in zip(self.keys, values)]
+        except (binascii.Error, UnicodeError, ValueError, KeyError, TypeError, ValidationError) as exc:
+            raise InvalidCursor(cursor) from exc
+
+    def _to_python(self, name, value):
+        if value is None:
+            return None
+        field_name = name[len('_seek_'):] if name.startswith('_seek_') else name
+        try:
+            field = self.queryset.model._meta.get_field(field_name)
+        except FieldDoesNotExist:
+            return value
+        return field.to_python(value)
+
+    def _seek_condition(self, values, reverse=False):
+        """(a < va) OR (a = va AND b < vb) OR ... с учётом направления каждого поля."""
+        condition = Q()
+        for index, (name, descending) in enumerate(self.keys):
+            lookup = 'lt' if descending != reverse else 'gt'
+            step = Q(**{f'{name}__{lookup}': values[index]})
+            for previous_index in range(index):
+                step &= Q(**{self.keys[previous_index][0]: values[previous_index]})
+            condition |= step
+        return condition
+
+    def page(self, cursor=None):
+        """Страница после (next) или перед (prev) курсором; без курсора — первая."""
+        direction, values = ('next', None)
+        if cursor:
+            direction, values = self.decode_cursor(cursor)
+
+        reverse = direction == 'prev'
+        queryset = self.queryset.order_by(*self._ordering(reverse=reverse))
+        if values is not None:
+            queryset = queryset.filter(self._seek_condition(values, reverse=reverse))
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse:
+            rows.reverse()
+
+        if not rows:
+            return KeysetPage([])
+
+        if reverse:
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+
+        return KeysetPage(
+            rows,
+            next_cursor=self.encode_cursor(rows[-1], 'next') if has_next else None,
+            previous_cursor=self.encode_cursor(rows[0], 'prev') if has_previous else None,
+        )
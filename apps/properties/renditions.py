@@ -0,0 +1,81 @@
+"""Обработка фотографий объектов: WebP-оригинал и адаптивные варианты (WebP/AVIF).
+
+Функции модуля не обращаются к Django и работают только с байтами, поэтому
+их можно выполнять в ``ProcessPoolExecutor`` (см. команду
+``process_property_images``); запись файлов в хранилище и БД делает
+``PropertyImage.process`` в основном процессе.
+"""
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+RESPONSIVE_WIDTHS = (320, 480, 768, 1200, 1600)
+
+# (расширение, формат Pillow, MIME, параметры кодирования); порядок = приоритет в <picture>
+RESPONSIVE_FORMATS = (
+    ('avif', 'AVIF', 'image/avif', {'quality': 55}),
+    ('webp', 'WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+)
+
+FORMAT_MIME_TYPES = {extension: mime for extension, _format, mime, _options in RESPONSIVE_FORMATS}
+
+
+def available_formats():
+    """Форматы, которые умеет кодировать установленный Pillow (AVIF есть не везде)."""
+    Image.init()
+    return [entry for entry in RESPONSIVE_FORMATS if entry[1] in Image.SAVE]
+
+
+def target_widths(source_width):
+    """Ширины вариантов без увеличения: все меньшие исходника плюс сам исходник (с ограничением)."""
+    widths = {width for width in RESPONSIVE_WIDTHS if width < source_width}
+    widths.add(min(source_width, RESPONSIVE_WIDTHS[-1]))
+    return sorted(widths)
+
+
+def encode_webp(source_bytes):
+    """Перекодировать загруженный оригинал в WebP."""
+    with Image.open(BytesIO(source_bytes)) as pil_image:
+        pil_image.load()
+        if pil_image.mode not in ('RGB', 'RGBA'):
+            # Сохраняем прозрачность, если она была, иначе конвертируем в RGB
+            target_mode = 'RGBA' if pil_image.mode in ('LA', 'P') else 'RGB'
+            pil_image = pil_image.convert(target_mode)
+
+        buffer = BytesIO()
+        pil_image.save(buffer, format='WEBP', quality=85, method=6)
+    return buffer.getvalue()
+
+
+def process_source(source_bytes, convert_to_webp=True):
+    """Вся тяжёлая работа по одному изображению: WebP-оригинал (если нужен) и варианты."""
+    return {
+        'webp': encode_webp(source_bytes) if convert_to_webp else None,
+        'variants': render_variants(source_bytes),
+    }
+
+
+def render_variants(source_bytes):
+    """Построить варианты изображения; возвращает список словарей с закодированным содержимым."""
+    with Image.open(BytesIO(source_bytes)) as opened:
+        transposed = ImageOps.exif_transpose(opened)
+        has_alpha = transposed.mode in ('RGBA', 'LA') or (
+            transposed.mode == 'P' and 'transparency' in transposed.info
+        )
+        source = transposed.convert('RGBA' if has_alpha else 'RGB')
+
+    formats = available_formats()
+    variants = []
+    for width in target_widths(source.width):
+        height = max(1, round(source.height * width / source.width))
+        resized = source if width == source.width else source.resize((width, height), Image.LANCZOS)
+        for extension, pil_format, _mime, options in formats:
+            buffer = BytesIO()
+            resized.save(buffer, format=pil_format, **options)
+            variants.append({
+                'width': width,
+                'height': height,
+                'format': extension,
+                'content': buffer.getvalue(),
+            })
+    return variants
@@ -0,0 +1,118 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.core.models import SEOTemplate
+from apps.locations.models import District, Location
+from .inventory import bump_image_version, bump_inventory_version, bump_reference_version
+from .models import (
+    Property, PropertyFeature, PropertyFeatureRelation, PropertyImage, PropertySearchDocument,
+    PropertySeoMetadata, PropertyType,
+)
+
+
+def _is_inventory_change(update_fields):
+    """Сохранения только счётчиков/приоритета не меняют состав каталога."""
+    if update_fields is None:
+        return True
+    return not set(update_fields) <= PropertySearchDocument.IGNORED_UPDATE_FIELDS
+
+
+@receiver(post_save, sender=Property, dispatch_uid='properties.sync_search_document')
+def sync_search_document(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Держим поисковый документ в актуальном состоянии после сохранения объекта."""
+    if raw or not _is_inventory_change(update_fields):
+        return
+    PropertySearchDocument.sync_property(instance)
+    PropertySeoMetadata.refresh_property(instance)
+    bump_inventory_version()
+    if update_fields is None:
+        # Полное сохранение могло записать устаревший main_image из памяти
+        instance.main_image_id = Property.refresh_main_image(instance.pk)
+
+
+@receiver(post_delete, sender=Property, dispatch_uid='properties.property_deleted_bump_version')
+def property_deleted(sender, instance, **kwargs):
+    bump_inventory_version()
+
+
+@receiver(post_save, sender=PropertyFeatureRelation, dispatch_uid='properties.feature_saved_refresh_mask')
+@receiver(post_delete, sender=PropertyFeatureRelation, dispatch_uid='properties.feature_deleted_refresh_mask')
+def refresh_search_feature_mask(sender, instance, raw=False, **kwargs):
+    """Пересчитываем маску удобств при изменении связей с характеристиками."""
+    if raw:
+        return
+    PropertySearchDocument.refresh_feature_mask(instance.property_id)
+    bump_inventory_version()
+    # Топ удобств в боковой панели считается по связям
+    bump_reference_version()
+
+
+@receiver(post_save, sender=PropertyImage, dispatch_uid='properties.image_saved_main_image')
+@receiver(post_delete, sender=PropertyImage, dispatch_uid='properties.image_deleted_main_image')
+def refresh_property_main_image(sender, instance, raw=False, **kwargs):
+    """Держим Property.main_image в соответствии с флагом is_main и порядком галереи."""
+    if raw:
+        return
+    image_id = Property.refresh_main_image(instance.property_id)
+    # Файл или порядок главного изображения мог поменяться и без смены ссылки
+    bump_image_version()
+    if PropertyImage.property.is_cached(instance):
+        instance.property.main_image_id = image_id
+
+
+@receiver(post_save, sender=PropertyType, dispatch_uid='properties.property_type_saved_reference')
+@receiver(post_delete, sender=PropertyType, dispatch_uid='properties.property_type_deleted_reference')
+@receiver(post_save, sender=PropertyFeature, dispatch_uid='properties.feature_saved_reference')
+@receiver(post_delete, sender=PropertyFeature, dispatch_uid='properties.feature_deleted_reference')
+@receiver(post_save, sender=District, dispatch_uid='properties.district_saved_reference')
+@receiver(post_delete, sender=District, dispatch_uid='properties.district_deleted_reference')
+@receiver(post_save, sender=Location, dispatch_uid='properties.location_saved_reference')
+@receiver(post_delete, sender=Location, dispatch_uid='properties.location_deleted_reference')
+def invalidate_filter_reference(sender, raw=False, **kwargs):
+    """Справочники фильтров каталога кэшируются до следующего изменения."""
+    if raw:
+        return
+    bump_reference_version()
+
+
+@receiver(post_save, sender=District, dispatch_uid='properties.district_saved_search')
+@receiver(post_save, sender=Location, dispatch_uid='properties.location_saved_search')
+def resync_related_search_documents(sender, instance, raw=False, **kwargs):
+    """Названия района и локации входят в поисковый текст объектов."""
+    if raw:
+        return
+    field_name = {District: 'district', Location: 'location'}[sender]
+    properties = Property.objects.filter(**{field_name: instance}).select_related(
+        'property_type', 'district', 'location'
+    )
+
+    def resync():
+        if PropertySearchDocument.sync_properties(properties):
+            bump_inventory_version()
+
+    transaction.on_commit(resync)
+
+
+@receiver(post_save, sender=PropertyType, dispatch_uid='properties.property_type_saved_seo')
+@receiver(post_save, sender=District, dispatch_uid='properties.district_saved_seo')
+@receiver(post_save, sender=Location, dispatch_uid='properties.location_saved_seo')
+def mark_related_seo_metadata_stale(sender, instance, raw=False, **kwargs):
+    """Названия типа, района и локации входят в SEO шаблоны объектов.
+
+    Пересчёт всех объектов не выполняется в запросе админки: строки
+    помечаются устаревшими и пересчитываются ``rebuild_seo_metadata --stale``.
+    """
+    if raw:
+        return
+    field_name = {PropertyType: 'property_type', District: 'district', Location: 'location'}[sender]
+    PropertySeoMetadata.mark_stale(Property.objects.filter(**{field_name: instance}))
+
+
+@receiver(post_save, sender=SEOTemplate, dispatch_uid='properties.seo_template_saved_seo')
+@receiver(post_delete, sender=SEOTemplate, dispatch_uid='properties.seo_template_deleted_seo')
+def mark_seo_metadata_stale_for_template(sender, instance, raw=False, **kwargs):
+    """Изменение шаблона карточки может поменять выбор шаблона у любого объекта."""
+    if raw or instance.template_type != 'property_detail':
+        return
+    PropertySeoMetadata.mark_stale(Property.objects.all())
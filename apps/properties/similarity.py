@@ -0,0 +1,115 @@
+"""Похожие объекты: векторы признаков и поиск ближайших соседей на NumPy.
+
+Каждый опубликованный объект превращается в вектор: стандартизованные
+log(цена), log(площадь), спальни и координаты, one-hot типа сделки, типа
+недвижимости и района, плюс биты удобств из ``feature_mask``. Ближайшие
+соседи ищутся одним матричным умножением по блокам строк, результат
+хранится в ``PropertySimilar`` (см. команду ``rebuild_similar_properties``).
+
+Функции модуля не обращаются к Django и работают только с массивами.
+"""
+import numpy as np
+
+# Вес групп признаков в евклидовом расстоянии
+FEATURE_WEIGHTS = {
+    'price': 2.0,
+    'area': 1.0,
+    'bedrooms': 1.0,
+    'coordinates': 1.5,
+    'deal_type': 3.0,
+    'property_type': 2.0,
+    'district': 1.0,
+    'amenities': 1.0,
+}
+
+# Сколько строк матрицы расстояний считать за раз (память ~ BLOCK_SIZE * N * 8 байт)
+BLOCK_SIZE = 512
+
+
+def _standardize(values):
+    """z-оценка столбца; пропуски (NaN) заменяются средним, т.е. нулём."""
+    values = np.asarray(values, dtype=np.float64)
+    known = ~np.isnan(values)
+    if not known.any():
+        return np.zeros_like(values)
+    mean = values[known].mean()
+    std = values[known].std()
+    result = np.zeros_like(values)
+    if std > 0:
+        result[known] = (values[known] - mean) / std
+    return result
+
+
+def _one_hot(codes):
+    """One-hot по произвольным значениям (None — отдельная категория)."""
+    _unique, inverse = np.unique(np.asarray([str(code) for code in codes]), return_inverse=True)
+    matrix = np.zeros((len(codes), inverse.max() + 1 if len(codes) else 0))
+    matrix[np.arange(len(codes)), inverse] = 1.0
+    return matrix
+
+
+def _unpack_mask(masks, bits):
+    """Битовые маски удобств -> матрица 0/1, нормированная по длине строки."""
+    masks = np.asarray(masks, dtype=np.int64)
+    matrix = ((masks[:, None] >> np.arange(bits, dtype=np.int64)) & 1).astype(np.float64)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+
+def build_feature_matrix(columns, mask_bits=63):
+    """Собрать матрицу признаков из словаря столбцов одинаковой длины.
+
+    Ожидаемые ключи: ``price``, ``area``, ``bedrooms``, ``latitude``,
+    ``longitude`` (числа или None), ``deal_type``, ``property_type``,
+    ``district`` (категории) и ``feature_mask`` (int).
+    """
+    def numeric(name, transform=None):
+        values = np.array(
+            [np.nan if value is None else float(value) for value in columns[name]],
+            dtype=np.float64,
+        )
+        if transform is not None:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                values = transform(values)
+            values[~np.isfinite(values)] = np.nan
+        return _standardize(values)
+
+    blocks = [
+        (FEATURE_WEIGHTS['price'], numeric('price', np.log1p)[:, None]),
+        (FEATURE_WEIGHTS['area'], numeric('area', np.log1p)[:, None]),
+        (FEATURE_WEIGHTS['bedrooms'], numeric('bedrooms')[:, None]),
+        (FEATURE_WEIGHTS['coordinates'], np.column_stack([numeric('latitude'), numeric('longitude')])),
+        (FEATURE_WEIGHTS['deal_type'], _one_hot(columns['deal_type'])),
+        (FEATURE_WEIGHTS['property_type'], _one_hot(columns['property_type'])),
+        (FEATURE_WEIGHTS['district'], _one_hot(columns['district'])),
+        (FEATURE_WEIGHTS['amenities'], _unpack_mask(columns['feature_mask'], mask_bits)),
+    ]
+    return np.hstack([weight * block for weight, block in blocks])
+
+
+def nearest_neighbors(matrix, k):
+    """Индексы и расстояния k ближайших соседей каждой строки (без неё самой).
+
+    Квадраты расстояний считаются как |a|² + |b|² - 2ab блоками по
+    ``BLOCK_SIZE`` строк; внутри блока соседи выбираются ``argpartition``.
+    """
+    count = matrix.shape[0]
+    k = min(k, count - 1)
+    if k <= 0:
+        return np.empty((count, 0), dtype=np.int64), np.empty((count, 0))
+
+    squared_norms = np.einsum('ij,ij->i', matrix, matrix)
+    indices = np.empty((count, k), dtype=np.int64)
+    distances = np.empty((count, k))
+    for start in range(0, count, BLOCK_SIZE):
+        stop = min(start + BLOCK_SIZE, count)
+        block = squared_norms[start:stop, None] + squared_norms[None, :] - 2.0 * matrix[start:stop] @ matrix.T
+        np.maximum(block, 0.0, out=block)
+        block[np.arange(stop - start), np.arange(start, stop)] = np.inf
+
+        candidates = np.argpartition(block, k - 1, axis=1)[:, :k]
+        candidate_distances = np.take_along_axis(block, candidates, axis=1)
+        order = np.argsort(candidate_distances, axis=1, kind='stable')
+        indices[start:stop] = np.take_along_axis(candidates, order, axis=1)
+        distances[start:stop] = np.sqrt(np.take_along_axis(candidate_distances, order, axis=1))
+    return indices, distances
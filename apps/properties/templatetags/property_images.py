@@ -0,0 +1,45 @@
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html, format_html_join
+
+register = template.Library()
+
+
+def _sources(image, sizes):
+    # Пропорции адаптивных вариантов (без обрезки) — браузер берёт их для выбранного <source>
+    width, height = image.intrinsic_size
+    size_attrs = flatatt({'width': width, 'height': height}) if width and height else ''
+    return format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}"{}>',
+        ((mime, srcset, sizes, size_attrs) for mime, srcset in image.responsive_srcsets()),
+    )
+
+
+@register.simple_tag
+def responsive_sources(image, sizes='100vw'):
+    """Только теги <source> для ручной разметки <picture> вокруг своего <img>."""
+    return _sources(image, sizes)
+
+
+@register.simple_tag
+def responsive_picture(image, sizes='100vw', fallback='medium', **attrs):
+    """<picture> с AVIF/WebP srcset, sizes и размерами варианта из src.
+
+    Дополнительные именованные аргументы (class, alt, loading, onclick, ...)
+    попадают в тег <img>. Без сгенерированных вариантов выводится обычный <img>.
+    """
+    spec_name = 'thumbnail' if fallback == 'thumbnail' else 'medium'
+    src = image.thumbnail_url if spec_name == 'thumbnail' else image.medium_url
+
+    img_attrs = {'src': src}
+    # Размеры (и пропорции) именно варианта из src: превью обрезано, в отличие от srcset
+    width, height = image.rendition_size(spec_name)
+    if width and height:
+        img_attrs.update(width=width, height=height)
+    img_attrs.update(attrs)
+    img = format_html('<img{}>', flatatt(img_attrs))
+
+    sources = _sources(image, sizes)
+    if not sources:
+        return img
+    return format_html('<picture class="contents">{}{}</picture>', sources, img)
@@ -0,0 +1,333 @@
+import datetime
+from decimal import Decimal
+from unittest import mock
+
+import numpy as np
+from django.core.paginator import Paginator
+from django.http import QueryDict
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from apps.locations.models import District, Location
+from .filters import CatalogFilter
+from .map_clusters import MARKER_MIN_ZOOM, cluster_points
+from .map_payload import MARKER_COLUMNS, _thumbnail_url, build_marker_payload
+from .models import Property, PropertyImage, PropertyType
+from .pagination import InvalidCursor, KeysetPaginator
+
+
+def create_property(index, property_type, district, **fields):
+    values = {
+        'title': f'Объект {index}',
+        'slug': f'object-{index}',
+        'property_type': property_type,
+        'district': district,
+        # По умолчанию contact_person=1 — сотрудника в тестовой БД нет
+        'contact_person': None,
+    }
+    values.update(fields)
+    return Property.objects.create(**values)
+
+
+class CatalogFilterKeyTests(SimpleTestCase):
+    """Канонизация параметров: эквивалентные запросы дают один ключ кэша"""
+
+    def test_equivalent_queries_share_cache_key(self):
+        first = CatalogFilter.from_querydict(QueryDict(
+            'type=villa&property_type=condo&bedrooms=2&bedrooms=4%2B'
+            '&amenities=3&amenities=1&min_price=100&q=++sea+++view+'
+        ))
+        second = CatalogFilter.from_querydict(QueryDict(
+            'bedrooms=4%2B&bedrooms=02&property_type=villa&type=condo&type=villa'
+            '&amenities=1&amenities=3&min_price=100.0&q=sea+view'
+        ))
+
+        self.assertEqual(first, second)
+        self.assertEqual(first.canonical, second.canonical)
+        self.assertEqual(first.cache_key(), second.cache_key())
+        self.assertEqual(first.property_types, ('condo', 'villa'))
+        self.assertEqual(first.bedrooms, ('2', '4+'))
+        self.assertEqual(first.amenities, (1, 3))
+        self.assertEqual(first.query, 'sea view')
+
+    def test_currency_only_matters_with_price(self):
+        usd = CatalogFilter.from_querydict({'deal_type': 'sale'}, 'USD')
+        rub = CatalogFilter.from_querydict({'deal_type': 'sale'}, 'RUB')
+        self.assertEqual(usd.cache_key(), rub.cache_key())
+
+        usd = CatalogFilter.from_querydict({'deal_type': 'sale', 'min_price': '100'}, 'USD')
+        rub = CatalogFilter.from_querydict({'deal_type': 'sale', 'min_price': '100'}, 'RUB')
+        self.assertNotEqual(usd.cache_key(), rub.cache_key())
+
+    def test_invalid_values_are_dropped(self):
+        catalog_filter = CatalogFilter.from_querydict({
+            'deal_type': 'lease',
+            'build_status': 'unknown',
+            'bedrooms': 'many',
+            'amenities': 'pool',
+            'bbox': '100,10,99,11',
+            'min_price': 'abc',
+        })
+        self.assertTrue(catalog_filter.is_empty)
+        self.assertEqual(catalog_filter.cache_key(), CatalogFilter().cache_key())
+
+    def test_location_id_and_scope(self):
+        catalog_filter = CatalogFilter.from_querydict({'location': '7', 'deal_type': 'rent'}, deal_type='sale')
+        self.assertEqual(catalog_filter.location_id, 7)
+        self.assertEqual(catalog_filter.location, '')
+        self.assertEqual(catalog_filter.deal_type, 'sale')
+
+
+class CatalogFilterConditionTests(TestCase):
+    """Условие фильтра по таблице поисковых документов"""
+
+    @classmethod
+    def setUpTestData(cls):
+        villa = PropertyType.objects.create(name='villa', name_display='Вилла')
+        condo = PropertyType.objects.create(name='condo', name_display='Кондоминиум')
+        rawai = District.objects.create(name='Rawai', slug='rawai')
+        patong = District.objects.create(name='Patong', slug='patong')
+        cls.nai_harn = Location.objects.create(name='Nai Harn', slug='nai-harn', district=rawai)
+
+        cls.sale_villa = create_property(
+            1, villa, rawai, location=cls.nai_harn, deal_type='sale', bedrooms=4,
+            price_sale_usd=Decimal('500000'),
+        )
+        cls.sale_condo = create_property(
+            2, condo, patong, deal_type='sale', bedrooms=1, price_sale_usd=Decimal('90000'),
+        )
+        cls.rent_condo = create_property(
+            3, condo, patong, deal_type='rent', bedrooms=2, price_rent_monthly=Decimal('1200'),
+        )
+        cls.both_villa = create_property(
+            4, villa, rawai, deal_type='both', bedrooms=5,
+            price_sale_usd=Decimal('800000'), price_rent_monthly=Decimal('6000'),
+        )
+        cls.inactive = create_property(5, villa, rawai, deal_type='sale', bedrooms=4, is_active=False)
+
+    def filtered(self, **params):
+        catalog_filter = CatalogFilter.from_querydict(params)
+        return set(catalog_filter.apply(Property.objects.all()).values_list('pk', flat=True))
+
+    def test_empty_filter_matches_published_properties(self):
+        self.assertEqual(
+            self.filtered(),
+            {self.sale_villa.pk, self.sale_condo.pk, self.rent_condo.pk, self.both_villa.pk},
+        )
+
+    def test_deal_type_includes_both(self):
+        self.assertEqual(self.filtered(deal_type='sale'), {self.sale_villa.pk, self.sale_condo.pk, self.both_villa.pk})
+        self.assertEqual(self.filtered(deal_type='rent'), {self.rent_condo.pk, self.both_villa.pk})
+
+    def test_bedrooms_four_plus(self):
+        self.assertEqual(self.filtered(bedrooms=['1', '4+']), {self.sale_villa.pk, self.sale_condo.pk, self.both_villa.pk})
+
+    def test_type_district_and_location(self):
+        self.assertEqual(self.filtered(type='condo'), {self.sale_condo.pk, self.rent_condo.pk})
+        self.assertEqual(self.filtered(district='rawai'), {self.sale_villa.pk, self.both_villa.pk})
+        self.assertEqual(self.filtered(location='nai-harn'), {self.sale_villa.pk})
+        self.assertEqual(self.filtered(location=str(self.nai_harn.pk)), {self.sale_villa.pk})
+
+    def test_price_bounds_cover_sale_and_rent_columns(self):
+        self.assertEqual(self.filtered(min_price='100000'), {self.sale_villa.pk, self.both_villa.pk})
+        self.assertEqual(self.filtered(max_price='1500'), {self.rent_condo.pk})
+
+    def test_query_without_terms_matches_nothing(self):
+        self.assertEqual(self.filtered(q='!!!'), set())
+
+
+class KeysetPaginatorTests(TestCase):
+    """Проход по курсорам совпадает с проходом по OFFSET"""
+
+    @classmethod
+    def setUpTestData(cls):
+        villa = PropertyType.objects.create(name='villa', name_display='Вилла')
+        district = District.objects.create(name='Rawai', slug='rawai')
+        created_at = timezone.now()
+        for index in range(1, 24):
+            property_obj = create_property(
+                index, villa, district,
+                featured_priority=index % 3,
+                bedrooms=None if index % 4 == 0 else index % 5,
+            )
+            # Одинаковые даты у соседних объектов: порядок решает уникальный id
+            Property.objects.filter(pk=property_obj.pk).update(
+                created_at=created_at - datetime.timedelta(minutes=index // 2)
+            )
+
+    def offset_walk(self, paginator, per_page):
+        queryset = paginator.queryset.order_by(*paginator._ordering())
+        offset_paginator = Paginator(queryset, per_page)
+        return [
+            [obj.pk for obj in offset_paginator.page(number).object_list]
+            for number in offset_paginator.page_range
+        ]
+
+    def keyset_walk(self, paginator):
+        pages = []
+        page = paginator.page()
+        while True:
+            pages.append([obj.pk for obj in page])
+            if not page.has_next():
+                return pages, page
+            page = paginator.page(page.next_cursor)
+
+    def test_forward_walk_equals_offset_walk(self):
+        for ordering in (
+            ['-featured_priority', '-created_at', '-id'],
+            ['created_at', 'id'],
+            ['bedrooms', '-id'],
+        ):
+            with self.subTest(ordering=ordering):
+                paginator = KeysetPaginator(Property.objects.all(), ordering, per_page=5)
+                pages, _last = self.keyset_walk(paginator)
+                self.assertEqual(pages, self.offset_walk(paginator, 5))
+                self.assertEqual(sum(len(page) for page in pages), Property.objects.count())
+
+    def test_backward_walk_returns_same_pages(self):
+        paginator = KeysetPaginator(Property.objects.all(), ['-featured_priority', '-created_at', '-id'], per_page=5)
+        pages, page = self.keyset_walk(paginator)
+
+        backward = [[obj.pk for obj in page]]
+        while page.has_previous():
+            page = paginator.page(page.previous_cursor)
+            backward.append([obj.pk for obj in page])
+        self.assertEqual(list(reversed(backward)), pages)
+
+    def test_cursor_round_trip(self):
+        paginator = KeysetPaginator(Property.objects.all(), ['-created_at', '-id'], per_page=5)
+        obj = Property.objects.order_by('-created_at', '-id').first()
+
+        direction, values = paginator.decode_cursor(paginator.encode_cursor(obj, 'next'))
+        self.assertEqual(direction, 'next')
+        self.assertEqual(values, [obj.created_at, obj.id])
+
+    def test_foreign_or_broken_cursor_is_rejected(self):
+        paginator = KeysetPaginator(Property.objects.all(), ['-created_at', '-id'], per_page=5)
+        other = KeysetPaginator(Property.objects.all(), ['created_at', 'id'], per_page=5)
+        cursor = other.encode_cursor(Property.objects.first(), 'next')
+
+        for bad_cursor in (cursor, 'not-a-cursor', '', '!!!'):
+            with self.subTest(cursor=bad_cursor):
+                with self.assertRaises(InvalidCursor):
+                    paginator.decode_cursor(bad_cursor)
+
+
+class MarkerPayloadTests(TestCase):
+    """Колоночный ответ маркеров карты"""
+
+    @classmethod
+    def setUpTestData(cls):
+        villa = PropertyType.objects.create(name='villa', name_display='Вилла')
+        condo = PropertyType.objects.create(name='condo', name_display='Кондоминиум')
+        district = District.objects.create(name='Rawai', slug='rawai')
+        coordinates = dict(latitude=Decimal('7.78'), longitude=Decimal('98.32'))
+        create_property(1, villa, district, deal_type='sale', price_sale_usd=Decimal('500000'), **coordinates)
+        create_property(2, condo, district, deal_type='rent', price_rent_monthly=Decimal('1500'), **coordinates)
+        create_property(3, villa, district, deal_type='sale', **coordinates)
+        # Без координат на карту не попадает
+        create_property(4, villa, district, deal_type='sale')
+
+    def test_columns_are_parallel_and_deduplicated(self):
+        payload = build_marker_payload(CatalogFilter(), 'ru')
+        columns = payload['columns']
+
+        self.assertEqual(payload['format'], 'columns')
+        self.assertEqual(tuple(columns), MARKER_COLUMNS)
+        self.assertEqual(payload['total_count'], 3)
+        self.assertEqual({len(values) for values in columns.values()}, {3})
+        self.assertEqual(sorted(item['name'] for item in payload['types']), ['condo', 'villa'])
+        self.assertEqual(payload['locations'], ['Rawai'])
+        self.assertTrue(all(index < len(payload['types']) for index in columns['type']))
+
+        prices = dict(zip(columns['slug'], columns['price']))
+        self.assertEqual(prices, {'object-1': 500000.0, 'object-2': 1500.0, 'object-3': None})
+
+
+class MarkerThumbnailTests(SimpleTestCase):
+    def test_thumbnail_from_registry_or_original(self):
+        renditions = {'source': 'properties/a.webp', 'thumbnail': {'name': 'CACHE/a-thumb.jpg'}}
+
+        self.assertEqual(_thumbnail_url('', renditions), '')
+        self.assertTrue(_thumbnail_url('properties/a.webp', renditions).endswith('CACHE/a-thumb.jpg'))
+        # Реестр построен для другого файла — отдаётся оригинал
+        self.assertTrue(_thumbnail_url('properties/b.webp', renditions).endswith('properties/b.webp'))
+        self.assertTrue(_thumbnail_url('properties/b.webp', None).endswith('properties/b.webp'))
+
+
+class ClusterPointsTests(SimpleTestCase):
+    def arrays(self):
+        return {
+            'ids': np.array([1, 2, 3, 4], dtype=np.int64),
+            'lat': np.array([7.8000, 7.8001, 7.8002, 13.75]),
+            'lng': np.array([98.3000, 98.3001, 98.3002, 100.50]),
+            'price': np.array([300.0, np.nan, 100.0, 50.0]),
+        }
+
+    def test_nearby_points_form_one_cluster(self):
+        clusters, marker_ids = cluster_points(self.arrays(), 8)
+
+        self.assertEqual(clusters['count'], [3])
+        self.assertEqual(clusters['min_price'], [100.0])
+        self.assertAlmostEqual(clusters['lat'][0], 7.8001, places=6)
+        self.assertAlmostEqual(clusters['lng'][0], 98.3001, places=6)
+        self.assertEqual(marker_ids, [4])
+
+    def test_every_point_is_counted_once(self):
+        arrays = self.arrays()
+        for zoom in range(0, MARKER_MIN_ZOOM + 1):
+            with self.subTest(zoom=zoom):
+                clusters, marker_ids = cluster_points(arrays, zoom)
+                self.assertEqual(sum(clusters['count']) + len(marker_ids), len(arrays['ids']))
+
+    def test_high_zoom_returns_markers(self):
+        clusters, marker_ids = cluster_points(self.arrays(), MARKER_MIN_ZOOM)
+        self.assertEqual(clusters['count'], [])
+        self.assertEqual(marker_ids, [1, 2, 3, 4])
+
+
+class RenditionLookupTests(SimpleTestCase):
+    """URL вариантов — чтение реестра без ImageKit и хранилища"""
+
+    def setUp(self):
+        patcher = mock.patch(
+            'imagekit.cachefiles.ImageCacheFile.generate',
+            side_effect=AssertionError('URL варианта не должен генерировать файл'),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_registry_rendition_is_used(self):
+        image = PropertyImage(image='properties/a.webp', renditions={
+            'source': 'properties/a.webp',
+            'thumbnail': {'name': 'CACHE/a-thumb.jpg', 'width': 300, 'height': 200},
+            'medium': {'name': 'CACHE/a-medium.jpg', 'width': 800, 'height': 533},
+            'responsive': [],
+        })
+        self.assertTrue(image.thumbnail_url.endswith('CACHE/a-thumb.jpg'))
+        self.assertTrue(image.medium_url.endswith('CACHE/a-medium.jpg'))
+        self.assertEqual(image.rendition_size('thumbnail'), (300, 200))
+        self.assertFalse(image.renditions_outdated)
+
+    def test_missing_or_stale_rendition_falls_back_to_original(self):
+        stale = PropertyImage(image='properties/new.webp', renditions={
+            'source': 'properties/old.webp',
+            'thumbnail': {'name': 'CACHE/old-thumb.jpg', 'width': 300, 'height': 200},
+        })
+        partial = PropertyImage(image='properties/a.webp', renditions={
+            'source': 'properties/a.webp',
+            'thumbnail': {'name': 'CACHE/a-thumb.jpg', 'width': 300, 'height': 200},
+            'responsive': [{'name': 'r/a-640w.webp', 'width': 640, 'height': 480, 'format': 'webp'}],
+        })
+
+        self.assertTrue(stale.thumbnail_url.endswith('properties/new.webp'))
+        self.assertTrue(stale.renditions_outdated)
+        self.assertTrue(partial.medium_url.endswith('properties/a.webp'))
+        # В src оригинал — размеры по пропорциям несжатых вариантов
+        self.assertEqual(partial.rendition_size('medium'), (640, 480))
+        self.assertTrue(partial.renditions_outdated)
+
+    def test_no_image(self):
+        image = PropertyImage()
+        self.assertEqual(image.thumbnail_url, '')
+        self.assertEqual(image.medium_url, '')
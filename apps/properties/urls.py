@@ -10,11 +10,13 @@ urlpatterns = [
     path('favorites/', views.favorites_view, name='property_favorites'),
     path('ajax/list/', views.property_list_ajax, name='property_list_ajax'),
     path('ajax/map/', views.map_properties_json, name='map_properties_json'),
+    path('ajax/map/clusters/', views.map_clusters_json, name='map_clusters_json'),
     path('ajax/locations/', views.get_locations_for_district, name='get_locations_for_district'),
     path('ajax/favorite/', views.toggle_favorite, name='toggle_favorite'),
     path('ajax/favorites/', views.get_favorite_properties, name='get_favorite_properties'),
     path('ajax/inquiry/<int:property_id>/', views.property_inquiry, name='property_inquiry'),
     path('ajax/search-count/', views.ajax_search_count, name='ajax_search_count'),
+    path('ajax/facets/', views.ajax_facets, name='ajax_facets'),
     path('ajax/bulk-upload-images/', views.bulk_upload_images, name='bulk_upload_images'),
     path('ajax/update-image-order/', views.update_image_order, name='update_image_order'),
     path('<slug:slug>/', views.PropertyDetailView.as_view(), name='property_detail'),
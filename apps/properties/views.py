@@ -1,25 +1,43 @@
-from decimal import Decimal, InvalidOperation
+import gzip
+import json
+import logging
 
 from django.views.generic import ListView, DetailView, View
 from django.shortcuts import get_object_or_404, render, redirect
-from django.http import JsonResponse, Http404, HttpResponseRedirect, HttpResponse
+from django.http import (
+    JsonResponse, Http404, HttpResponseRedirect, HttpResponse, HttpResponseNotModified, StreamingHttpResponse,
+)
 # login_required decorator removed
 from django.views.decorators.http import require_POST, require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib import messages
-from django.db.models import Q, Count, Case, When, Value, IntegerField
-from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Count, Case, Max, Q, When, Value, IntegerField
 from django.urls import reverse
-from django.utils.translation import gettext, ngettext
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from django.utils.translation import gettext, ngettext, get_language
+from PIL import Image
 
 from apps.currency.services import CurrencyService
+from apps.core import search
 from apps.core.utils import build_query_string, rate_limit, validate_form_security
 from apps.core.models import SEOContentBlock
+from apps.core.request_cache import publish
+from apps.core.view_counters import record_view
+from .facets import get_facets
+from .filters import CatalogFilter, parse_bbox, scale_bbox
+from .inventory import CachedCountPaginator, cached_count, cached_reference_data
+from . import map_clusters
+from .map_payload import build_marker_payload, cached_marker_payload
+from .pagination import InvalidCursor, KeysetPaginator
 from .models import Property, PropertyType
 from apps.locations.models import District, Location
 from apps.users.models import PropertyInquiry
 from .yml_feed import YandexYmlFeedGenerator
 
+logger = logging.getLogger(__name__)
+
 
 class DealTypeRedirectMixin:
     """Перенаправляет на корректный раздел каталога при смене типа сделки."""
@@ -113,7 +131,7 @@ class PropertyListView(ListView):
         queryset = Property.objects.filter(
             is_active=True,
             status='available'
-        ).select_related('district', 'property_type').prefetch_related('images')
+        ).select_related('district', 'property_type', 'main_image').prefetch_related('images')
         
         # Применяем фильтры из GET параметров
         queryset = self.apply_filters(queryset)
@@ -129,8 +147,15 @@ class PropertyListView(ListView):
             'created_at', '-created_at'
         ]
         ordering = []
+        query = self.request.GET.get('q')
 
-        if not sort_param and not self.has_active_filters():
+        if query and not sort_param:
+            # Релевантность полнотекстового поиска, затем приоритет размещения
+            queryset = queryset.annotate(
+                search_rank=search.search_rank(query, get_language(), prefix='search_document__')
+            )
+            ordering.extend(['-search_rank', '-featured_priority'])
+        elif not sort_param and not self.has_active_filters():
             ordering.extend(['-featured_priority', '-is_featured'])
 
         if sort_by in allowed_sorts:
@@ -142,98 +167,25 @@ class PropertyListView(ListView):
 
         return queryset
 
+    def get_filter_scope(self):
+        """Ограничения страницы, которые добавляются к фильтрам из GET параметров"""
+        return {}
+
+    def get_catalog_filter(self):
+        if not hasattr(self, '_catalog_filter'):
+            self._catalog_filter = CatalogFilter.from_request(self.request, **self.get_filter_scope())
+        return self._catalog_filter
+
     def apply_filters(self, queryset):
         """Применяет фильтры на основе GET параметров"""
-        # Тип сделки (deal_type)
-        deal_type = self.request.GET.get('deal_type')
-        if deal_type and deal_type in ['sale', 'rent']:
-            queryset = queryset.filter(deal_type__in=[deal_type, 'both'])
-        
-        # Тип недвижимости (множественный выбор)
-        property_types = self.request.GET.getlist('property_type')
-        if property_types:
-            queryset = queryset.filter(property_type__name__in=property_types)
-
-        # Стадия готовности
-        build_status = self.request.GET.get('build_status')
-        valid_statuses = dict(Property.BUILD_STATUS_CHOICES)
-        if build_status and build_status in valid_statuses:
-            queryset = queryset.filter(build_status=build_status)
-
-        # Район
-        district = self.request.GET.get('district')
-        if district:
-            queryset = queryset.filter(district__slug=district)
-        
-        # Локация
-        location = self.request.GET.get('location')
-        if location:
-            queryset = queryset.filter(location__slug=location)
-        
-        currency_code = CurrencyService.get_selected_currency_code(self.request)
-        sale_field, rent_field = CurrencyService.get_price_field_names(currency_code)
+        return self.get_catalog_filter().apply(queryset)
 
-        min_price = self.request.GET.get('min_price')
-        max_price = self.request.GET.get('max_price')
-
-        if min_price:
-            try:
-                min_val = Decimal(min_price)
-                price_filter = Q(**{f"{sale_field}__gte": min_val})
-                if rent_field:
-                    price_filter |= Q(**{f"{rent_field}__gte": min_val})
-                queryset = queryset.filter(price_filter)
-            except (InvalidOperation, ValueError):
-                pass
-
-        if max_price:
-            try:
-                max_val = Decimal(max_price)
-                price_filter = Q(**{f"{sale_field}__lte": max_val})
-                if rent_field:
-                    price_filter |= Q(**{f"{rent_field}__lte": max_val})
-                queryset = queryset.filter(price_filter)
-            except (InvalidOperation, ValueError):
-                pass
-        
-        # Количество спален
-        bedrooms = self.request.GET.getlist('bedrooms')
-        if bedrooms:
-            bedroom_filters = Q()
-            for bedroom in bedrooms:
-                if bedroom == '4+':
-                    bedroom_filters |= Q(bedrooms__gte=4)
-                else:
-                    try:
-                        bedroom_filters |= Q(bedrooms=int(bedroom))
-                    except ValueError:
-                        pass
-            if bedroom_filters:
-                queryset = queryset.filter(bedroom_filters)
-        
-        # Удобства/особенности (динамические)
-        amenities = self.request.GET.getlist('amenities')
-        if amenities:
-            for amenity_id in amenities:
-                try:
-                    amenity_id = int(amenity_id)
-                    queryset = queryset.filter(features__feature__id=amenity_id)
-                except ValueError:
-                    pass
-        
-        # Поиск по тексту
-        query = self.request.GET.get('q')
-        if query:
-            queryset = queryset.filter(
-                Q(title_ru__icontains=query) |
-                Q(title_en__icontains=query) |
-                Q(description_ru__icontains=query) |
-                Q(description_en__icontains=query) |
-                Q(district__name_ru__icontains=query) |
-                Q(district__name_en__icontains=query)
-            )
-        
-        return queryset.distinct()
+    def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+        """Количество результатов берём из кэша счётчиков, а не отдельным COUNT(*)"""
+        return CachedCountPaginator(
+            queryset, per_page, count=cached_count(self.get_catalog_filter()),
+            orphans=orphans, allow_empty_first_page=allow_empty_first_page, **kwargs
+        )
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -253,7 +205,8 @@ class PropertyListView(ListView):
 
         return context
 
-    def build_filter_context(self):
+    def build_filter_reference_data(self):
+        """Справочники боковой панели, общие для всех запросов (кэшируются)"""
         from .models import PropertyFeature
 
         priority_case = Case(
@@ -270,18 +223,29 @@ class PropertyListView(ListView):
             .annotate(_type_priority=priority_case)
             .order_by('_type_priority', 'name_display')
         )
-        districts = District.objects.all()
-
-        selected_district = self.request.GET.get('district')
-        if selected_district:
-            locations = Location.objects.filter(district__slug=selected_district)
-        else:
-            locations = Location.objects.all()
 
         amenities = PropertyFeature.objects.annotate(
             property_count=Count('propertyfeaturerelation')
         ).filter(property_count__gte=1).order_by('-property_count')[:12]
 
+        return {
+            'property_types': list(property_types),
+            'districts': list(District.objects.all()),
+            'locations': list(Location.objects.all()),
+            'amenities': list(amenities),
+        }
+
+    def build_filter_context(self):
+        reference = cached_reference_data('filter-sidebar', self.build_filter_reference_data)
+
+        locations = reference['locations']
+        selected_district = self.request.GET.get('district')
+        if selected_district:
+            district_ids = {
+                district.pk for district in reference['districts'] if district.slug == selected_district
+            }
+            locations = [location for location in locations if location.district_id in district_ids]
+
         current_filters = {
             'deal_type': self.request.GET.get('deal_type', ''),
             'property_type': self.request.GET.getlist('property_type'),
@@ -297,10 +261,10 @@ class PropertyListView(ListView):
         }
 
         filter_context = {
-            'property_types': property_types,
-            'districts': districts,
+            'property_types': reference['property_types'],
+            'districts': reference['districts'],
             'locations': locations,
-            'amenities': amenities,
+            'amenities': reference['amenities'],
             'current_filters': current_filters,
             'build_status_choices': Property.BUILD_STATUS_CHOICES,
         }
@@ -457,8 +421,11 @@ class PropertySaleView(DealTypeRedirectMixin, PropertyListView):
         '': 'properties:property_list',
     }
 
+    def get_filter_scope(self):
+        return {'deal_type': 'sale'}
+
     def get_queryset(self):
-        queryset = super().get_queryset().filter(deal_type__in=['sale', 'both'])
+        queryset = super().get_queryset()
 
         sort_by = self.request.GET.get('sort')
         if sort_by in (None, '', '-created_at'):
@@ -471,7 +438,10 @@ class PropertySaleView(DealTypeRedirectMixin, PropertyListView):
                 output_field=IntegerField(),
             )
             ordering = []
-            if not self.has_active_filters():
+            if self.request.GET.get('q') and not sort_by:
+                # Релевантность поиска (аннотация из PropertyListView) остаётся первым ключом
+                ordering.extend(['-search_rank', '-featured_priority'])
+            elif not self.has_active_filters():
                 ordering.extend(['-featured_priority', '-is_featured'])
             ordering.extend(['_type_priority', '-created_at'])
 
@@ -496,8 +466,8 @@ class PropertyRentView(DealTypeRedirectMixin, PropertyListView):
         '': 'properties:property_list',
     }
 
-    def get_queryset(self):
-        return super().get_queryset().filter(deal_type__in=['rent', 'both'])
+    def get_filter_scope(self):
+        return {'deal_type': 'rent'}
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -568,7 +538,10 @@ class PropertyByTypeView(PropertyListView):
         except PropertyType.DoesNotExist:
             raise Http404(f"Property type '{type_name}' not found")
         
-        return super().get_queryset().filter(property_type=self.property_type)
+        return super().get_queryset()
+
+    def get_filter_scope(self):
+        return {'property_types': [self.kwargs['type_name']]}
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -588,8 +561,8 @@ class PropertyDetailView(DetailView):
     def get_queryset(self):
         # Возвращаем ВСЕ объекты, не фильтруем по is_active здесь
         return Property.objects.select_related(
-            'district', 'location', 'property_type', 'developer'
-        ).prefetch_related('images', 'features__feature')
+            'district', 'location', 'property_type', 'developer', 'main_image'
+        ).prefetch_related('images', 'features__feature', 'seo_metadata')
 
     def get_object(self):
         try:
@@ -598,11 +571,12 @@ class PropertyDetailView(DetailView):
             # Если объект не найден вообще, возвращаем 404
             raise Http404("Недвижимость не найдена")
         
-        # Увеличиваем счетчик просмотров только для активных объектов
+        # Учитываем просмотр только для активных объектов (буфер просмотров, без записи в БД)
         if obj.is_active:
-            obj.views_count += 1
-            obj.save(update_fields=['views_count'])
-        
+            record_view(obj)
+
+        # Объект уже загружен с select_related — отдаём его seo_context и другим участникам запроса
+        publish(self.request, ('property', obj.slug), obj)
         return obj
     
     def handle_inactive_property(self, property_obj):
@@ -682,6 +656,24 @@ class PropertyDetailView(DetailView):
         return context
     
     def get_similar_properties(self):
+        """
+        Похожие объекты из предрассчитанной таблицы PropertySimilar (один запрос);
+        для объектов, которых ещё нет в таблице, — подбор по локации и типу
+        """
+        similar_properties = list(
+            Property.objects.filter(
+                similar_of__property=self.object,
+                is_active=True,
+                status='available',
+            ).select_related(
+                'district', 'location', 'property_type', 'main_image'
+            ).prefetch_related('images').order_by('similar_of__rank')[:4]
+        )
+        if similar_properties:
+            return similar_properties
+        return self.get_fallback_similar_properties()
+
+    def get_fallback_similar_properties(self):
         """
         Получает похожие объекты с приоритетом по локации и типу недвижимости
         Приоритет:
@@ -703,7 +695,7 @@ class PropertyDetailView(DetailView):
                 location=self.object.location,
                 **base_filter
             ).exclude(id=self.object.id).select_related(
-                'district', 'location', 'property_type'
+                'district', 'location', 'property_type', 'main_image'
             ).prefetch_related('images')[:2]
             
             similar_properties.extend(same_location)
@@ -722,7 +714,7 @@ class PropertyDetailView(DetailView):
                 )
             
             same_district = same_district.select_related(
-                'district', 'location', 'property_type'
+                'district', 'location', 'property_type', 'main_image'
             ).prefetch_related('images')[:(4 - len(similar_properties))]
             
             similar_properties.extend(same_district)
@@ -740,7 +732,7 @@ class PropertyDetailView(DetailView):
                 )
             
             same_type = same_type.select_related(
-                'district', 'location', 'property_type'
+                'district', 'location', 'property_type', 'main_image'
             ).prefetch_related('images')[:(4 - len(similar_properties))]
             
             similar_properties.extend(same_type)
@@ -778,8 +770,8 @@ def get_favorite_properties(request):
         
         # Получаем объекты
         properties = Property.objects.filter(id__in=ids).select_related(
-            'district', 'property_type'
-        ).prefetch_related('images')
+            'district', 'property_type', 'main_image'
+        )
         
         # Получаем выбранную валюту из сессии
         selected_currency_code = request.session.get('currency')
@@ -793,17 +785,10 @@ def get_favorite_properties(request):
         if not user_currency:
             user_currency = CurrencyService.get_currency_by_code('USD')
 
-        # Формируем данные для ответа
-        properties_data = []
+        # Исходная цена и валюта каждого объекта
+        properties = list(properties)
+        sources = []
         for prop in properties:
-            main_image_url = ''
-            if prop.main_image:
-                main_image_url = prop.main_image.thumbnail_url
-
-            # Формируем цену для отображения с учетом выбранной валюты
-            price_display = 'Цена по запросу'
-
-            # Определяем исходную цену и валюту
             source_price = None
             source_currency = None
 
@@ -830,23 +815,31 @@ def get_favorite_properties(request):
                     source_price = float(prop.price_sale_rub)
                     source_currency = 'RUB'
 
-            # Конвертируем цену в выбранную валюту пользователя
-            converted_price = None
+            sources.append((source_price, source_currency or user_currency.code, user_currency.code))
+
+        # Конвертируем все цены в выбранную валюту пользователя одним пакетом
+        converted_prices = CurrencyService.convert_many(sources)
+
+        # Формируем данные для ответа
+        properties_data = []
+        for prop, converted_price in zip(properties, converted_prices):
+            main_image_url = ''
+            if prop.main_image:
+                main_image_url = prop.main_image.thumbnail_url
+
+            # Формируем цену для отображения с учетом выбранной валюты
+            price_display = 'Цена по запросу'
             price_per_sqm = None
 
-            if source_price and source_currency:
-                converted_price = CurrencyService.convert_price(
-                    source_price, source_currency, user_currency.code
-                )
-                if converted_price:
-                    if prop.deal_type == 'rent':
-                        price_display = f'{user_currency.symbol}{converted_price:,.0f}/мес'
-                    else:
-                        price_display = f'{user_currency.symbol}{converted_price:,.0f}'
+            if converted_price:
+                if prop.deal_type == 'rent':
+                    price_display = f'{user_currency.symbol}{converted_price:,.0f}/мес'
+                else:
+                    price_display = f'{user_currency.symbol}{converted_price:,.0f}'
 
-                    # Вычисляем цену за квадратный метр (только для продажи)
-                    if prop.deal_type in ['sale', 'both'] and prop.area_total and prop.area_total > 0:
-                        price_per_sqm = converted_price / float(prop.area_total)
+                # Вычисляем цену за квадратный метр (только для продажи)
+                if prop.deal_type in ['sale', 'both'] and prop.area_total and prop.area_total > 0:
+                    price_per_sqm = converted_price / float(prop.area_total)
 
             properties_data.append({
                 'id': prop.id,
@@ -939,50 +932,100 @@ def property_inquiry(request, property_id):
     })
 
 
+CATALOG_ALLOWED_SORTS = (
+    'price_sale_usd', '-price_sale_usd',
+    'price_sale_thb', '-price_sale_thb',
+    'price_rent_monthly', '-price_rent_monthly',
+    'area_total', '-area_total',
+    'created_at', '-created_at',
+)
+
+
+def build_catalog_ordering(queryset, catalog_filter, sort_param):
+    """Сортировка каталога как на страницах списка; последнее поле — уникальный id"""
+    ordering = []
+    if not sort_param and catalog_filter.is_empty:
+        ordering.extend(['-featured_priority', '-is_featured'])
+
+    if catalog_filter.deal_type == 'sale' and sort_param in (None, '', '-created_at'):
+        queryset = queryset.annotate(_type_priority=Case(
+            *[
+                When(property_type__name=property_type, then=Value(index))
+                for index, property_type in enumerate(PropertyListView.PROPERTY_TYPE_PRIORITY)
+            ],
+            default=Value(len(PropertyListView.PROPERTY_TYPE_PRIORITY)),
+            output_field=IntegerField(),
+        ))
+        ordering.extend(['_type_priority', '-created_at'])
+    elif sort_param in CATALOG_ALLOWED_SORTS:
+        ordering.append(sort_param)
+    else:
+        ordering.append('-created_at')
+
+    ordering.append('-id')
+    return queryset, ordering
+
+
 def property_list_ajax(request):
-    """AJAX endpoint для фильтрации списка недвижимости"""
-    # Создаем временный объект view для использования метода apply_filters
-    view = PropertyListView()
-    view.request = request
-    
+    """AJAX endpoint для фильтрации списка недвижимости
+
+    По умолчанию — нумерованные страницы (?page=N). Для бесконечной прокрутки
+    передайте ?pagination=cursor, затем ?cursor=<next_cursor|previous_cursor>:
+    страницы выбираются по ключу сортировки без OFFSET. Общее количество в обоих
+    режимах берётся из кэша счётчиков (см. ``inventory.cached_count``).
+    """
     # Получаем базовый queryset
     queryset = Property.objects.filter(
         is_active=True,
         status='available'
-    ).select_related('district', 'property_type').prefetch_related('images')
+    ).select_related('district', 'property_type', 'main_image')
     
     # Применяем фильтры
-    queryset = view.apply_filters(queryset)
+    catalog_filter = CatalogFilter.from_request(request)
+    queryset = catalog_filter.apply(queryset)
     
     # Сортировка
-    sort_by = request.GET.get('sort', '-created_at')
-    allowed_sorts = [
-        'price_sale_usd', '-price_sale_usd', 
-        'price_sale_thb', '-price_sale_thb',
-        'price_rent_monthly', '-price_rent_monthly',
-        'area_total', '-area_total',
-        'created_at', '-created_at'
-    ]
-    if sort_by in allowed_sorts:
-        queryset = queryset.order_by(sort_by)
+    queryset, ordering = build_catalog_ordering(queryset, catalog_filter, request.GET.get('sort'))
+
+    cursor = request.GET.get('cursor')
+    if cursor is not None or request.GET.get('pagination') == 'cursor':
+        paginator = KeysetPaginator(queryset, ordering, per_page=12)
+        try:
+            properties = paginator.page(cursor)
+        except InvalidCursor:
+            properties = paginator.page()
+
+        pagination = {
+            'mode': 'cursor',
+            'has_previous': properties.has_previous(),
+            'has_next': properties.has_next(),
+            'previous_cursor': properties.previous_cursor,
+            'next_cursor': properties.next_cursor,
+            'total_count': cached_count(catalog_filter),
+        }
     else:
-        queryset = queryset.order_by('-created_at')
-    
-    # Пагинация
-    page = request.GET.get('page', 1)
-    paginator = Paginator(queryset, 12)
-    try:
-        properties = paginator.page(page)
-    except:
-        properties = paginator.page(1)
+        # Пагинация
+        page = request.GET.get('page', 1)
+        paginator = CachedCountPaginator(queryset.order_by(*ordering), 12, count=cached_count(catalog_filter))
+        try:
+            properties = paginator.page(page)
+        except:
+            properties = paginator.page(1)
+
+        pagination = {
+            'current_page': properties.number,
+            'total_pages': paginator.num_pages,
+            'has_previous': properties.has_previous(),
+            'has_next': properties.has_next(),
+            'previous_page': properties.previous_page_number() if properties.has_previous() else None,
+            'next_page': properties.next_page_number() if properties.has_next() else None,
+            'total_count': paginator.count,
+        }
     
     # Подготавливаем данные для JSON ответа
     properties_data = []
     for property_obj in properties:
-        # Получаем главное изображение
-        main_image = property_obj.images.filter(is_main=True).first()
-        if not main_image:
-            main_image = property_obj.images.first()
+        main_image = property_obj.main_image
         
         # Определяем цену для отображения в зависимости от типа сделки
         if property_obj.deal_type == 'rent' and property_obj.price_rent_monthly:
@@ -1012,15 +1055,7 @@ def property_list_ajax(request):
     return JsonResponse({
         'success': True,
         'properties': properties_data,
-        'pagination': {
-            'current_page': properties.number,
-            'total_pages': paginator.num_pages,
-            'has_previous': properties.has_previous(),
-            'has_next': properties.has_next(),
-            'previous_page': properties.previous_page_number() if properties.has_previous() else None,
-            'next_page': properties.next_page_number() if properties.has_next() else None,
-            'total_count': paginator.count,
-        }
+        'pagination': pagination,
     })
 
 
@@ -1042,80 +1077,79 @@ def get_locations_for_district(request):
 
 
 def map_properties_json(request):
-    """Optimized AJAX endpoint для получения всех отфильтрованных объектов для карты"""
+    """AJAX endpoint маркеров карты: колоночный JSON, сжатый gzip, с ETag"""
     try:
-        # Создаем временный объект view для использования фильтров
-        view = PropertyListView()
-        view.request = request
-        
-        # Получаем базовый queryset с минимальными данными для карты
-        queryset = Property.objects.filter(
-            is_active=True,
-            status='available'
-        ).select_related('district', 'location', 'property_type', 'agent').prefetch_related('images')
-        
-        # Применяем все фильтры
-        queryset = view.apply_filters(queryset)
-        
-        # Ограничиваем количество для производительности (максимум 1000 объектов)
-        queryset = queryset[:1000]
-        
-        # Подготавливаем минимальные данные для маркеров карты
-        properties_data = []
-        for prop in queryset:
-            # Пропускаем объекты без координат
-            if not prop.latitude or not prop.longitude:
-                continue
-                
-            # Получаем главное изображение
-            main_image = prop.images.filter(is_main=True).first()
-            if not main_image:
-                main_image = prop.images.first()
-            
-            image_url = main_image.thumbnail_url if main_image else ''
-                
-            # Определяем цену для отображения
-            price_display = ''
-            if prop.deal_type == 'rent' and prop.price_rent_monthly:
-                price_display = f"${prop.price_rent_monthly:,.0f}/мес"
-            elif prop.deal_type in ['sale', 'both'] and prop.price_sale_usd:
-                price_display = f"${prop.price_sale_usd:,.0f}"
-            else:
-                price_display = "Цена по запросу"
-            
-            # Generate language-aware URL
-            from django.utils.translation import get_language
-            
-            current_language = get_language() or 'ru'
-            # Всегда используем языковой префикс, так как prefix_default_language=True
-            property_url = f'/{current_language}/property/{prop.slug}/'
-            
-            agent_phone = ''
-            if prop.agent and prop.agent.phone:
-                agent_phone = prop.agent.phone
-            properties_data.append({
-                'id': prop.id,
-                'title': prop.title,
-                'slug': prop.slug,
-                'lat': float(prop.latitude),
-                'lng': float(prop.longitude),
-                'property_type': prop.property_type.name if prop.property_type else '',
-                'property_type_label': prop.property_type.name_display if prop.property_type else '',
-                'deal_type': prop.deal_type,
-                'price': price_display,
-                'location': prop.location.name if prop.location else (prop.district.name if prop.district else ''),
-                'url': property_url,
-                'image_url': image_url,
-                'bedrooms': prop.bedrooms or 0,
-                'bathrooms': prop.bathrooms or 0,
-                'area': float(prop.area_total) if prop.area_total else 0,
-                'agent_phone': agent_phone or '+66633033133'
-            })
+        body, digest = cached_marker_payload(CatalogFilter.from_request(request))
+    except Exception:
+        logger.exception('Не удалось собрать маркеры карты')
+        return JsonResponse({
+            'success': False,
+            'error': gettext('Не удалось загрузить объекты карты')
+        }, status=500)
+
+    # Сильный ETag описывает конкретные байты, поэтому у сжатого тела свой тег
+    use_gzip = 'gzip' in request.headers.get('Accept-Encoding', '')
+    etag = f'"{digest}-gz"' if use_gzip else f'"{digest}"'
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    elif use_gzip:
+        response = HttpResponse(body, content_type='application/json')
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(gzip.decompress(body), content_type='application/json')
+    response['ETag'] = etag
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
+
+
+def map_clusters_json(request):
+    """AJAX endpoint кластеров карты для тайла ``tile=z/x/y`` (или ``bbox`` и ``zoom``).
+
+    Кластеры считаются на сервере по сетке, поэтому на карту попадает весь
+    каталог по фильтру, а не первые 1000 объектов. Без окна берутся все
+    точки; ``bounds`` в ответе — их охват для fitBounds.
+    """
+    try:
+        if request.GET.get('tile'):
+            zoom, tile_x, tile_y = map_clusters.parse_tile(request.GET['tile'])
+            bbox = map_clusters.tile_bbox(zoom, tile_x, tile_y)
+        else:
+            zoom = min(max(int(request.GET.get('zoom', 11)), 0), map_clusters.MAX_ZOOM)
+            bbox = parse_bbox(request.GET['bbox']) if request.GET.get('bbox') else None
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    # Окно выбирается по индексу координат поисковых документов
+    catalog_filter = CatalogFilter.from_request(request).with_scope(bbox=scale_bbox(bbox) if bbox else None)
+    arrays = map_clusters.cached_coordinates(catalog_filter)
+    clusters, marker_ids = map_clusters.cluster_points(arrays, zoom)
+
+    markers = None
+    if marker_ids:
+        markers = build_marker_payload(catalog_filter, get_language() or 'ru', property_ids=marker_ids)
+
+    return JsonResponse({
+        'success': True,
+        'zoom': zoom,
+        'total_count': len(arrays['ids']),
+        'bounds': map_clusters.data_bounds(arrays),
+        'clusters': clusters,
+        'markers': markers,
+    })
+
+
+def ajax_search_count(request):
+    """AJAX endpoint для подсчета количества объектов по фильтрам"""
+    try:
+        # Применяем фильтры (используем POST или GET данные)
+        filters = request.POST if request.method == 'POST' else request.GET
+
+        # Считаем по таблице поисковых документов с кэшем до следующего изменения инвентаря
+        count = cached_count(CatalogFilter.from_request(request, data=filters))
         
         return JsonResponse({
             'success': True,
-            'properties': properties_data,
-            'total_count': len(properties_data)
+            'count': count
         })
         
     except Exception as e:
@@ -1125,28 +1159,19 @@ def map_properties_json(request):
         })
 
 
-def ajax_search_count(request):
-    """AJAX endpoint для подсчета количества объектов по фильтрам"""
+def ajax_facets(request):
+    """AJAX endpoint со счётчиками по каждому значению фильтров для текущего состояния"""
     try:
-        # Получаем базовый queryset
-        queryset = Property.objects.filter(
-            is_active=True,
-            status='available'
-        )
-        
-        # Применяем фильтры (используем POST или GET данные)
-        filters = request.POST if request.method == 'POST' else request.GET
+        catalog_filter = CatalogFilter.from_request(request)
         currency_code = CurrencyService.get_selected_currency_code(request)
-        queryset = apply_search_filters(queryset, filters, currency_code)
-        
-        # Возвращаем количество
-        count = queryset.count()
-        
+        facets = get_facets(catalog_filter, currency_code)
+
         return JsonResponse({
             'success': True,
-            'count': count
+            'total_count': facets['total'],
+            'facets': facets['facets'],
         })
-        
+
     except Exception as e:
         return JsonResponse({
             'success': False,
@@ -1154,104 +1179,136 @@ def ajax_search_count(request):
         })
 
 
-def apply_search_filters(queryset, filters, currency_code='USD'):
-    """Применяет поисковые фильтры к queryset (работает с POST и GET данными)"""
-    
-    # Тип недвижимости
-    property_type = filters.get('type')
-    if property_type:
-        queryset = queryset.filter(property_type__name=property_type)
-
-    # Стадия готовности
-    build_status = filters.get('build_status')
-    valid_statuses = dict(Property.BUILD_STATUS_CHOICES)
-    if build_status and build_status in valid_statuses:
-        queryset = queryset.filter(build_status=build_status)
-
-    # Район  
-    district = filters.get('district')
-    if district:
-        queryset = queryset.filter(district__slug=district)
-    
-    # Локация
-    location = filters.get('location')  
-    if location:
-        queryset = queryset.filter(location__id=location)
-    
-    # Ценовые фильтры (в USD по умолчанию)
-    min_price = filters.get('min_price')
-    max_price = filters.get('max_price')
-    
-    sale_field, rent_field = CurrencyService.get_price_field_names(currency_code)
+BULK_UPLOAD_ALLOWED_TYPES = ('image/jpeg', 'image/jpg', 'image/png', 'image/gif')
+BULK_UPLOAD_MAX_SIZE = 10 * 1024 * 1024
 
-    if min_price:
-        try:
-            min_val = Decimal(min_price)
-            price_filter = Q(**{f"{sale_field}__gte": min_val})
-            if rent_field:
-                price_filter |= Q(**{f"{rent_field}__gte": min_val})
-            queryset = queryset.filter(price_filter)
-        except (InvalidOperation, ValueError):
-            pass
-            
-    if max_price:
-        try:
-            max_val = Decimal(max_price)
-            price_filter = Q(**{f"{sale_field}__lte": max_val})
-            if rent_field:
-                price_filter |= Q(**{f"{rent_field}__lte": max_val})
-            queryset = queryset.filter(price_filter)
-        except (InvalidOperation, ValueError):
-            pass
-    
-    # Количество спален
-    bedrooms = filters.get('bedrooms')
-    if bedrooms:
+
+def _validate_uploaded_image(uploaded_file):
+    """Проверка одного файла: тип, размер и то, что Pillow распознаёт изображение."""
+    if uploaded_file.content_type not in BULK_UPLOAD_ALLOWED_TYPES:
+        return f'Файл {uploaded_file.name} не является изображением'
+    if uploaded_file.size > BULK_UPLOAD_MAX_SIZE:
+        return f'Файл {uploaded_file.name} слишком большой (максимум 10MB)'
+    try:
+        uploaded_file.seek(0)
+        with Image.open(uploaded_file) as pil_image:
+            pil_image.verify()
+    except Exception:
+        return f'Файл {uploaded_file.name} повреждён или не является изображением'
+    finally:
+        uploaded_file.seek(0)
+    return None
+
+
+def _bulk_upload_events(property_obj, uploaded_files):
+    """Шаги массовой загрузки как последовательность событий (для NDJSON и обычного JSON).
+
+    Все файлы проверяются заранее, строки вставляются одним
+    bulk_create, is_main и order определяются один раз на пачку. Конвертация в
+    WebP и варианты — в очереди обработки (process_property_images).
+    """
+    from .models import PropertyImage
+
+    errors = []
+    valid_files = []
+    for index, uploaded_file in enumerate(uploaded_files):
+        # verify() только разбирает заголовки и держит GIL — пул потоков здесь не ускоряет
+        error = _validate_uploaded_image(uploaded_file)
+        if error:
+            errors.append(error)
+        else:
+            valid_files.append(uploaded_file)
+        yield {
+            'event': 'validated',
+            'index': index,
+            'name': uploaded_file.name,
+            'valid': error is None,
+            'error': error,
+        }
+
+    if not valid_files:
+        yield {
+            'event': 'done',
+            'success': False,
+            'message': 'Нет допустимых файлов для загрузки',
+            'images': [],
+            'errors': errors,
+        }
+        return
+
+    image_field = PropertyImage._meta.get_field('image')
+    stored = []
+    for index, uploaded_file in enumerate(valid_files):
         try:
-            if bedrooms == '4+':
-                queryset = queryset.filter(bedrooms__gte=4)
-            else:
-                queryset = queryset.filter(bedrooms=int(bedrooms))
-        except ValueError:
-            pass
-    
-    # Тип сделки
-    deal_type = filters.get('deal_type')
-    if deal_type and deal_type in ['sale', 'rent']:
-        queryset = queryset.filter(deal_type__in=[deal_type, 'both'])
-    
-    # Удобства/особенности
-    amenities = filters.getlist('amenities') if hasattr(filters, 'getlist') else [filters.get('amenities')] if filters.get('amenities') else []
-    if amenities:
-        for amenity_id in amenities:
-            try:
-                amenity_id = int(amenity_id)
-                queryset = queryset.filter(features__feature__id=amenity_id)
-            except (ValueError, TypeError):
-                pass
-    
-    # Текстовый поиск
-    query = filters.get('q')
-    if query:
-        queryset = queryset.filter(
-            Q(title_ru__icontains=query) |
-            Q(title_en__icontains=query) |
-            Q(description_ru__icontains=query) |
-            Q(description_en__icontains=query) |
-            Q(district__name_ru__icontains=query) |
-            Q(district__name_en__icontains=query)
-        )
-    
-    return queryset.distinct()
+            name = image_field.storage.save(image_field.generate_filename(None, uploaded_file.name), uploaded_file)
+        except Exception as e:
+            errors.append(f'Ошибка при загрузке файла {uploaded_file.name}: {str(e)}')
+            continue
+        stored.append((uploaded_file, name))
+        yield {'event': 'stored', 'index': index, 'name': uploaded_file.name, 'total': len(valid_files)}
+
+    try:
+        with transaction.atomic():
+            existing = PropertyImage.objects.filter(property=property_obj).aggregate(
+                max_order=Max('order'),
+                main_count=Count('pk', filter=Q(is_main=True)),
+            )
+            last_order = existing['max_order'] or 0
+            images = PropertyImage.objects.bulk_create([
+                PropertyImage(
+                    property=property_obj,
+                    image=name,
+                    title=uploaded_file.name.split('.')[0],  # Используем имя файла без расширения как название
+                    is_main=(i == 0 and not existing['main_count']),
+                    order=last_order + i + 1,
+                    image_type='main',
+                    processing_state='pending',
+                )
+                for i, (uploaded_file, name) in enumerate(stored)
+            ])
+            # bulk_create не отправляет сигналы — обновляем главное изображение один раз
+            Property.refresh_main_image(property_obj.pk)
+    except Exception as e:
+        for _uploaded_file, name in stored:
+            image_field.storage.delete(name)
+        yield {
+            'event': 'done',
+            'success': False,
+            'message': f'Произошла ошибка: {str(e)}',
+            'images': [],
+            'errors': errors,
+        }
+        return
+
+    created_images = [
+        {
+            'id': property_image.id,
+            'title': property_image.title,
+            'image_url': property_image.original_url,
+            'thumbnail_url': property_image.thumbnail_url,
+            'is_main': property_image.is_main,
+            'order': property_image.order,
+            'processing_state': property_image.processing_state,
+        }
+        for property_image in images
+    ]
+    yield {
+        'event': 'done',
+        'success': True,
+        'message': f'Успешно загружено {len(created_images)} изображений',
+        'images': created_images,
+        'errors': errors if errors else None,
+    }
 
 
 @require_POST
 @csrf_exempt
 def bulk_upload_images(request):
-    """AJAX endpoint для массовой загрузки изображений для объекта недвижимости"""
-    from .models import PropertyImage
-    from django.db import models
-    
+    """AJAX endpoint для массовой загрузки изображений для объекта недвижимости
+
+    С параметром stream=1 ответ — NDJSON (application/x-ndjson): по строке на
+    каждое событие проверки/сохранения файла и итоговое событие ``done``.
+    """
     try:
         property_id = request.POST.get('property_id')
         if not property_id:
@@ -1276,73 +1333,19 @@ def bulk_upload_images(request):
                 'success': False,
                 'message': 'Файлы для загрузки не найдены'
             })
-        
-        # Проверяем, что это изображения
-        allowed_types = ['image/jpeg', 'image/jpg', 'image/png', 'image/gif']
-        valid_files = []
-        errors = []
-        
-        for file in uploaded_files:
-            if file.content_type not in allowed_types:
-                errors.append(f'Файл {file.name} не является изображением')
-                continue
-            
-            # Проверяем размер файла (максимум 10MB)
-            if file.size > 10 * 1024 * 1024:
-                errors.append(f'Файл {file.name} слишком большой (максимум 10MB)')
-                continue
-                
-            valid_files.append(file)
-        
-        if not valid_files:
-            return JsonResponse({
-                'success': False,
-                'message': 'Нет допустимых файлов для загрузки',
-                'errors': errors
-            })
-        
-        # Определяем следующий порядковый номер
-        last_order = PropertyImage.objects.filter(
-            property=property_obj
-        ).aggregate(max_order=models.Max('order'))['max_order'] or 0
-        
-        # Создаем объекты PropertyImage
-        created_images = []
-        for i, file in enumerate(valid_files):
-            try:
-                # Определяем, является ли первое изображение главным
-                is_main = (i == 0) and not PropertyImage.objects.filter(
-                    property=property_obj, 
-                    is_main=True
-                ).exists()
-                
-                property_image = PropertyImage.objects.create(
-                    property=property_obj,
-                    image=file,
-                    title=file.name.split('.')[0],  # Используем имя файла без расширения как название
-                    is_main=is_main,
-                    order=last_order + i + 1,
-                    image_type='main'
-                )
-                
-                created_images.append({
-                    'id': property_image.id,
-                    'title': property_image.title,
-                    'image_url': property_image.original_url,
-                    'thumbnail_url': property_image.thumbnail_url,
-                    'is_main': property_image.is_main,
-                    'order': property_image.order
-                })
-                
-            except Exception as e:
-                errors.append(f'Ошибка при загрузке файла {file.name}: {str(e)}')
-        
-        return JsonResponse({
-            'success': True,
-            'message': f'Успешно загружено {len(created_images)} изображений',
-            'images': created_images,
-            'errors': errors if errors else None
-        })
+
+        events = _bulk_upload_events(property_obj, uploaded_files)
+        if request.POST.get('stream') == '1':
+            return StreamingHttpResponse(
+                (json.dumps(event, ensure_ascii=False) + '\n' for event in events),
+                content_type='application/x-ndjson',
+            )
+
+        result = {}
+        for event in events:
+            result = event
+        result.pop('event', None)
+        return JsonResponse(result)
         
     except Exception as e:
         return JsonResponse({
@@ -1354,36 +1357,60 @@ def bulk_upload_images(request):
 @require_POST
 @csrf_exempt
 def update_image_order(request):
-    """AJAX endpoint для обновления порядка изображений"""
-    import json
+    """AJAX endpoint для обновления порядка изображений
+
+    Все изображения в запросе должны принадлежать одному объекту; порядок
+    обновляется одним bulk_update в транзакции.
+    """
     from .models import PropertyImage
     
     try:
         # Получаем JSON данные
         data = json.loads(request.body)
         images_data = data.get('images', [])
+
+        orders = {}
+        for image_data in images_data:
+            try:
+                image_id = int(image_data.get('id'))
+                new_order = int(image_data.get('order'))
+            except (AttributeError, TypeError, ValueError):
+                continue
+            if image_id > 0 and new_order >= 0:
+                orders[image_id] = new_order
         
-        if not images_data:
+        if not orders:
             return JsonResponse({
                 'success': False,
                 'message': 'Нет данных для обновления'
             })
         
         # Обновляем порядок изображений
-        updated_count = 0
-        for image_data in images_data:
-            image_id = image_data.get('id')
-            new_order = image_data.get('order')
-            
-            if image_id and new_order is not None:
-                try:
-                    property_image = PropertyImage.objects.get(id=image_id)
-                    property_image.order = new_order
-                    property_image.save(update_fields=['order'])
-                    updated_count += 1
-                except PropertyImage.DoesNotExist:
-                    continue
-        
+        with transaction.atomic():
+            images = list(
+                PropertyImage.objects.select_for_update()
+                .filter(id__in=orders)
+                .only('id', 'property_id', 'order')
+            )
+            property_ids = {image.property_id for image in images}
+            if len(property_ids) > 1:
+                return JsonResponse({
+                    'success': False,
+                    'message': 'Изображения принадлежат разным объектам недвижимости'
+                })
+
+            changed = []
+            for image in images:
+                if image.order != orders[image.id]:
+                    image.order = orders[image.id]
+                    changed.append(image)
+            PropertyImage.objects.bulk_update(changed, ['order'])
+
+            # Главное изображение без флага is_main определяется порядком
+            if changed:
+                Property.refresh_main_image(property_ids.pop())
+
+        updated_count = len(images)
         return JsonResponse({
             'success': True,
             'message': f'Обновлен порядок {updated_count} изображений',
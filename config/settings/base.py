@@ -73,6 +73,7 @@ INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'apps.core.middleware.RequestCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'apps.core.middleware.LanguageRedirectMiddleware',
     'apps.core.middleware.LegacyRealEstateRedirectMiddleware',
@@ -214,6 +215,9 @@ CACHES = {
     }
 }
 
+# Журнал просмотров при процессном кэше; разбирает команда flush_view_counters
+VIEW_COUNTER_SPOOL_DIR = BASE_DIR / 'var' / 'view_counters'
+
 # Logging
 LOGGING = {
     'version': 1,
@@ -0,0 +1,74 @@
+/**
+ * Массовая загрузка изображений с построчным прогрессом (NDJSON)
+ * Используется блоком массовой загрузки PropertyAdmin.bulk_image_upload_widget
+ */
+
+/**
+ * Отправляет файлы на bulk_upload_images в режиме stream=1 и вызывает onEvent
+ * для каждого события сервера ("validated", "stored", "done").
+ * Возвращает Promise с итоговым событием "done".
+ */
+function streamBulkImageUpload(url, propertyId, files, csrfToken, onEvent) {
+    const formData = new FormData();
+    formData.append('property_id', propertyId);
+    formData.append('stream', '1');
+    files.forEach(file => formData.append('images', file));
+
+    return fetch(url, {
+        method: 'POST',
+        body: formData,
+        headers: { 'X-CSRFToken': csrfToken }
+    }).then(response => {
+        const contentType = response.headers.get('Content-Type') || '';
+        // Ошибки до начала обработки (нет объекта, нет файлов) приходят обычным JSON
+        if (!contentType.includes('application/x-ndjson') || !response.body) {
+            return response.json().then(data => {
+                const done = Object.assign({ event: 'done' }, data);
+                onEvent(done);
+                return done;
+            });
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let done = null;
+
+        function handleLine(line) {
+            if (!line.trim()) return;
+            const event = JSON.parse(line);
+            if (event.event === 'done') done = event;
+            onEvent(event);
+        }
+
+        function read() {
+            return reader.read().then(({ value, done: finished }) => {
+                buffer += decoder.decode(value || new Uint8Array(), { stream: !finished });
+                const lines = buffer.split('\n');
+                buffer = lines.pop();
+                lines.forEach(handleLine);
+                if (finished) {
+                    handleLine(buffer);
+                    return done || { event: 'done', success: false, message: 'Ответ сервера прерван' };
+                }
+                return read();
+            });
+        }
+
+        return read();
+    });
+}
+
+/**
+ * Текст прогресса для события загрузки
+ */
+function describeBulkUploadEvent(event, totalFiles) {
+    if (event.event === 'validated') {
+        const status = event.valid ? 'проверен' : `отклонён: ${event.error}`;
+        return `Файл ${event.index + 1} из ${totalFiles} (${event.name}) ${status}`;
+    }
+    if (event.event === 'stored') {
+        return `Сохранено ${event.index + 1} из ${event.total}: ${event.name}`;
+    }
+    return event.message || '';
+}
@@ -0,0 +1,77 @@
+// Facet counts next to filter options: "(12)" for the current filter state
+(function() {
+    const FACET_FIELDS = {
+        property_type: 'property_type',
+        district: 'district',
+        location: 'location',
+        bedrooms: 'bedrooms',
+        build_status: 'build_status',
+        amenities: 'amenities'
+    };
+
+    function buildFacetParams(form) {
+        const params = new URLSearchParams();
+        new FormData(form).forEach((value, key) => {
+            if (key === 'sort' || key === 'current_property_type') return;
+            if (typeof value !== 'string' || value.trim() === '') return;
+            params.append(key, value);
+        });
+        return params;
+    }
+
+    function renderInputCount(input, count) {
+        const label = input.closest('label');
+        if (!label) return;
+
+        let badge = label.querySelector('.facet-count');
+        if (!badge) {
+            badge = document.createElement('span');
+            badge.className = 'facet-count ml-1 text-xs text-gray-400';
+            const text = label.querySelector('span') || label;
+            text.appendChild(badge);
+        }
+        badge.textContent = `(${count})`;
+        label.classList.toggle('opacity-50', count === 0 && !input.checked);
+    }
+
+    function renderOptionCount(option, count) {
+        if (!option.dataset.label) {
+            option.dataset.label = option.textContent.trim();
+        }
+        option.textContent = `${option.dataset.label} (${count})`;
+    }
+
+    function renderFacets(form, facets) {
+        Object.keys(FACET_FIELDS).forEach(name => {
+            const counts = facets[FACET_FIELDS[name]] || {};
+            form.querySelectorAll(`[name="${name}"]`).forEach(field => {
+                if (field.tagName === 'SELECT') {
+                    Array.from(field.options).forEach(option => {
+                        if (option.value) renderOptionCount(option, counts[option.value] || 0);
+                    });
+                } else if (field.value) {
+                    renderInputCount(field, counts[field.value] || 0);
+                }
+            });
+        });
+    }
+
+    window.loadFilterFacets = function() {
+        const form = document.getElementById('filter-form');
+        const url = window.djangoUrls && window.djangoUrls.ajaxFacets;
+        if (!form || !url) return;
+
+        fetch(`${url}?${buildFacetParams(form).toString()}`, {
+            headers: { 'X-Requested-With': 'XMLHttpRequest' }
+        })
+            .then(response => response.json())
+            .then(data => {
+                if (data.success) renderFacets(form, data.facets);
+            })
+            .catch(error => {
+                console.error('Error loading filter facets:', error);
+            });
+    };
+
+    document.addEventListener('DOMContentLoaded', window.loadFilterFacets);
+})();
@@ -1,138 +1,281 @@
-// Update map markers based on all filtered properties (optimized loading)
-function updateMapMarkers() {
-    if (!markersGroup) return;
+// Decode columnar map payload (parallel arrays) into marker objects
+function decodeMapMarkers(data) {
+    const columns = data.columns || {};
+    const ids = columns.id || [];
+    const properties = [];
+
+    for (let i = 0; i < ids.length; i++) {
+        const type = data.types[columns.type[i]] || {};
+        const price = columns.price[i];
+        let priceText = window.djangoTranslations.priceOnRequest;
+        if (price) {
+            priceText = `$${Math.round(price).toLocaleString('en-US')}`;
+            if (columns.deal_type[i] === 'rent') {
+                priceText += '/мес';
+            }
+        }
+
+        properties.push({
+            id: ids[i],
+            title: columns.title[i],
+            slug: columns.slug[i],
+            lat: columns.lat[i],
+            lng: columns.lng[i],
+            property_type: type.name || '',
+            property_type_label: type.label || '',
+            deal_type: columns.deal_type[i],
+            price: priceText,
+            location: data.locations[columns.location[i]] || '',
+            url: `${data.url_prefix}${columns.slug[i]}/`,
+            image_url: columns.image_url[i],
+            bedrooms: columns.bedrooms[i],
+            bathrooms: columns.bathrooms[i],
+            area: columns.area[i],
+            agent_phone: columns.agent_phone[i]
+        });
+    }
+    return properties;
+}
+
+// Fit the map to the whole filtered set on the next server response
+let mapFitPending = true;
+let mapFitRequestId = 0;
+
+// Tiles already loaded for the current filters and zoom: "z/x/y" -> layer group
+let mapTileLayers = new Map();
+let mapTilesKey = '';
+
+// Add a single property marker with popup; returns its coordinates
+function addPropertyMarker(property, layer = markersGroup) {
+    const lat = property.lat;
+    const lng = property.lng;
     
-    // Clear existing markers
-    markersGroup.clearLayers();
+    if (!lat || !lng || isNaN(lat) || isNaN(lng)) {
+        return null; // Skip if no valid coordinates
+    }
+    
+    // Apply small jitter for overlapping coordinates
+    let adjustedLat = lat;
+    let adjustedLng = lng;
+    
+    if (lat % 1 === 0 && lng % 1 === 0) {
+        const jitter = 0.001;
+        adjustedLat = lat + (Math.random() - 0.5) * jitter;
+        adjustedLng = lng + (Math.random() - 0.5) * jitter;
+    }
     
+    // Create marker with property data
+    const marker = createCustomMarker({
+        lat: adjustedLat,
+        lng: adjustedLng,
+        dealType: property.deal_type,
+        priceText: property.price,
+        imageUrl: property.image_url || window.djangoUrls.noImageSvg,
+        title: property.title
+    }).addTo(layer);
     
-    // Get current filter parameters
+    const imageUrl = property.image_url || window.djangoUrls.noImageSvg;
+    const propertyTypeLabel = property.property_type_label || property.property_type || '';
+    const locationLabel = property.location || '';
+    const bedrooms = parseInt(property.bedrooms, 10) || 0;
+    const bathrooms = parseInt(property.bathrooms, 10) || 0;
+    const areaValue = parseFloat(property.area) || 0;
+    const priceLabel = property.price || window.djangoTranslations.priceOnRequest;
+    const cleanPhone = (property.agent_phone || '+66633033133').replace(/[^0-9]/g, '') || '66633033133';
+
+    const popupContent = `
+        <div class="property-popup">
+            <div class="popup-media" data-property-id="${property.id}">
+                <img src="${imageUrl}" alt="${escapeHtml(property.title)}" class="popup-image" loading="lazy">
+                ${propertyTypeLabel ? `<span class="popup-media-chip">${escapeHtml(propertyTypeLabel)}</span>` : ''}
+                <button class="favorite-toggle" type="button" onclick="toggleFavorite(${property.id})" title="${window.djangoTranslations.addToFavorites}">
+                    <i class="far fa-heart" id="favorite-${property.id}"></i>
+                </button>
+            </div>
+            <div class="popup-body">
+                <div class="popup-price-row">
+                    <div class="popup-price">${priceLabel}</div>
+                    <a href="${property.url}" class="popup-link" target="_blank" rel="noopener">
+                        ${window.djangoTranslations.moreDetails}
+                        <i class="fas fa-arrow-right text-xs"></i>
+                    </a>
+                </div>
+                <p class="popup-title">${escapeHtml(property.title)}</p>
+                <div class="popup-location">
+                    <i class="fas fa-map-marker-alt"></i>
+                    ${escapeHtml(locationLabel)}
+                </div>
+                <div class="popup-meta">
+                    ${bedrooms ? `<span><i class="fas fa-bed"></i>${bedrooms} ${window.djangoTranslations.bedroomsShort}</span>` : ''}
+                    ${bathrooms ? `<span><i class="fas fa-shower"></i>${bathrooms} ${window.djangoTranslations.bathroomsShort}</span>` : ''}
+                    ${areaValue ? `<span><i class="fas fa-ruler-combined"></i>${Math.round(areaValue)} ${window.djangoTranslations.areaShort}</span>` : ''}
+                </div>
+                <div class="popup-actions">
+                    <a href="https://wa.me/${cleanPhone}?text=${encodeURIComponent(window.djangoTranslations.whatsappText + ': ' + property.title)}" class="popup-action whatsapp" target="_blank" rel="noopener">
+                        <i class="fab fa-whatsapp"></i>
+                        WhatsApp
+                    </a>
+                    <a href="${property.url}" class="popup-action primary" target="_blank" rel="noopener">
+                        ${window.djangoTranslations.moreDetails}
+                    </a>
+                </div>
+            </div>
+        </div>
+    `;
+    
+    marker.bindPopup(popupContent, {
+        maxWidth: 280,
+        className: 'enhanced-popup',
+        autoPan: true,
+        autoPanPadding: [20, 20],
+        keepInView: true,
+        closeButton: true
+    });
+    
+    return [adjustedLat, adjustedLng];
+}
+
+// Add a server-side cluster; click zooms into it
+function addClusterMarker(lat, lng, count, minPrice, layer = markersGroup) {
+    let sizeClass = 'small';
+    if (count > 50) {
+        sizeClass = 'large';
+    } else if (count > 20) {
+        sizeClass = 'medium';
+    }
+    const title = minPrice ? `${count} · $${Math.round(minPrice).toLocaleString('en-US')}+` : `${count}`;
+    const icon = L.divIcon({
+        html: `<div><span>${count}</span></div>`,
+        className: 'marker-cluster marker-cluster-' + sizeClass,
+        iconSize: L.point(40, 40)
+    });
+    L.marker([lat, lng], { icon, title })
+        .on('click', () => propertiesMap.setView([lat, lng], Math.min(propertiesMap.getZoom() + 2, propertiesMap.getMaxZoom())))
+        .addTo(layer);
+}
+
+// Update map markers based on all filtered properties (filters changed)
+function updateMapMarkers() {
+    mapFitPending = true;
+    loadMapClusters();
+}
+
+// Current filter parameters from the filter form
+function mapFilterParams() {
     const form = document.getElementById('filter-form');
     const formData = new FormData(form);
     const params = new URLSearchParams();
-    
+
     // Convert FormData to URLSearchParams
     for (const [key, value] of formData.entries()) {
         if (typeof value === 'string') {
             params.append(key, value);
         }
     }
-    
-    // Fetch all filtered properties via optimized JSON API
-    fetch(`${window.djangoUrls.mapPropertiesJson}?${params.toString()}`)
-        .then(response => response.json())
-        .then(data => {
-            if (!data.success) {
-                console.error('Error loading map properties:', data.error);
-                // Fallback to current page properties
-                loadCurrentPageProperties();
-                return;
-            }
-            
-            const properties = data.properties;
-            const bounds = [];
-            
-            
-            properties.forEach((property, index) => {
-                const lat = property.lat;
-                const lng = property.lng;
-                
-                if (!lat || !lng || isNaN(lat) || isNaN(lng)) {
-                    return; // Skip if no valid coordinates
+    return params;
+}
+
+// XYZ tiles ("z/x/y") covering the current viewport
+function visibleMapTiles() {
+    const zoom = propertiesMap.getZoom();
+    const pixelBounds = propertiesMap.getPixelBounds();
+    const tileSize = 256;
+    const maxIndex = Math.pow(2, zoom) - 1;
+    const minX = Math.max(0, Math.floor(pixelBounds.min.x / tileSize));
+    const maxX = Math.min(maxIndex, Math.floor(pixelBounds.max.x / tileSize));
+    const minY = Math.max(0, Math.floor(pixelBounds.min.y / tileSize));
+    const maxY = Math.min(maxIndex, Math.floor(pixelBounds.max.y / tileSize));
+
+    const tiles = [];
+    for (let x = minX; x <= maxX; x++) {
+        for (let y = minY; y <= maxY; y++) {
+            tiles.push(`${zoom}/${x}/${y}`);
+        }
+    }
+    return tiles;
+}
+
+function showMapFallback(error) {
+    console.error('Error loading map clusters:', error);
+    // Fallback to current page properties
+    mapTileLayers = new Map();
+    mapTilesKey = '';
+    markersGroup.clearLayers();
+    loadCurrentPageProperties();
+}
+
+// Load server-side clusters for the tiles of the viewport that are not loaded yet
+function loadMapClusters() {
+    if (!markersGroup) return;
+
+    const params = mapFilterParams();
+
+    if (mapFitPending) {
+        // First request for new filters: whole set without a window, only to fit the map
+        const requestId = ++mapFitRequestId;
+        params.set('zoom', propertiesMap.getZoom());
+        fetch(`${window.djangoUrls.mapClustersJson}?${params.toString()}`)
+            .then(response => response.json())
+            .then(data => {
+                if (requestId !== mapFitRequestId) return;
+                if (!data.success) {
+                    showMapFallback(data.error);
+                    return;
                 }
-                
-                // Apply small jitter for overlapping coordinates
-                let adjustedLat = lat;
-                let adjustedLng = lng;
-                
-                if (lat % 1 === 0 && lng % 1 === 0) {
-                    const jitter = 0.001;
-                    adjustedLat = lat + (Math.random() - 0.5) * jitter;
-                    adjustedLng = lng + (Math.random() - 0.5) * jitter;
+                mapFitPending = false;
+                mapTileLayers = new Map();
+                mapTilesKey = '';
+                markersGroup.clearLayers();
+                if (data.bounds) {
+                    // moveend after fitBounds loads the tiles of the new viewport
+                    const [south, west, north, east] = data.bounds;
+                    propertiesMap.fitBounds([[south, west], [north, east]], { padding: [30, 30] });
                 }
-                
-                // Create marker with property data
-                const marker = createCustomMarker({
-                    lat: adjustedLat,
-                    lng: adjustedLng,
-                    dealType: property.deal_type,
-                    priceText: property.price,
-                    imageUrl: property.image_url || window.djangoUrls.noImageSvg,
-                    title: property.title
-                }).addTo(markersGroup);
-                
-                const imageUrl = property.image_url || window.djangoUrls.noImageSvg;
-                const propertyTypeLabel = property.property_type_label || property.property_type || '';
-                const locationLabel = property.location || '';
-                const bedrooms = parseInt(property.bedrooms, 10) || 0;
-                const bathrooms = parseInt(property.bathrooms, 10) || 0;
-                const areaValue = parseFloat(property.area) || 0;
-                const priceLabel = property.price || window.djangoTranslations.priceOnRequest;
-                const cleanPhone = (property.agent_phone || '+66633033133').replace(/[^0-9]/g, '') || '66633033133';
+            })
+            .catch(showMapFallback);
+        return;
+    }
 
-                const popupContent = `
-                    <div class="property-popup">
-                        <div class="popup-media" data-property-id="${property.id}">
-                            <img src="${imageUrl}" alt="${escapeHtml(property.title)}" class="popup-image" loading="lazy">
-                            ${propertyTypeLabel ? `<span class="popup-media-chip">${escapeHtml(propertyTypeLabel)}</span>` : ''}
-                            <button class="favorite-toggle" type="button" onclick="toggleFavorite(${property.id})" title="${window.djangoTranslations.addToFavorites}">
-                                <i class="far fa-heart" id="favorite-${property.id}"></i>
-                            </button>
-                        </div>
-                        <div class="popup-body">
-                            <div class="popup-price-row">
-                                <div class="popup-price">${priceLabel}</div>
-                                <a href="${property.url}" class="popup-link" target="_blank" rel="noopener">
-                                    ${window.djangoTranslations.moreDetails}
-                                    <i class="fas fa-arrow-right text-xs"></i>
-                                </a>
-                            </div>
-                            <p class="popup-title">${escapeHtml(property.title)}</p>
-                            <div class="popup-location">
-                                <i class="fas fa-map-marker-alt"></i>
-                                ${escapeHtml(locationLabel)}
-                            </div>
-                            <div class="popup-meta">
-                                ${bedrooms ? `<span><i class="fas fa-bed"></i>${bedrooms} ${window.djangoTranslations.bedroomsShort}</span>` : ''}
-                                ${bathrooms ? `<span><i class="fas fa-shower"></i>${bathrooms} ${window.djangoTranslations.bathroomsShort}</span>` : ''}
-                                ${areaValue ? `<span><i class="fas fa-ruler-combined"></i>${Math.round(areaValue)} ${window.djangoTranslations.areaShort}</span>` : ''}
-                            </div>
-                            <div class="popup-actions">
-                                <a href="https://wa.me/${cleanPhone}?text=${encodeURIComponent(window.djangoTranslations.whatsappText + ': ' + property.title)}" class="popup-action whatsapp" target="_blank" rel="noopener">
-                                    <i class="fab fa-whatsapp"></i>
-                                    WhatsApp
-                                </a>
-                                <a href="${property.url}" class="popup-action primary" target="_blank" rel="noopener">
-                                    ${window.djangoTranslations.moreDetails}
-                                </a>
-                            </div>
-                        </div>
-                    </div>
-                `;
-                
-                marker.bindPopup(popupContent, {
-                    maxWidth: 280,
-                    className: 'enhanced-popup',
-                    autoPan: true,
-                    autoPanPadding: [20, 20],
-                    keepInView: true,
-                    closeButton: true
-                });
-                
-                bounds.push([adjustedLat, adjustedLng]);
+    // Tiles of another zoom level or other filters are dropped
+    const tilesKey = `${params.toString()}|${propertiesMap.getZoom()}`;
+    if (tilesKey !== mapTilesKey) {
+        mapTilesKey = tilesKey;
+        mapTileLayers = new Map();
+        markersGroup.clearLayers();
+    }
+
+    visibleMapTiles().forEach(tile => {
+        if (mapTileLayers.has(tile)) return;
+        const layer = L.layerGroup().addTo(markersGroup);
+        mapTileLayers.set(tile, layer);
+
+        const tileParams = new URLSearchParams(params);
+        tileParams.set('tile', tile);
+        fetch(`${window.djangoUrls.mapClustersJson}?${tileParams.toString()}`)
+            .then(response => response.json())
+            .then(data => {
+                // Response for a superseded zoom or filter state
+                if (mapTileLayers.get(tile) !== layer) return;
+                if (!data.success) {
+                    mapTileLayers.delete(tile);
+                    console.error('Error loading map tile:', tile, data.error);
+                    return;
+                }
+                const clusters = data.clusters;
+                for (let i = 0; i < clusters.count.length; i++) {
+                    addClusterMarker(clusters.lat[i], clusters.lng[i], clusters.count[i], clusters.min_price[i], layer);
+                }
+                if (data.markers) {
+                    decodeMapMarkers(data.markers).forEach(property => addPropertyMarker(property, layer));
+                }
+            })
+            .catch(error => {
+                if (mapTileLayers.get(tile) === layer) {
+                    mapTileLayers.delete(tile);
+                }
+                console.error('Error fetching map tile:', tile, error);
             });
-            
-            // Fit map to bounds if we have markers
-            if (bounds.length > 0) {
-                const group = new L.featureGroup(markersGroup.getLayers());
-                propertiesMap.fitBounds(group.getBounds().pad(0.1));
-            }
-        })
-        .catch(error => {
-            console.error('Error fetching map properties:', error);
-            // Fallback to current page properties
-            loadCurrentPageProperties();
-        });
+    });
 }
 
 // Fallback function to load current page properties
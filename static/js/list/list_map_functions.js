@@ -62,33 +62,12 @@ function initializePropertiesMap() {
         attribution: '© OpenStreetMap contributors'
     }).addTo(propertiesMap);
     
-    // Create cluster group for markers
-    markersGroup = L.markerClusterGroup({
-        showCoverageOnHover: false,
-        spiderfyDistanceMultiplier: 2.8,
-        spiderLegPolylineOptions: {
-            weight: 0,
-            opacity: 0
-        },
-        maxClusterRadius: 55,
-        iconCreateFunction: function(cluster) {
-            const count = cluster.getChildCount();
-            let sizeClass = 'small';
-            if (count > 50) {
-                sizeClass = 'large';
-            } else if (count > 20) {
-                sizeClass = 'medium';
-            }
-            return L.divIcon({
-                html: `<div><span>${count}</span></div>`,
-                className: 'marker-cluster marker-cluster-' + sizeClass,
-                iconSize: L.point(40, 40)
-            });
-        }
-    });
+    // Clusters are computed server-side (map_clusters_json) for the current viewport
+    markersGroup = L.layerGroup();
     propertiesMap.addLayer(markersGroup);
     
-    // Add markers for properties
+    // Add markers for properties and reload clusters after every pan/zoom
+    propertiesMap.on('moveend', loadMapClusters);
     updateMapMarkers();
     
     // Force map resize after container is visible